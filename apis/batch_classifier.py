@@ -8,10 +8,16 @@ from config import transaction_tag as transaction_tag
 from config import app
 from flask import request, json
 from pydantic import ValidationError, BaseModel, Field
-from machine_learning.transactions_classifier import TransactionsClassifier
-from machine_learning.transactions_classification.lib.external_embedding_api import create_embeddings_api
+from machine_learning.model_registry import get_transactions_classifier
+from machine_learning.micro_batcher import get_batcher
+from machine_learning.prediction_cache import get_prediction_cache
+from machine_learning.transactions_classification.lib.embedding_backends import create_embeddings
+from machine_learning.transactions_classification.lib.embedding_matrix import attach_embeddings
+from machine_learning.transactions_classification.lib.embedding_store import dedupe_ratio
 from model import Session, BatchJob, JobStatus
 from kafka.batch_job_publisher import publish_batch_job
+from kafka import claim_check
+from kafka.job_shards import split_transactions
 import pandas as pd
 import json as json_module
 
@@ -30,24 +36,41 @@ def run_classifier(body: BatchClassifierListSchema):
     try:
         logger.debug(f"Running classifier")
 
-        # get embeddings from the external API
-        embeddings = create_embeddings_api([i.description for i in body.transactions])
-        embeddings_df = pd.DataFrame(embeddings)
+        model = get_transactions_classifier()
+        cache = get_prediction_cache(model)
 
-        # create a dataframe with the data
-        data = [i.model_dump() for i in body.transactions]
-        df =         pd.DataFrame(data)
-        df = df.drop(["user",'classification'], axis=1)
+        # reuse cached classifications of repeated transactions
+        keys = [cache.key(t.description, t.value, model.version) for t in body.transactions]
+        classifications = cache.get_many(keys) if model.version else [None] * len(keys)
+        model_versions = [model.version] * len(keys)
+        missing = [i for i, classification in enumerate(classifications) if classification is None]
 
-        # add embeddings to the dataframe
-        df = pd.concat([df, embeddings_df], axis=1)
+        if missing:
+            missing_transactions = [body.transactions[i] for i in missing]
 
-        # run model classification
-        model = TransactionsClassifier()
-        classifications = model.predict(df)
+            # get embeddings from the configured backend, duplicated descriptions are embedded once
+            descriptions = [t.description for t in missing_transactions]
+            logger.debug(f"Embedding {len(descriptions)} descriptions, dedupe ratio {dedupe_ratio(descriptions):.1%}")
+            embeddings = create_embeddings(descriptions)
+
+            # create a dataframe with the data
+            data = [t.model_dump() for t in missing_transactions]
+            df =         pd.DataFrame(data)
+            df = df.drop(["user",'classification', 'model_version'], axis=1)
+
+            # add the normalized embeddings to the dataframe, as in training
+            df = attach_embeddings(df, embeddings)
+
+            # run model classification, batched with concurrent requests
+            predictions, model_version = get_batcher(model).predict(df)
+            cache.put_many([cache.key(t.description, t.value, model_version) for t in missing_transactions], list(predictions))
+            for i, classification in zip(missing, predictions):
+                classifications[i] = classification
+                model_versions[i] = model_version
 
         # create a list of classified data
-        classified_data = [{**row.model_dump(), 'classification': classification} for row, classification in zip(body.transactions, list(classifications))]
+        classified_data = [{**row.model_dump(), 'classification': classification, 'model_version': model_version}
+                           for row, classification, model_version in zip(body.transactions, classifications, model_versions)]
         classified_objects = BatchClassifierListSchema(transactions = classified_data) 
        
         return classified_objects.model_dump()
@@ -76,23 +99,34 @@ def batch_classify_async(body: BatchClassifyAsyncRequest):
         
         # Convert transactions to JSON string for storage
         transactions_data = [t.model_dump(mode='json') for t in body.transactions]
-        transactions_json = json_module.dumps(transactions_data)
+        
+        # Large jobs are split into shards processed in parallel by the workers
+        shards = split_transactions(transactions_data)
         
         # Create job in database
         session = Session()
-        batch_job = BatchJob(
-            transactions_input=transactions_json,
-            status=JobStatus.PENDING
-        )
+        batch_job = BatchJob(transactions_input="", status=JobStatus.PENDING)
+        if claim_check.CLAIM_CHECK_ENABLED:
+            # the job row and the Kafka messages only keep references to the stored transactions
+            references = [claim_check.store_transactions(batch_job.id, shard, shard=i if len(shards) > 1 else None)
+                          for i, shard in enumerate(shards)]
+            batch_job.transactions_input = references[0] if len(references) == 1 else json_module.dumps(references)
+        else:
+            references = None
+            batch_job.transactions_input = json_module.dumps(transactions_data)
         session.add(batch_job)
         session.commit()
         
         job_id = batch_job.id
-        logger.info(f"Created batch job {job_id} in database")
+        logger.info(f"Created batch job {job_id} in database with {len(shards)} shards")
         
         # Publish to Kafka
         try:
-            publish_batch_job(job_id, transactions_data)
+            for i, shard in enumerate(shards):
+                payload = {'transactions_ref': references[i]} if references else {'transactions': shard}
+                if len(shards) > 1:
+                    payload.update(shard=i, shard_count=len(shards))
+                publish_batch_job(job_id, **payload)
             logger.info(f"Published batch job {job_id} to Kafka")
         except Exception as kafka_error:
             # If Kafka publish fails, mark job as failed
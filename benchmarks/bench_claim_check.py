@@ -0,0 +1,49 @@
+"""
+Kafka message sizes of a job with its payloads inlined and with claim-check,
+and the time to store and load the payloads in each blob store.
+Stored sizes are the compressed blobs.
+
+Usage:
+    python benchmarks/bench_claim_check.py [n_rows ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_embeddings_codec import make_message, timed
+from kafka import claim_check
+from kafka.claim_check import FilesystemBlobStore, SqliteBlobStore
+from kafka.embeddings_codec import decode_embeddings_message, encode_embeddings_message
+
+
+def store_and_load(message: dict):
+    transactions_ref = claim_check.store_transactions(message['job_id'], message['transactions'])
+    embeddings_ref = claim_check.store_embeddings_message(message)
+    batch_job = json.dumps({'job_id': message['job_id'], 'transactions_ref': transactions_ref})
+    results = json.dumps({'job_id': message['job_id'], 'embeddings_ref': embeddings_ref})
+    claim_check.load_transactions(transactions_ref)
+    claim_check.resolve_embeddings_results(decode_embeddings_message(results))
+    return len(batch_job), len(results)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 10_000]
+    print(f"{'transactions':>12} {'mode':<18} {'batch-jobs B':>13} {'results B':>12} {'stored MB':>10} {'store+load s':>13}")
+    with tempfile.TemporaryDirectory() as root:
+        for n_rows in sizes:
+            message = make_message(n_rows)
+            batch_job = json.dumps({'job_id': message['job_id'], 'transactions': message['transactions']})
+            results = encode_embeddings_message(message, message_format="binary")
+            print(f"{n_rows:>12,} {'inline':<18} {len(batch_job):>13,} {len(results):>12,} {'-':>10} {'-':>13}")
+
+            for label, store in [("claim-check fs", FilesystemBlobStore(os.path.join(root, f"fs-{n_rows}"))),
+                                 ("claim-check sqlite", SqliteBlobStore(os.path.join(root, f"blobs-{n_rows}.sqlite3")))]:
+                claim_check.set_blob_store(store)
+                elapsed, (batch_job_size, results_size) = timed(store_and_load, message)
+                stored = sum(len(store._read(f"{message['job_id']}/{name}")) for name in ("transactions", "embeddings"))
+                print(f"{n_rows:>12,} {label:<18} {batch_job_size:>13,} {results_size:>12,} {stored / 1e6:>10.2f} {elapsed:>13.3f}")
+                store.delete_job(message['job_id'])
@@ -0,0 +1,75 @@
+"""
+Classification worker throughput on many small jobs: one message at a time
+(a predict and a DB transaction per job) against micro-batches of N messages
+(one predict and one DB transaction per batch).
+
+Uses the classifier of bench_classification_worker and the local database;
+the prediction cache is disabled. Kafka is not involved, messages are
+already decoded.
+
+Usage:
+    python benchmarks/bench_classification_batching.py [n_jobs] [rows_per_job]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_classification_worker import make_classifier, make_job
+from machine_learning.prediction_cache import PredictionCache
+from model import Session, BatchJob
+from kafka import classification_worker
+
+
+def make_messages(n_jobs: int, rows_per_job: int) -> list:
+    session = Session()
+    messages = []
+    for seed in range(n_jobs):
+        transactions, embeddings = make_job(rows_per_job, seed=seed)
+        batch_job = BatchJob(transactions_input="[]")
+        session.add(batch_job)
+        messages.append({'job_id': batch_job.id, 'transactions': transactions, 'embeddings': embeddings})
+    session.commit()
+    session.close()
+    return messages
+
+
+def delete_jobs(messages: list):
+    session = Session()
+    session.query(BatchJob).filter(BatchJob.id.in_([m['job_id'] for m in messages])).delete()
+    session.commit()
+    session.close()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    rows_per_job = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as root:
+        classifier = make_classifier(Path(root))
+        classifier.snapshot()
+        classification_worker.get_transactions_classifier = lambda: classifier
+        classification_worker.get_prediction_cache = lambda model: PredictionCache(max_entries=0)
+
+        messages = make_messages(n_jobs, rows_per_job)
+        try:
+            print(f"{n_jobs} jobs of {rows_per_job} transactions")
+            print(f"{'messages/batch':>14} {'seconds':>8} {'jobs/s':>8} {'speedup':>8} {'classify ms/batch':>18} {'db ms/batch':>12}")
+            baseline = None
+            for batch_size in (1, 4, 16, 64):
+                batches = [messages[i:i + batch_size] for i in range(0, n_jobs, batch_size)]
+                start = time.perf_counter()
+                metrics = [classification_worker.process_classification_batch(batch) for batch in batches]
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                classify_ms = sum(m["classify_seconds"] for m in metrics) / len(metrics) * 1000
+                db_ms = sum(m["db_seconds"] for m in metrics) / len(metrics) * 1000
+                print(f"{batch_size:>14} {elapsed:>8.2f} {n_jobs / elapsed:>8.1f} {baseline / elapsed:>7.1f}x "
+                      f"{classify_ms:>18.1f} {db_ms:>12.1f}")
+        finally:
+            delete_jobs(messages)
@@ -0,0 +1,103 @@
+"""
+Per-job time of the classification worker: the previous row by row path
+(a dict and a pd.to_datetime per transaction, DataFrame concat, output dicts
+built in a loop) against classify_transactions (columnar features, embeddings
+kept as a matrix and fed to the preprocessor without concat).
+
+The model is the repository's embedding preprocessor with a logistic
+regression fitted on the classification fixtures. Embeddings are passed as
+an array for both paths; decoding the Kafka message is not measured.
+The prediction cache is disabled.
+
+Usage:
+    python benchmarks/bench_classification_worker.py [n_rows ...]
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import TransactionsClassifier
+from machine_learning.utils import load_pickle
+from kafka.classification_worker import classify_transactions
+
+
+ROOT = Path(os.path.dirname(__file__)).parent
+FIXTURES_PATH = ROOT / "tests" / "classification_fixtures"
+PREPROCESSOR_PATH = ROOT / "machine_learning" / "transactions_classification" / "pipelines" / "embedding_classification_preprocessor.pkl"
+
+
+def make_classifier(root: Path) -> TransactionsClassifier:
+    X = load_pickle(FIXTURES_PATH / "embeddings_X_test_preprocessed.pkl")
+    y = load_pickle(FIXTURES_PATH / "y_predictions_seed_1.pkl")
+    (root / "models").mkdir()
+    (root / "pipelines").mkdir()
+    with open(root / "models" / "embedding_classification_model.pkl", "wb") as f:
+        pickle.dump(LogisticRegression(max_iter=500).fit(X, y), f)
+    shutil.copy(PREPROCESSOR_PATH, root / "pipelines" / PREPROCESSOR_PATH.name)
+    return TransactionsClassifier(root / "models")
+
+
+def make_job(n_rows: int, seed: int = 0) -> tuple:
+    X_test_raw = load_pickle(FIXTURES_PATH / "embeddings_X_test_raw.pkl")
+    rows = np.random.default_rng(seed).integers(0, len(X_test_raw), size=n_rows)
+    sample = X_test_raw.iloc[rows]
+    transactions = [
+        {'date': date.isoformat(), 'description': description, 'value': float(value), 'user': 'ana'}
+        for date, description, value in zip(sample['Data'], sample['Descrição'], sample['Valor'])
+    ]
+    return transactions, sample.filter(like="embedding_").to_numpy()
+
+
+def legacy_classify(transactions, embeddings, classifier):
+    embeddings_df = pd.DataFrame(embeddings, columns=[f'embedding_{i}' for i in range(len(embeddings[0]))])
+    transactions_data = []
+    for t in transactions:
+        transactions_data.append({
+            'Data': pd.to_datetime(t.get('date'), utc=True),
+            'Descrição': t.get('description'),
+            'Valor': t.get('value')
+        })
+    df_combined = pd.concat([pd.DataFrame(transactions_data), embeddings_df], axis=1)
+    model = classifier.snapshot()
+    predictions = model.predict(model.preprocess(df_combined))
+    classified_transactions = []
+    for i, t in enumerate(transactions):
+        classified_transactions.append({
+            'date': t.get('date'),
+            'description': t.get('description'),
+            'value': t.get('value'),
+            'user': t.get('user'),
+            'classification': predictions[i],
+            'model_version': model.version
+        })
+    return classified_transactions
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 10_000, 100_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier = make_classifier(Path(tmp))
+
+    print(f"{'transactions':>12} {'row by row':>12} {'columnar':>10} {'speedup':>8}")
+    for n_rows in sizes:
+        transactions, embeddings = make_job(n_rows)
+        legacy_time, legacy = timed(legacy_classify, transactions, embeddings, classifier)
+        new_time, new = timed(classify_transactions, transactions, embeddings, classifier, PredictionCache(max_entries=0))
+        assert [t['classification'] for t in legacy] == [t['classification'] for t in new]
+        print(f"{n_rows:>12,} {legacy_time:>11.3f}s {new_time:>9.3f}s {legacy_time / new_time:>7.1f}x")
@@ -0,0 +1,92 @@
+"""
+Benchmark of the DistilBERT description features (tokenization.py) against
+the previous implementation, which went through a HuggingFace Dataset and
+reloaded the tokenizer and the model for every 128 rows batch.
+
+Without a model path, a randomly initialised DistilBERT with the
+distilbert-base-uncased architecture is saved to a temporary directory, so
+the benchmark runs offline; throughput does not depend on the weights.
+
+Usage:
+    python benchmarks/bench_distilbert_encoder.py [n_rows] [model_path]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_keyword_hints import MERCHANTS, make_descriptions
+from machine_learning.transactions_classification.lib import tokenization
+from machine_learning.transactions_classification.lib.tokenization import DistilBertEncoder, set_encoder
+
+
+def save_random_distilbert(path: str) -> str:
+    from transformers import DistilBertConfig, DistilBertModel, DistilBertTokenizerFast
+
+    words = sorted({word for merchant in MERCHANTS for word in merchant.split()} | {str(n) for n in range(1000)})
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+    DistilBertTokenizerFast(vocab_file).save_pretrained(path)
+    DistilBertModel(DistilBertConfig(vocab_size=len(words) + 5)).save_pretrained(path)
+    return path
+
+
+def legacy_features(df: pd.DataFrame, model_name: str) -> pd.DataFrame:
+    from datasets import Dataset
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    dataset = Dataset.from_pandas(df).map(
+        lambda batch: tokenizer(batch["Descrição"], padding=True, max_length=120, truncation=True),
+        batched=True, batch_size=128)
+    dataset.set_format("torch", columns=["input_ids", "attention_mask"])
+    dataset = dataset.remove_columns(list(set(dataset.column_names) - {"input_ids", "attention_mask"}))
+
+    def extract_hidden_states(batch):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        inputs = {k: v for k, v in batch.items() if k in tokenizer.model_input_names}
+        with torch.no_grad():
+            return {"cls_hidden_state": model(**inputs).last_hidden_state[:, 0].cpu().numpy()}
+
+    cls_dataset = dataset.map(extract_hidden_states, batched=True, batch_size=128)
+    cls_dataset.set_format(type="pandas")
+    return pd.DataFrame(cls_dataset["cls_hidden_state"].to_list())
+
+
+def new_features(df: pd.DataFrame) -> pd.DataFrame:
+    tokenized = tokenization.tokenized_pytorch_tensors(df, ["input_ids", "attention_mask"])
+    return tokenization.hidden_state_from_text_inputs(tokenized)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    torch.manual_seed(0)
+    df = make_descriptions(n_rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_name = sys.argv[2] if len(sys.argv) > 2 else save_random_distilbert(tmp)
+
+        legacy_time, legacy = timed(legacy_features, df, model_name)
+        set_encoder(None)
+        load_time, encoder = timed(DistilBertEncoder, model_name)
+        set_encoder(encoder)
+        new_time, new = timed(new_features, df)
+
+    np.testing.assert_allclose(legacy.to_numpy(), new.to_numpy(), atol=1e-4)
+    print(f"rows: {n_rows}  threads: {torch.get_num_threads()}")
+    print(f"legacy (Dataset, model reloaded per batch): {legacy_time:.2f}s  {n_rows / legacy_time:,.0f} rows/s")
+    print(f"cached encoder (loaded once in {load_time:.2f}s):  {new_time:.2f}s  {n_rows / new_time:,.0f} rows/s")
+    print(f"speedup: {legacy_time / new_time:.1f}x")
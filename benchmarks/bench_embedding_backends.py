@@ -0,0 +1,66 @@
+"""
+Latency and accuracy of the local hashed n-gram embedding backend against the
+external embedding API, on the transactions of tests/classification_fixtures.
+
+Accuracy is the cross-validated balanced accuracy of a logistic regression
+fitted on each set of embeddings; the fixtures already hold the API
+embeddings. API latency is only measured when EMBEDDING_API_URL is set.
+
+Usage:
+    python benchmarks/bench_embedding_backends.py [batch_size]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from machine_learning.transactions_classification.lib.embedding_backends import HashedNgramBackend
+from machine_learning.utils import load_pickle
+
+
+FIXTURES_PATH = Path(os.path.dirname(__file__)).parent / "tests" / "classification_fixtures"
+
+
+def cross_validated_score(features: np.ndarray, y: np.ndarray) -> float:
+    predictions = cross_val_predict(LogisticRegression(max_iter=2000, C=10), features, y,
+                                    cv=StratifiedKFold(n_splits=3, shuffle=True, random_state=1))
+    return balanced_accuracy_score(y, predictions)
+
+
+def latencies_ms(embed, texts: list, batch_size: int) -> np.ndarray:
+    latencies = []
+    for start in range(0, len(texts), batch_size):
+        begin = time.perf_counter()
+        embed(texts[start:start + batch_size])
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return np.array(latencies)
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    X_test_raw = load_pickle(FIXTURES_PATH / "embeddings_X_test_raw.pkl")
+    y = load_pickle(FIXTURES_PATH / "y_test_encoded.pkl")
+    texts = X_test_raw["Descrição"].tolist()
+    api_features = X_test_raw.filter(like="embedding_").to_numpy(dtype=np.float32)
+
+    backend = HashedNgramBackend()
+    hashed_features = backend.embed_matrix(texts)
+    hashing_latency = latencies_ms(backend.embed, texts * 4, batch_size)
+
+    print(f"fixture transactions: {len(texts)}  classes: {len(np.unique(y))}  batch: {batch_size} texts")
+    print(f"{'backend':<28} {'balanced acc':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    if os.getenv("EMBEDDING_API_URL"):
+        from machine_learning.transactions_classification.lib.external_embedding_api import request_embeddings_api
+        api_latency = latencies_ms(request_embeddings_api, texts, batch_size)
+        api_p50, api_p95 = f"{np.percentile(api_latency, 50):8.1f}", f"{np.percentile(api_latency, 95):8.1f}"
+    else:
+        api_p50 = api_p95 = f"{'n/a':>8}"
+    print(f"{'external API (fixtures)':<28} {cross_validated_score(api_features, y):12.3f} {api_p50} {api_p95}")
+    print(f"{backend.model + ' ' + str(backend.dimensionality):<28} {cross_validated_score(hashed_features, y):12.3f} "
+          f"{np.percentile(hashing_latency, 50):8.2f} {np.percentile(hashing_latency, 95):8.2f}")
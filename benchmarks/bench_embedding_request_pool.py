@@ -0,0 +1,63 @@
+"""
+Embedding round trips and throughput of the embeddings worker on bursty
+small jobs, with and without cross-job request pooling.
+
+The backend stand-in of bench_embeddings_worker_concurrency is limited to
+MAX_CONCURRENT_REQUESTS requests at a time, like a rate-limited embedding
+API, so per-request overhead is what bounds the unpooled worker. Jobs share
+part of their descriptions (recurring merchants).
+
+Usage:
+    python benchmarks/bench_embedding_request_pool.py [n_jobs] [descriptions_per_job]
+"""
+import logging
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_embeddings_worker_concurrency import ROUND_TRIP_SECONDS, SlowBackend, run
+from machine_learning.transactions_classification.lib.embedding_backends import set_embedding_backend
+from kafka import embeddings_worker
+from kafka.embedding_request_pool import EmbeddingRequestPool, set_embedding_pool
+
+
+IN_FLIGHT = 16
+MAX_CONCURRENT_REQUESTS = 2
+
+
+class RateLimitedBackend(SlowBackend):
+    def __init__(self):
+        self.slots = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.requests = 0
+        self.texts = 0
+
+    def embed(self, texts):
+        with self.slots:
+            self.requests += 1
+            self.texts += len(texts)
+            return super().embed(texts)
+
+
+def make_description(job: int, i: int) -> str:
+    # every other description is a recurring merchant shared across jobs
+    return f'mercado {i % 7}' if i % 2 else f'pix {job} {i}'
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    descriptions_per_job = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    embeddings_worker.EMBEDDINGS_WORKER_CONCURRENCY = IN_FLIGHT
+    print(f"{n_jobs} jobs of {descriptions_per_job} descriptions, {IN_FLIGHT} in flight, "
+          f"backend: {ROUND_TRIP_SECONDS * 1000:.0f} ms round trip, {MAX_CONCURRENT_REQUESTS} concurrent requests")
+    print(f"{'mode':<22} {'seconds':>8} {'jobs/s':>8} {'requests':>9} {'texts sent':>11}")
+    for label, max_texts in [("one request per job", 0), ("pooled, max 256 texts", 256), ("pooled, max 2048 texts", 2048)]:
+        backend = RateLimitedBackend()
+        set_embedding_backend(backend)
+        set_embedding_pool(EmbeddingRequestPool(lambda texts: embeddings_worker.fetch_embeddings_with_retry(texts),
+                                                max_texts=max_texts, max_wait_ms=20))
+        elapsed, _ = run(n_jobs, IN_FLIGHT, transactions_per_job=descriptions_per_job, describe=make_description)
+        print(f"{label:<22} {elapsed:>8.2f} {n_jobs / elapsed:>8.1f} {backend.requests:>9} {backend.texts:>11}")
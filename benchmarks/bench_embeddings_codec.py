@@ -0,0 +1,49 @@
+"""
+Size and encode/decode time of an embeddings results message in the previous
+JSON format and in the binary format (float32 and float16 payloads).
+Decoding includes turning the embeddings into the matrix the classification
+worker feeds to the model.
+
+Usage:
+    python benchmarks/bench_embeddings_codec.py [n_rows ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from kafka.embeddings_codec import decode_embeddings_message, encode_embeddings_message
+from machine_learning.transactions_classification.lib.embedding_matrix import EmbeddingMatrix
+
+
+DIMENSIONALITY = 768
+
+
+def make_message(n_rows: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    embeddings = EmbeddingMatrix.from_vectors(rng.normal(size=(n_rows, DIMENSIONALITY))).normalize().values
+    transactions = [{'date': '2024-03-01T00:00:00+00:00', 'description': f'pix recebido {i}', 'value': -12.5, 'user': 'ana',
+                     'classification': None} for i in range(n_rows)]
+    # embedding services answer with JSON floats, i.e. Python floats
+    return {'job_id': 'job-1', 'transactions': transactions, 'embeddings': embeddings.astype(np.float64).tolist()}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 10_000]
+    print(f"{'transactions':>12} {'format':<16} {'size MB':>9} {'encode s':>9} {'decode s':>9}")
+    for n_rows in sizes:
+        message = make_message(n_rows)
+        for label, kwargs in [("json (previous)", {"message_format": "json"}),
+                              ("binary float32", {"message_format": "binary", "dtype": "float32"}),
+                              ("binary float16", {"message_format": "binary", "dtype": "float16"})]:
+            encode_time, encoded = timed(encode_embeddings_message, message, **kwargs)
+            decode_time, _ = timed(lambda value: EmbeddingMatrix.from_vectors(decode_embeddings_message(value)['embeddings']), encoded)
+            print(f"{n_rows:>12,} {label:<16} {len(encoded) / 1e6:>9.2f} {encode_time:>9.3f} {decode_time:>9.3f}")
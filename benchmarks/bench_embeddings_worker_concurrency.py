@@ -0,0 +1,123 @@
+"""
+Throughput of the embeddings worker loop with 1..N jobs in flight.
+
+The embedding backend is a stand-in with a fixed round-trip latency plus a
+per-text cost, and Kafka is replaced by an in-memory consumer (messages spread
+over partitions) and producer, so the numbers isolate the worker's
+concurrency. Job status updates go to the local database as in production.
+
+Usage:
+    python benchmarks/bench_embeddings_worker_concurrency.py [n_jobs]
+"""
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from machine_learning.transactions_classification.lib.embedding_backends import EmbeddingBackend, set_embedding_backend
+from kafka import embeddings_worker
+from kafka.inflight import consume_concurrently
+
+
+ROUND_TRIP_SECONDS = 0.08
+PER_TEXT_SECONDS = 0.0002
+DIMENSIONALITY = 768
+TRANSACTIONS_PER_JOB = 50
+PARTITIONS = 6
+
+
+class SlowBackend(EmbeddingBackend):
+    """
+    Remote embedding service stand-in: sleeps for the round trip, returns random vectors.
+    """
+    name = "slow-fake"
+    model = "fake"
+    dimensionality = DIMENSIONALITY
+
+    def embed(self, texts):
+        time.sleep(ROUND_TRIP_SECONDS + PER_TEXT_SECONDS * len(texts))
+        return np.random.default_rng(len(texts)).normal(size=(len(texts), DIMENSIONALITY)).astype(np.float32)
+
+
+class InMemoryMessage:
+    def __init__(self, partition, offset, key, value):
+        self._partition, self._offset, self._key, self._value = partition, offset, key, value
+
+    def topic(self):
+        return "batch-jobs"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def error(self):
+        return None
+
+
+class InMemoryConsumer:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.stored = {}
+
+    def poll(self, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    def store_offsets(self, message=None, offsets=None):
+        self.stored[message.partition()] = message.offset() + 1
+
+
+class InMemoryProducer:
+    def __init__(self):
+        self.produced = 0
+        self.bytes = 0
+
+    def produce(self, topic, key, value):
+        self.produced += 1
+        self.bytes += len(value)
+
+
+def make_messages(n_jobs: int, transactions_per_job: int = TRANSACTIONS_PER_JOB,
+                  describe=lambda job, i: f'pix {job} {i}') -> list:
+    messages = []
+    for job in range(n_jobs):
+        transactions = [{'date': '2024-03-01T00:00:00+00:00', 'description': describe(job, i), 'value': -12.5,
+                         'user': 'ana', 'classification': None} for i in range(transactions_per_job)]
+        value = json.dumps({'job_id': f'bench-{job}', 'transactions': transactions}).encode("utf8")
+        messages.append(InMemoryMessage(job % PARTITIONS, job // PARTITIONS, f'bench-{job}'.encode("utf8"), value))
+    return messages
+
+
+def run(n_jobs: int, max_in_flight: int, **message_kwargs) -> tuple:
+    consumer, producer = InMemoryConsumer(make_messages(n_jobs, **message_kwargs)), InMemoryProducer()
+    start = time.perf_counter()
+    consume_concurrently(consumer, embeddings_worker.handle_batch_job_message,
+                         embeddings_worker.embeddings_results_publisher(producer), max_in_flight=max_in_flight,
+                         poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    elapsed = time.perf_counter() - start
+    assert producer.produced == n_jobs and sum(consumer.stored.values()) == n_jobs
+    return elapsed, producer
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    set_embedding_backend(SlowBackend())
+    print(f"{n_jobs} jobs of {TRANSACTIONS_PER_JOB} transactions, backend round trip {ROUND_TRIP_SECONDS * 1000:.0f} ms")
+    print(f"{'in flight':>9} {'seconds':>8} {'jobs/s':>8} {'speedup':>8}")
+    baseline = None
+    for max_in_flight in (1, 4, 8, 16):
+        elapsed, _ = run(n_jobs, max_in_flight)
+        baseline = baseline or elapsed
+        print(f"{max_in_flight:>9} {elapsed:>8.2f} {n_jobs / elapsed:>8.1f} {baseline / elapsed:>7.1f}x")
@@ -0,0 +1,70 @@
+"""
+Startup cost of each entry point, measured with `python -X importtime`.
+
+For every entry point a fresh interpreter imports the module and reports the
+total import time, the peak RSS and the heaviest packages, and
+whether torch/transformers/datasets/google-genai were loaded.
+
+Usage:
+    python benchmarks/bench_import_time.py [module ...]
+"""
+import os
+import re
+import subprocess
+import sys
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ENTRY_POINTS = ["app", "kafka.embeddings_worker", "kafka.classification_worker"]
+HEAVY_MODULES = ["torch", "transformers", "datasets", "google.genai"]
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+CHILD = """
+import resource, sys
+import {module}
+print("RSS_KB=" + str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+print("HEAVY=" + ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(module: str) -> dict:
+    """
+    Import `module` in a fresh interpreter.
+    Returns:
+        dict: import time (s), peak RSS (MB), heaviest packages and heavy modules loaded
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+
+    top_level, packages = [], {}
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)), match.group(4)
+        # top-level imports are indented by a single space
+        if len(match.group(3)) == 1:
+            top_level.append((cumulative, name))
+        package = name.split(".")[0]
+        if package != module.split(".")[0]:
+            packages[package] = max(packages.get(package, 0), cumulative)
+
+    markers = dict(line.split("=", 1) for line in completed.stdout.splitlines() if line.startswith(("RSS_KB=", "HEAVY=")))
+    rss_kb, heavy = markers["RSS_KB"], markers["HEAVY"]
+    return {
+        "module": module,
+        "import_seconds": sum(cumulative for cumulative, _ in top_level) / 1e6,
+        "peak_rss_mb": int(rss_kb) / 1024,
+        "heaviest": sorted(((cumulative, name) for name, cumulative in packages.items()), reverse=True)[:5],
+        "heavy_modules": [m for m in heavy.split(",") if m],
+    }
+
+
+if __name__ == "__main__":
+    for module in sys.argv[1:] or ENTRY_POINTS:
+        result = measure(module)
+        print(f"{result['module']}: {result['import_seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB, "
+              f"heavy modules: {', '.join(result['heavy_modules']) or 'none'}")
+        for cumulative, name in result["heaviest"]:
+            print(f"    {cumulative / 1e6:6.2f}s  {name}")
@@ -0,0 +1,79 @@
+"""
+Peak memory of classifying one large job, by feature dtype and inference
+batch size. Each configuration runs in a fresh process and reports its peak
+RSS (VmHWM, Linux only) above the RSS once the model is loaded, i.e. the
+job's embedding matrix plus everything preprocess + predict allocate.
+
+The model is the one of bench_classification_worker.py.
+
+Usage:
+    python benchmarks/bench_inference_memory.py [n_rows]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# (label, embedding storage dtype, feature dtype, batch size; 0 = whole job)
+CONFIGURATIONS = [
+    ("float64, whole job (previous)", "float64", "float64", 0),
+    ("float32, whole job", "float32", "float32", 0),
+    ("float32, batches of 32768", "float32", "float32", 32768),
+    ("float32, batches of 8192", "float32", "float32", 8192),
+    ("float32, batches of 1024", "float32", "float32", 1024),
+    ("float16 storage, batches of 8192", "float16", "float32", 8192),
+]
+
+
+def memory_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def run(n_rows: int, storage_dtype: str, dtype: str, batch_size: int) -> None:
+    import gc
+    import time
+    import numpy as np
+    from bench_classification_worker import FIXTURES_PATH, make_classifier
+    from machine_learning.transactions_classification.lib.embedding_matrix import EmbeddingMatrix
+    from machine_learning.utils import load_pickle
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = make_classifier(Path(tmp)).snapshot()
+    gc.collect()
+    baseline = memory_kb("VmRSS")
+
+    X_test_raw = load_pickle(FIXTURES_PATH / "embeddings_X_test_raw.pkl")
+    rows = np.random.default_rng(0).integers(0, len(X_test_raw), size=n_rows)
+    fixture_embeddings = EmbeddingMatrix.from_vectors(X_test_raw.filter(like="embedding_").to_numpy(), dtype=np.float32)
+    fixture_embeddings = fixture_embeddings.normalize().astype(storage_dtype).values
+    embeddings = fixture_embeddings[rows]
+    X = X_test_raw[["Data", "Descrição", "Valor"]].iloc[rows].reset_index(drop=True)
+    del X_test_raw
+    gc.collect()
+
+    start = time.perf_counter()
+    predictions = model.predict_columns(X, embeddings, dtype=np.dtype(dtype), batch_size=batch_size or len(X))
+    elapsed = time.perf_counter() - start
+    print(f"RESULT {embeddings.nbytes / 1e6:.0f} {(memory_kb('VmHWM') - baseline) / 1e3:.0f} {elapsed:.2f} {len(predictions)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run(int(sys.argv[2]), sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        sys.exit(0)
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"rows: {n_rows}")
+    print(f"{'configuration':<34} {'embeddings MB':>13} {'peak MB':>8} {'seconds':>8}")
+    for label, storage_dtype, dtype, batch_size in CONFIGURATIONS:
+        output = subprocess.run([sys.executable, __file__, "--run", str(n_rows), storage_dtype, dtype, str(batch_size)],
+                                capture_output=True, text=True, check=True).stdout
+        _, embeddings_mb, peak_mb, seconds, _ = next(line for line in output.splitlines() if line.startswith("RESULT")).split()
+        print(f"{label:<34} {embeddings_mb:>13} {peak_mb:>8} {seconds:>8}")
@@ -0,0 +1,58 @@
+"""
+Benchmark of feature_engineering.add_keyword_hints against the previous
+implementation (one Series.apply per keyword).
+
+Usage:
+    python benchmarks/bench_keyword_hints.py [n_rows]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from machine_learning.transactions_classification.lib.feature_engineering import add_keyword_hints, KEYWORD_HINT_FEATURES
+
+
+MERCHANTS = [
+    "pix recebido joao silva", "uber trip help.uber.com", "ifd*restaurante sabor", "pag*conta light rio",
+    "pg *mercado pago", "aplicação cdb banco", "salário empresa ltda", "supermercado zona sul",
+    "amazon marketplace", "farmacia pacheco", "posto ipiranga", "netflix.com", "spotify",
+]
+
+
+def legacy_add_keyword_hints(complete_dataset):
+    for tag in KEYWORD_HINT_FEATURES:
+        complete_dataset[tag] = complete_dataset['Descrição'].apply(lambda x: 1 if tag in x else 0)
+    return complete_dataset[KEYWORD_HINT_FEATURES]
+
+
+def make_descriptions(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    merchants = np.array(MERCHANTS, dtype=object)[rng.integers(0, len(MERCHANTS), size=n_rows)]
+    # a share of unique descriptions (ids, installments) like real statements
+    suffixes = rng.integers(0, n_rows // 10 + 1, size=n_rows).astype(str)
+    descriptions = np.where(rng.random(n_rows) < 0.3, merchants + " " + suffixes, merchants)
+    return pd.DataFrame({'Descrição': descriptions})
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df.copy())
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = make_descriptions(n_rows)
+
+    legacy_time, legacy = timed(legacy_add_keyword_hints, df)
+    new_time, new = timed(add_keyword_hints, df)
+
+    assert np.array_equal(legacy.to_numpy(), new.to_numpy()), "Keyword hints differ from the legacy implementation"
+    print(f"rows: {n_rows}")
+    print(f"legacy (Series.apply per keyword): {legacy_time:.3f}s  {legacy.memory_usage(index=False).sum() / 1e6:.1f} MB")
+    print(f"single pass matcher:               {new_time:.3f}s  {new.memory_usage(index=False).sum() / 1e6:.1f} MB")
+    print(f"speedup: {legacy_time / new_time:.1f}x")
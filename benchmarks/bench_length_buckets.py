@@ -0,0 +1,62 @@
+"""
+Benchmark of length-bucketed padding in DistilBertEncoder on a bank statement
+like length distribution: most descriptions are a handful of tokens, a few
+(PIX messages, boleto lines) run to the 120 tokens limit.
+
+Usage:
+    python benchmarks/bench_length_buckets.py [n_rows] [model_path]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_distilbert_encoder import save_random_distilbert
+from bench_keyword_hints import MERCHANTS
+from machine_learning.transactions_classification.lib.tokenization import DistilBertEncoder
+
+
+def make_texts(n_rows: int, long_share: float = 0.05, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    words = [word for merchant in MERCHANTS for word in merchant.split()]
+    texts = []
+    for _ in range(n_rows):
+        if rng.random() < long_share:
+            n_words = rng.integers(30, 120)
+        else:
+            n_words = rng.integers(2, 8)
+        texts.append(" ".join(rng.choice(words, size=n_words)))
+    return texts
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000
+    torch.manual_seed(0)
+    texts = make_texts(n_rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_name = sys.argv[2] if len(sys.argv) > 2 else save_random_distilbert(tmp)
+        encoder = DistilBertEncoder(model_name)
+
+    tokenized = encoder.tokenize(texts)
+    lengths = np.array([len(ids) for ids in tokenized["input_ids"]])
+    encoder.encode_tokenized({k: v[:256] for k, v in tokenized.items()})  # warm up
+
+    plain_time, plain = timed(encoder.encode_tokenized, tokenized, bucket_by_length=False)
+    bucketed_time, bucketed = timed(encoder.encode_tokenized, tokenized, bucket_by_length=True)
+
+    np.testing.assert_allclose(plain, bucketed, atol=1e-4)
+    print(f"rows: {n_rows}  tokens per text: median {np.median(lengths):.0f}, p95 {np.percentile(lengths, 95):.0f}, max {lengths.max()}")
+    print(f"input order batches: {plain_time:.2f}s  {n_rows / plain_time:,.0f} rows/s")
+    print(f"length buckets:      {bucketed_time:.2f}s  {n_rows / bucketed_time:,.0f} rows/s")
+    print(f"speedup: {plain_time / bucketed_time:.1f}x")
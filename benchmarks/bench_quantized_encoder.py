@@ -0,0 +1,69 @@
+"""
+Throughput and latency of the full precision and int8 dynamically quantized
+DistilBERT encoders on CPU.
+
+Without a model path, a randomly initialised DistilBERT with the
+distilbert-base-uncased architecture is used (see bench_distilbert_encoder.py).
+
+Usage:
+    python benchmarks/bench_quantized_encoder.py [n_rows] [num_threads] [model_path]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_distilbert_encoder import save_random_distilbert
+from bench_length_buckets import make_texts
+from machine_learning.transactions_classification.lib.tokenization import DistilBertEncoder
+
+
+LATENCY_BATCH_SIZE = 32
+
+
+def measure(encoder: DistilBertEncoder, texts: list) -> dict:
+    tokenized = encoder.tokenize(texts)
+    encoder.encode_tokenized({k: v[:64] for k, v in tokenized.items()})  # warm up
+
+    start = time.perf_counter()
+    features = encoder.encode_tokenized(tokenized)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for offset in range(0, min(len(texts), 20 * LATENCY_BATCH_SIZE), LATENCY_BATCH_SIZE):
+        batch = texts[offset:offset + LATENCY_BATCH_SIZE]
+        start = time.perf_counter()
+        encoder.encode(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "features": features,
+        "rows_per_second": len(texts) / elapsed,
+        "p50_ms": np.percentile(latencies, 50),
+        "p95_ms": np.percentile(latencies, 95),
+    }
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    num_threads = int(sys.argv[2]) if len(sys.argv) > 2 else torch.get_num_threads()
+    torch.manual_seed(0)
+    texts = make_texts(n_rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_name = sys.argv[3] if len(sys.argv) > 3 else save_random_distilbert(tmp)
+        full_precision = DistilBertEncoder(model_name, device=torch.device("cpu"), num_threads=num_threads)
+        quantized = DistilBertEncoder(model_name, device=torch.device("cpu"), quantize=True, num_threads=num_threads)
+
+    results = {"float32": measure(full_precision, texts), "int8 dynamic": measure(quantized, texts)}
+    expected, actual = results["float32"]["features"], results["int8 dynamic"]["features"]
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+
+    print(f"rows: {n_rows}  threads: {torch.get_num_threads()}  latency batch: {LATENCY_BATCH_SIZE} rows")
+    for name, result in results.items():
+        print(f"{name:>13}: {result['rows_per_second']:8,.0f} rows/s  p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms")
+    print(f"speedup: {results['int8 dynamic']['rows_per_second'] / results['float32']['rows_per_second']:.1f}x  "
+          f"CLS cosine similarity: min {cosine.min():.4f}, mean {cosine.mean():.4f}")
@@ -0,0 +1,116 @@
+"""
+End-to-end job latency of the split topology (embeddings_worker, then the
+embeddings-results message, then classification_worker) against the fused
+worker, which classifies with the embeddings kept in memory.
+
+Both run the workers' own code against the local database, with an embedding
+backend stand-in (fixed round trip, fixture vectors of 768 dimensions) and the
+classifier of bench_classification_worker. The split path encodes and decodes
+the embeddings-results message as the workers do; the broker round trip it
+would add on top (producing, replicating and fetching the message) is not
+measured, so its numbers are a lower bound.
+
+Usage:
+    python benchmarks/bench_worker_topologies.py [n_rows ...]
+"""
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_classification_worker import make_classifier, make_job
+from bench_embeddings_worker_concurrency import ROUND_TRIP_SECONDS, SlowBackend
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classification.lib.embedding_backends import set_embedding_backend
+from model import Session, BatchJob, JobStatus
+from kafka import classification_worker, embeddings_worker, fused_worker
+from kafka.embeddings_codec import decode_embeddings_message
+
+
+REPEATS = 3
+
+
+class FixtureBackend(SlowBackend):
+    """
+    SlowBackend returning the fixture embeddings of the job's descriptions.
+    """
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    def embed(self, texts):
+        time.sleep(ROUND_TRIP_SECONDS)
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+def create_job(transactions) -> str:
+    session = Session()
+    batch_job = BatchJob(transactions_input=json.dumps(transactions))
+    session.add(batch_job)
+    session.commit()
+    job_id = batch_job.id
+    session.close()
+    return job_id
+
+
+def finish_job(job_id) -> None:
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    assert batch_job.status == JobStatus.COMPLETED, batch_job.error_message
+    session.delete(batch_job)
+    session.commit()
+    session.close()
+
+
+def run_split(job_id, transactions) -> dict:
+    start = time.perf_counter()
+    result_message = embeddings_worker.process_batch_job({'job_id': job_id, 'transactions': transactions})
+    embedded = time.perf_counter()
+    value = embeddings_worker.encode_embeddings_results(result_message)
+    decoded = decode_embeddings_message(value)
+    transferred = time.perf_counter()
+    classification_worker.process_classification(decoded)
+    end = time.perf_counter()
+    return {"total": end - start, "serialization": transferred - embedded, "message_bytes": len(value)}
+
+
+def run_fused(job_id, transactions) -> dict:
+    start = time.perf_counter()
+    fused_worker.process_fused_job({'job_id': job_id, 'transactions': transactions})
+    return {"total": time.perf_counter() - start, "serialization": 0.0, "message_bytes": 0}
+
+
+def measure(run, transactions) -> dict:
+    runs = []
+    for _ in range(REPEATS):
+        job_id = create_job(transactions)
+        runs.append(run(job_id, transactions))
+        finish_job(job_id)
+    return {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1_000, 10_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier = make_classifier(Path(tmp))
+    classification_worker.get_transactions_classifier = lambda: classifier
+    classification_worker.get_prediction_cache = lambda model: PredictionCache(max_entries=0)
+
+    print(f"embedding backend: {ROUND_TRIP_SECONDS * 1000:.0f} ms round trip, median of {REPEATS} jobs, broker time excluded")
+    print(f"{'transactions':>12} {'split':>9} {'(encode+decode)':>16} {'message':>10} {'fused':>9} {'saved':>7}")
+    for n_rows in sizes:
+        transactions, embeddings = make_job(n_rows)
+        set_embedding_backend(FixtureBackend({t['description']: e for t, e in zip(transactions, embeddings)}))
+        split = measure(run_split, transactions)
+        fused = measure(run_fused, transactions)
+        print(f"{n_rows:>12,} {split['total'] * 1000:>7.0f}ms {split['serialization'] * 1000:>14.0f}ms "
+              f"{split['message_bytes'] / 1e6:>8.2f}MB {fused['total'] * 1000:>7.0f}ms "
+              f"{1 - fused['total'] / split['total']:>6.0%}")
@@ -32,7 +32,7 @@ if [ "$WORKER_TYPE" != "api" ]; then
     fi
     
     if [ -z "$EMBEDDING_API_URL" ]; then
-        echo "⚠️  WARNING: EMBEDDING_API_URL not set (required for embeddings worker)"
+        echo "⚠️  WARNING: EMBEDDING_API_URL not set (required for embeddings and fused workers)"
     fi
     
     # Wait for Kafka to be ready
@@ -42,8 +42,8 @@ if [ "$WORKER_TYPE" != "api" ]; then
 }
 fi
 
-# Check if ML models exist (for API and classification worker)
-if [ "$WORKER_TYPE" = "api" ] || [ "$WORKER_TYPE" = "classification" ]; then
+# Check if ML models exist (for API, classification and fused workers)
+if [ "$WORKER_TYPE" = "api" ] || [ "$WORKER_TYPE" = "classification" ] || [ "$WORKER_TYPE" = "fused" ]; then
     echo "🤖 Checking ML models..."
     MODEL_PATH="${MODEL_PATH:-/app/machine_learning/transactions_classification/models/}"
     
@@ -7,11 +7,21 @@ bind = "0.0.0.0:5000"
 
 # Worker processes
 workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# gthread workers let the micro-batcher coalesce concurrent /batchclassifier requests,
+# with sync workers it is off (MICRO_BATCH_MAX_WAIT_MS only applies to threaded workers)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
 
+# Model preloading
+# With preload_app the ML models are loaded once in the master and inherited by
+# every forked worker (including the ones recycled by max_requests).
+# Otherwise each worker loads them right after fork, before serving requests.
+preload_app = os.getenv("GUNICORN_PRELOAD_APP", "false").lower() == "true"
+warm_models_on_fork = os.getenv("GUNICORN_WARM_MODELS", "true").lower() == "true"
+
 # Timeout
 # Increased to 120 seconds for ML classification requests that may take longer
 timeout = 120
@@ -38,3 +48,24 @@ tmp_upload_dir = None
 # keyfile = None
 # certfile = None
 
+
+# Server hooks
+def when_ready(server):
+    if preload_app:
+        from machine_learning.model_registry import registry
+        registry.warm_up()
+        server.log.info(f"Models preloaded in master: {registry.stats()}")
+
+
+def post_fork(server, worker):
+    from machine_learning.model_registry import registry, watch_transactions_classifier
+    if warm_models_on_fork:
+        registry.warm_up()
+    # watcher threads do not survive fork, start one per worker
+    watch_transactions_classifier()
+
+
+def worker_exit(server, worker):
+    # deliver batch jobs still queued in this worker's Kafka producer
+    from kafka.batch_job_publisher import get_publisher
+    get_publisher().close()
@@ -1,44 +1,219 @@
+import atexit
 import json
 import logging
-from quixstreams import Application
+import threading
+from quixstreams.kafka import Producer
 import os
 import dotenv
+from kafka.job_shards import shard_key
 
 dotenv.load_dotenv()
 KAFKA_BROKER_ADDRESS = os.getenv('KAFKA_BROKER_ADDRESS', 'localhost:9092')
 BATCH_JOBS_TOPIC = os.getenv('BATCH_JOBS_TOPIC', 'batch-jobs')
+# batching of concurrent publishes: wait up to linger ms to fill batches of up to batch size bytes
+KAFKA_PRODUCER_LINGER_MS = int(os.getenv('KAFKA_PRODUCER_LINGER_MS', '5'))
+KAFKA_PRODUCER_BATCH_SIZE = int(os.getenv('KAFKA_PRODUCER_BATCH_SIZE', '1048576'))
+KAFKA_PRODUCER_COMPRESSION = os.getenv('KAFKA_PRODUCER_COMPRESSION', 'lz4')
+# seconds to wait for pending deliveries at shutdown
+KAFKA_PRODUCER_FLUSH_TIMEOUT = float(os.getenv('KAFKA_PRODUCER_FLUSH_TIMEOUT', '10'))
+# how often the background thread serves delivery callbacks
+KAFKA_PRODUCER_POLL_INTERVAL = float(os.getenv('KAFKA_PRODUCER_POLL_INTERVAL', '0.1'))
 
 logger = logging.getLogger(__name__)
 
 
-def publish_batch_job(job_id: str, transactions: list):
+def create_producer() -> Producer:
     """
-    Publish a batch classification job to Kafka
-    
+    Kafka producer for the batch-jobs topic, with linger/batch tuning
+    """
+    return Producer(
+        broker_address=KAFKA_BROKER_ADDRESS,
+        extra_config={
+            "linger.ms": KAFKA_PRODUCER_LINGER_MS,
+            "batch.size": KAFKA_PRODUCER_BATCH_SIZE,
+            "compression.type": KAFKA_PRODUCER_COMPRESSION,
+        },
+        flush_timeout=KAFKA_PRODUCER_FLUSH_TIMEOUT,
+    )
+
+
+def mark_job_publish_failed(job_id: str, error_message: str):
+    """
+    Mark a job whose batch-jobs message could not be delivered as failed
+
     Args:
-        job_id: Unique identifier for the job
-        transactions: List of transaction dictionaries to classify
+        job_id: Job identifier
+        error_message: Delivery error
     """
+    from model import Session, BatchJob, JobStatus
+
     try:
-        app = Application(
-            broker_address=KAFKA_BROKER_ADDRESS,
-            loglevel="DEBUG",
+        session = Session()
+        batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+        if batch_job:
+            batch_job.status = JobStatus.FAILED
+            batch_job.error_message = f"Failed to publish to Kafka: {error_message}"
+            session.commit()
+        else:
+            logger.warning(f"Job {job_id} not found in database")
+        session.close()
+    except Exception as e:
+        logger.error(f"Failed to mark job {job_id} as failed: {str(e)}")
+
+
+class BatchJobPublisher:
+    """
+    Long-lived, thread-safe publisher of batch jobs.
+
+    The producer is created on first use in each process, so gunicorn workers
+    forked from a preloaded master never share the master's connections.
+    publish() returns once the message is queued; a background thread serves
+    the delivery callbacks, which mark the job failed when delivery fails.
+    """
+
+    def __init__(self, producer_factory=create_producer, on_delivery_failed=mark_job_publish_failed,
+                 topic: str = BATCH_JOBS_TOPIC, poll_interval: float = KAFKA_PRODUCER_POLL_INTERVAL,
+                 flush_timeout: float = KAFKA_PRODUCER_FLUSH_TIMEOUT):
+        self.producer_factory = producer_factory
+        self.on_delivery_failed = on_delivery_failed
+        self.topic = topic
+        self.poll_interval = poll_interval
+        self.flush_timeout = flush_timeout
+        self._producer = None
+        self._pid = None
+        self._poller = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def producer(self):
+        """
+        The producer of the current process, created on first use after fork
+        """
+        with self._lock:
+            if self._producer is None or self._pid != os.getpid():
+                self._producer = self.producer_factory()
+                self._pid = os.getpid()
+                self._stop = threading.Event()
+                self._poller = threading.Thread(target=self._poll_loop, args=(self._producer, self._stop),
+                                                name="batch-job-publisher-poller", daemon=True)
+                self._poller.start()
+                logger.info(f"Created Kafka producer for {self.topic} in process {self._pid}")
+            return self._producer
+
+    def _poll_loop(self, producer, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                producer.poll(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Kafka producer poll failed: {str(e)}")
+                stop.wait(self.poll_interval)
+
+    def _delivery_callback(self, job_id: str):
+        def on_delivery(error, message):
+            if error is not None:
+                logger.error(f"Delivery of batch job {job_id} failed: {error}")
+                self.on_delivery_failed(job_id, str(error))
+            else:
+                # success leaves the job as is, a worker may already be processing it
+                logger.debug(f"Delivered batch job {job_id} to {message.topic()} [{message.partition()}] @ {message.offset()}")
+        return on_delivery
+
+    def publish(self, job_id: str, message: dict, key: str = None):
+        """
+        Queue a batch-jobs message (keyed by job id unless key is given); delivery is reported asynchronously
+        """
+        self.producer.produce(
+            topic=self.topic,
+            key=key or job_id,
+            value=json.dumps(message),
+            on_delivery=self._delivery_callback(job_id),
         )
 
-        with app.get_producer() as producer:
+    def flush(self, timeout: float = None) -> int:
+        """
+        Wait for queued messages to be delivered
+
+        Returns:
+            Number of messages still pending
+        """
+        with self._lock:
+            producer = self._producer if self._pid == os.getpid() else None
+        if producer is None:
+            return 0
+        return producer.flush(self.flush_timeout if timeout is None else timeout)
+
+    def close(self):
+        """
+        Flush pending messages and stop the callback thread, at process shutdown
+        """
+        remaining = self.flush()
+        if remaining:
+            logger.warning(f"{remaining} batch job messages not delivered before shutdown")
+        with self._lock:
+            self._stop.set()
+            if self._poller is not None and self._pid == os.getpid():
+                self._poller.join(timeout=self.poll_interval * 10)
+            self._producer = None
+            self._poller = None
+            self._pid = None
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> BatchJobPublisher:
+    """
+    Process-wide batch job publisher, flushed at interpreter exit
+    """
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = BatchJobPublisher()
+            atexit.register(_publisher.close)
+        return _publisher
+
+
+def set_publisher(publisher):
+    global _publisher
+    with _publisher_lock:
+        _publisher = publisher
+
+
+def publish_batch_job(job_id: str, transactions: list = None, transactions_ref: str = None,
+                      shard: int = None, shard_count: int = None):
+    """
+    Publish a batch classification job (or one shard of it) to Kafka
+
+    Args:
+        job_id: Unique identifier for the job
+        transactions: List of transaction dictionaries to classify
+        transactions_ref: Claim-check reference of the transactions, sent instead of them
+        shard: Index of the shard, for jobs split in shard_count shards
+        shard_count: Number of shards of the job
+    """
+    try:
+        if transactions_ref is not None:
+            message = {
+                "job_id": job_id,
+                "transactions_ref": transactions_ref
+            }
+        else:
             message = {
                 "job_id": job_id,
                 "transactions": transactions
             }
-            
-            producer.produce(
-                topic=BATCH_JOBS_TOPIC,
-                key=job_id,
-                value=json.dumps(message),
-            )
-            
-            logger.info(f"Published batch job {job_id} to Kafka topic {BATCH_JOBS_TOPIC}")
-            
+
+        key = None
+        if shard is not None:
+            message.update(shard=shard, shard_count=shard_count)
+            key = shard_key(job_id, shard)
+
+        get_publisher().publish(job_id, message, key=key)
+
+        logger.info(f"Queued batch job {key or job_id} for Kafka topic {BATCH_JOBS_TOPIC}")
+
     except Exception as e:
         logger.error(f"Failed to publish batch job {job_id}: {str(e)}")
         raise
@@ -57,4 +232,4 @@ if __name__ == "__main__":
         }
     ]
     publish_batch_job("test-job-123", test_transactions)
-
+    get_publisher().close()
@@ -0,0 +1,259 @@
+"""
+Claim-check storage of large job payloads.
+
+With CLAIM_CHECK_ENABLED, the transactions of a job and its embeddings
+results are written compressed to a blob store shared by the API and the
+workers, and the Kafka messages only carry the job id and a reference to the
+blob, so their size does not depend on the batch size. BatchJob.transactions_input
+holds the reference instead of a second copy of the transactions.
+
+Blob stores:
+    filesystem   one file per blob under CLAIM_CHECK_PATH
+    sqlite       a BLOB table in the SQLite database at CLAIM_CHECK_PATH
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from logging import getLogger
+from pathlib import Path
+from typing import Optional
+from kafka.embeddings_codec import decode_embeddings_message, encode_embeddings_message
+
+
+CLAIM_CHECK_ENABLED = os.getenv('CLAIM_CHECK_ENABLED', 'false').lower() == 'true'
+CLAIM_CHECK_STORE = os.getenv('CLAIM_CHECK_STORE', 'filesystem')
+CLAIM_CHECK_PATH = os.getenv('CLAIM_CHECK_PATH', 'database/blobs')
+CLAIM_CHECK_COMPRESSION_LEVEL = int(os.getenv('CLAIM_CHECK_COMPRESSION_LEVEL', '1'))
+
+# prefix of BatchJob.transactions_input values that are blob references
+REFERENCE_PREFIX = "claim-check:"
+
+logger = getLogger(__name__)
+
+
+class BlobStore:
+    """
+    Key/value store of compressed blobs. Keys look like "<job_id>/<name>".
+    """
+
+    def __init__(self, compression_level: int = CLAIM_CHECK_COMPRESSION_LEVEL):
+        self.compression_level = compression_level
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        Store data under key.
+        Returns:
+            str: reference to pass to get()
+        """
+        self._write(key, zlib.compress(data, self.compression_level))
+        return key
+
+    def get(self, reference: str) -> bytes:
+        return zlib.decompress(self._read(reference))
+
+    def delete_job(self, job_id: str) -> int:
+        """
+        Delete every blob of a job.
+        Returns:
+            int: number of deleted blobs
+        """
+        raise NotImplementedError
+
+    def _write(self, key: str, compressed: bytes) -> None:
+        raise NotImplementedError
+
+    def _read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+
+class FilesystemBlobStore(BlobStore):
+    """
+    One file per blob, written atomically (write then rename).
+    """
+
+    def __init__(self, root=CLAIM_CHECK_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        job_id, _, name = key.partition("/")
+        if not job_id or not name or ".." in key or key.startswith("/"):
+            raise ValueError(f"Invalid blob key {key!r}")
+        return self.root / job_id / name
+
+    def _write(self, key: str, compressed: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(compressed)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def delete_job(self, job_id: str) -> int:
+        job_dir = self.root / job_id
+        if not job_dir.is_dir():
+            return 0
+        deleted = 0
+        for path in job_dir.iterdir():
+            path.unlink(missing_ok=True)
+            deleted += 1
+        job_dir.rmdir()
+        return deleted
+
+
+class SqliteBlobStore(BlobStore):
+    """
+    Blobs in a SQLite table, safe to share between threads and processes.
+    """
+
+    def __init__(self, path=CLAIM_CHECK_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    key TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_blobs_job_id ON blobs (job_id)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, key: str, compressed: bytes) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO blobs (key, job_id, data, created_at) VALUES (?, ?, ?, ?)",
+                               (key, key.partition("/")[0], compressed, time.time()))
+
+    def _read(self, key: str) -> bytes:
+        row = self._connection().execute("SELECT data FROM blobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(f"Blob {key!r} not found")
+        return row[0]
+
+    def delete_job(self, job_id: str) -> int:
+        connection = self._connection()
+        with connection:
+            return connection.execute("DELETE FROM blobs WHERE job_id = ?", (job_id,)).rowcount
+
+
+BLOB_STORES = {
+    "filesystem": FilesystemBlobStore,
+    "sqlite": SqliteBlobStore,
+}
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """
+    Process-wide blob store selected by CLAIM_CHECK_STORE.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                store_class = BLOB_STORES[CLAIM_CHECK_STORE]
+            except KeyError:
+                raise ValueError(f"Unknown claim-check store {CLAIM_CHECK_STORE!r}, expected one of {sorted(BLOB_STORES)}")
+            _store = store_class(CLAIM_CHECK_PATH)
+        return _store
+
+
+def set_blob_store(store: Optional[BlobStore]) -> None:
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def is_reference(value: Optional[str]) -> bool:
+    """
+    Whether a BatchJob.transactions_input value is a reference, or a JSON list of references of a sharded job.
+    """
+    if not isinstance(value, str):
+        return False
+    return value.startswith(REFERENCE_PREFIX) or value.startswith(f'["{REFERENCE_PREFIX}')
+
+
+def _blob_name(name: str, shard: Optional[int] = None) -> str:
+    return name if shard is None else f"{name}-{shard}"
+
+
+def store_transactions(job_id: str, transactions: list, shard: Optional[int] = None) -> str:
+    """
+    Store the input transactions of a job (or of one of its shards).
+    Returns:
+        str: reference, prefixed with REFERENCE_PREFIX
+    """
+    key = get_blob_store().put(f"{job_id}/{_blob_name('transactions', shard)}", json.dumps(transactions).encode("utf-8"))
+    return REFERENCE_PREFIX + key
+
+
+def load_transactions(reference: str) -> list:
+    return json.loads(get_blob_store().get(reference[len(REFERENCE_PREFIX):]))
+
+
+def store_embeddings_message(message: dict) -> str:
+    """
+    Store an embeddings results message (binary encoded).
+    Returns:
+        str: reference, prefixed with REFERENCE_PREFIX
+    """
+    encoded = encode_embeddings_message(message, message_format="binary")
+    key = get_blob_store().put(f"{message['job_id']}/{_blob_name('embeddings', message.get('shard'))}", encoded)
+    return REFERENCE_PREFIX + key
+
+
+def load_embeddings_message(reference: str) -> dict:
+    return decode_embeddings_message(get_blob_store().get(reference[len(REFERENCE_PREFIX):]))
+
+
+def resolve_batch_job(message: dict) -> dict:
+    """
+    batch-jobs message with its transactions, loaded from the blob store when claim-checked.
+    """
+    if 'transactions_ref' in message:
+        message = dict(message)
+        message['transactions'] = load_transactions(message.pop('transactions_ref'))
+    return message
+
+
+def resolve_embeddings_results(message: dict) -> dict:
+    """
+    embeddings-results message with its payload, loaded from the blob store when claim-checked.
+    """
+    if 'embeddings_ref' in message:
+        return load_embeddings_message(message['embeddings_ref'])
+    return message
+
+
+def release_job(job_id: str) -> None:
+    """
+    Delete the blobs of a finished job; missing blobs are ignored.
+    """
+    try:
+        deleted = get_blob_store().delete_job(job_id)
+        if deleted:
+            logger.info(f"Deleted {deleted} claim-check blobs of job {job_id}")
+    except Exception as e:
+        logger.error(f"Failed to delete claim-check blobs of job {job_id}: {e}")
@@ -4,18 +4,28 @@ import os
 import dotenv
 import logging
 import sys
+import time
+import numpy as np
 import pandas as pd
 
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from model import Session, BatchJob, JobStatus
-from machine_learning.transactions_classifier import TransactionsClassifier
+from machine_learning.model_registry import get_transactions_classifier, registry, watch_transactions_classifier
+from machine_learning.prediction_cache import get_prediction_cache
+from machine_learning.transactions_classification.lib.embedding_matrix import EMBEDDING_STORAGE_DTYPE, EmbeddingMatrix
+from kafka.embeddings_codec import decode_embeddings_message
+from kafka import claim_check
+from kafka.job_shards import complete_shard, is_sharded
 
 dotenv.load_dotenv()
 KAFKA_BROKER_ADDRESS = os.getenv('KAFKA_BROKER_ADDRESS', 'localhost:9092')
 EMBEDDINGS_RESULTS_TOPIC = os.getenv('EMBEDDINGS_RESULTS_TOPIC', 'embeddings-results')
 CONSUMER_GROUP = os.getenv('CLASSIFICATION_CONSUMER_GROUP', 'classification_worker')
+# micro-batching: classify up to max messages together, waiting at most max wait ms after the first one
+CLASSIFICATION_BATCH_MAX_MESSAGES = int(os.getenv('CLASSIFICATION_BATCH_MAX_MESSAGES', '16'))
+CLASSIFICATION_BATCH_MAX_WAIT_MS = float(os.getenv('CLASSIFICATION_BATCH_MAX_WAIT_MS', '50'))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -71,75 +81,280 @@ def update_job_failed(job_id, error_message):
         logger.error(f"Failed to update job {job_id} as failed: {str(e)}")
 
 
+def transactions_features(transactions):
+    """
+    Tabular features of the transactions, parsed column by column
+
+    Args:
+        transactions: List of transaction dicts (date, description, value)
+
+    Returns:
+        DataFrame with the Data, Descrição and Valor columns
+    """
+    return pd.DataFrame({
+        'Data': pd.to_datetime([t.get('date') for t in transactions], utc=True),
+        'Descrição': [t.get('description') for t in transactions],
+        'Valor': np.array([t.get('value') for t in transactions], dtype=np.float64),
+    })
+
+
+def classify_transactions(transactions, embeddings, classifier=None, cache=None):
+    """
+    Classify transactions with their embeddings, reusing cached classifications
+
+    Args:
+        transactions: List of transaction dicts
+        embeddings: One embedding per transaction (list of lists or 2D array, float16 included)
+        classifier: MLModel, defaults to the registry's transactions classifier
+        cache: PredictionCache, defaults to the process-wide cache
+
+    Returns:
+        List of classified transaction dicts
+    """
+    if classifier is None:
+        classifier = get_transactions_classifier()
+    if cache is None:
+        cache = get_prediction_cache(classifier)
+
+    # reuse cached classifications of repeated transactions
+    keys = [cache.key(t.get('description'), t.get('value'), classifier.version) for t in transactions]
+    classifications = cache.get_many(keys) if classifier.version else [None] * len(keys)
+    model_versions = [classifier.version] * len(keys)
+    missing = [i for i, classification in enumerate(classifications) if classification is None]
+    logger.info(f"{len(transactions) - len(missing)} of {len(transactions)} classifications served from cache")
+
+    if missing:
+        missing_transactions = [transactions[i] for i in missing]
+
+        # Keep the embeddings as one normalized float32 (or float16) matrix
+        if len(missing) == len(transactions):
+            embedding_matrix = EmbeddingMatrix.from_vectors(embeddings).normalize()
+        elif isinstance(embeddings, np.ndarray):
+            embedding_matrix = EmbeddingMatrix.from_vectors(embeddings[missing]).normalize()
+        else:
+            embedding_matrix = EmbeddingMatrix.from_vectors([embeddings[i] for i in missing]).normalize()
+        embedding_matrix = embedding_matrix.astype(EMBEDDING_STORAGE_DTYPE)
+        df = transactions_features(missing_transactions)
+        logger.info(f"Created features of shape {df.shape} and embedding matrix of shape {embedding_matrix.values.shape}")
+
+        # Run ML classification
+        # pin one model version for preprocessing and prediction
+        model = classifier.snapshot()
+        predictions = model.predict_columns(df, embedding_matrix.values)
+        logger.info(f"Model predicted {len(predictions)} classifications")
+
+        cache.put_many([cache.key(t.get('description'), t.get('value'), model.version) for t in missing_transactions], list(predictions))
+        for i, classification in zip(missing, predictions):
+            classifications[i] = classification
+            model_versions[i] = model.version
+
+    # Create classified transactions list
+    return [
+        {
+            'date': t.get('date'),
+            'description': t.get('description'),
+            'value': t.get('value'),
+            'user': t.get('user'),
+            'classification': classification,
+            'model_version': model_version
+        }
+        for t, classification, model_version in zip(transactions, classifications, model_versions)
+    ]
+
+
+def update_jobs(completed, failed):
+    """
+    Update several jobs in one database transaction
+
+    Args:
+        completed: Dict of job_id to its classified transactions
+        failed: Dict of job_id to its error message
+    """
+    if not completed and not failed:
+        return
+    try:
+        session = Session()
+        batch_jobs = session.query(BatchJob).filter(BatchJob.id.in_(list(completed) + list(failed))).all()
+        found = set()
+        for batch_job in batch_jobs:
+            found.add(batch_job.id)
+            if batch_job.id in completed:
+                batch_job.status = JobStatus.COMPLETED
+                batch_job.transactions_output = json.dumps(completed[batch_job.id])
+            else:
+                batch_job.status = JobStatus.FAILED
+                batch_job.error_message = failed[batch_job.id]
+        session.commit()
+        session.close()
+        logger.info(f"{len(completed)} jobs completed and {len(failed)} failed in one transaction")
+        for job_id in set(completed) | set(failed):
+            if job_id not in found:
+                logger.warning(f"Job {job_id} not found in database")
+    except Exception as e:
+        logger.error(f"Failed to update jobs {sorted(set(completed) | set(failed))}: {str(e)}")
+
+
+def stack_embeddings(jobs):
+    """
+    One float32 matrix with the embeddings of every job, in job order
+
+    Args:
+        jobs: List of (transactions, embeddings) pairs
+
+    Returns:
+        (n_transactions, dimensionality) array
+    """
+    blocks = [np.asarray(embeddings, dtype=np.float32) for transactions, embeddings in jobs if len(transactions)]
+    if not blocks:
+        return np.empty((0, 0), dtype=np.float32)
+    if len(blocks) == 1:
+        return blocks[0]
+    return np.concatenate(blocks)
+
+
+def classify_jobs(jobs, classifier=None, cache=None):
+    """
+    Classify several jobs with one preprocess + predict over their stacked rows
+
+    Args:
+        jobs: List of (transactions, embeddings) pairs
+        classifier: MLModel, defaults to the registry's transactions classifier
+        cache: PredictionCache, defaults to the process-wide cache
+
+    Returns:
+        List with the classified transactions of each job, or the exception it failed with
+    """
+    try:
+        transactions = [t for job_transactions, _ in jobs for t in job_transactions]
+        classified = classify_transactions(transactions, stack_embeddings(jobs), classifier, cache)
+    except Exception as e:
+        if len(jobs) == 1:
+            return [e]
+        # isolate the failing job instead of failing the whole batch
+        logger.warning(f"Batch of {len(jobs)} jobs failed ({e}), classifying them one by one")
+        results = []
+        for job_transactions, embeddings in jobs:
+            try:
+                results.append(classify_transactions(job_transactions, embeddings, classifier, cache))
+            except Exception as job_error:
+                results.append(job_error)
+        return results
+
+    results, offset = [], 0
+    for job_transactions, _ in jobs:
+        results.append(classified[offset:offset + len(job_transactions)])
+        offset += len(job_transactions)
+    return results
+
+
+def process_classification_batch(message_values):
+    """
+    Classify the jobs of several embeddings results messages together and record them
+
+    Args:
+        message_values: Decoded messages, each with job_id, transactions and embeddings (or their claim-check reference)
+
+    Returns:
+        Dict with the outcome of each job (job_id to None, or the exception it failed with)
+        under "errors" and the batch timing metrics
+    """
+    start = time.perf_counter()
+    errors = {}
+    resolved = []
+    for message_value in message_values:
+        job_id = message_value.get('job_id')
+        try:
+            # claim-checked jobs (embeddings results, or the input of a fused job) release their blobs once recorded
+            claim_checked = 'embeddings_ref' in message_value or 'transactions_ref' in message_value
+            resolved.append((message_value, claim_checked, claim_check.resolve_embeddings_results(message_value)))
+        except Exception as e:
+            errors[job_id] = e
+    resolve_seconds = time.perf_counter() - start
+
+    jobs = [(value.get('transactions', []), value.get('embeddings', [])) for _, _, value in resolved]
+    results = classify_jobs(jobs)
+    classify_seconds = time.perf_counter() - start - resolve_seconds
+
+    completed, released = {}, []
+    for (message_value, claim_checked, value), result in zip(resolved, results):
+        job_id = value.get('job_id')
+        if isinstance(result, Exception):
+            errors[job_id] = result
+        elif is_sharded(value):
+            # fan-in: the worker landing the last shard assembles the job's output
+            try:
+                if complete_shard(job_id, value['shard'], value['shard_count'], result) is not None and claim_checked:
+                    released.append(job_id)
+                errors.setdefault(job_id, None)
+            except Exception as e:
+                errors[job_id] = e
+        else:
+            completed[job_id] = result
+            errors.setdefault(job_id, None)
+            if claim_checked:
+                released.append(job_id)
+    failed = {job_id: f"Classification failed: {str(error)}" for job_id, error in errors.items() if error is not None}
+    for job_id, error_msg in failed.items():
+        logger.error(f"Job {job_id} failed: {error_msg}")
+    update_jobs(completed, failed)
+
+    # the results are in the database, the jobs' blobs are no longer needed
+    for job_id in released:
+        claim_check.release_job(job_id)
+    db_seconds = time.perf_counter() - start - resolve_seconds - classify_seconds
+
+    metrics = {
+        "messages": len(message_values),
+        "transactions": sum(len(transactions) for transactions, _ in jobs),
+        "failed": len(failed),
+        "resolve_seconds": resolve_seconds,
+        "classify_seconds": classify_seconds,
+        "db_seconds": db_seconds,
+        "total_seconds": time.perf_counter() - start,
+    }
+    logger.info(f"Classified batch of {metrics['messages']} messages, {metrics['transactions']} transactions, "
+                f"{metrics['failed']} failed: resolve {resolve_seconds * 1000:.1f} ms, "
+                f"classify {classify_seconds * 1000:.1f} ms, db {db_seconds * 1000:.1f} ms")
+    return {"errors": errors, **metrics}
+
+
 def process_classification(message_value):
     """
     Process classification: combine embeddings with transactions and run ML model
     
     Args:
-        message_value: JSON message containing job_id, transactions, and embeddings
+        message_value: JSON message containing job_id, transactions, and embeddings (or their claim-check reference)
     """
     job_id = message_value.get('job_id')
-    transactions = message_value.get('transactions', [])
-    embeddings = message_value.get('embeddings', [])
-    
-    logger.info(f"Processing classification for job {job_id} with {len(transactions)} transactions")
-    
-    try:
-        # Convert embeddings to DataFrame
-        embeddings_df = pd.DataFrame(embeddings, columns=[f'embedding_{i}' for i in range(len(embeddings[0]))])
-        logger.info(f"Created embeddings DataFrame with shape {embeddings_df.shape}")
-        
-        # Create DataFrame with transaction data (excluding user and classification)
-        transactions_data = []
-        for t in transactions:
-            datetime_obj = pd.to_datetime(t.get('date'), utc=True)
-            tx_data = {
-                'Data': datetime_obj,
-                'Descrição': t.get('description'),
-                'Valor': t.get('value')
-            }
-            transactions_data.append(tx_data)
-        
-        df = pd.DataFrame(transactions_data)
-        logger.info(f"Created transactions DataFrame with shape {df.shape}")
-        
-        # Combine transactions with embeddings
-        df_combined = pd.concat([df, embeddings_df], axis=1)
-        logger.info(f"Combined DataFrame shape: {df_combined.shape}")
-        logger.info(f"Combined DataFrame columns: {df_combined.columns}")
-        logger.info(f": {df_combined.head()}")
-        
-        # Run ML classification
-        model = TransactionsClassifier()
-        classifications = model.predict(model.preprocess(df_combined))
-        logger.info(f"Model predicted {len(classifications)} classifications")
-        
-        # Create classified transactions list
-        classified_transactions = []
-        for i, t in enumerate(transactions):
-            classified_tx = {
-                'date': t.get('date'),
-                'description': t.get('description'),
-                'value': t.get('value'),
-                'user': t.get('user'),
-                'classification': classifications[i] if i < len(classifications) else None
-            }
-            classified_transactions.append(classified_tx)
-        
-        # Update job as completed
-        update_job_completed(job_id, classified_transactions)
-        
-        logger.info(f"Successfully classified job {job_id}")
-        
-    except Exception as e:
-        error_msg = f"Classification failed: {str(e)}"
-        logger.error(f"Job {job_id} failed: {error_msg}")
-        
-        # Update job status to failed
-        update_job_failed(job_id, error_msg)
-        
+    logger.info(f"Processing classification for job {job_id}")
+    error = process_classification_batch([message_value])["errors"].get(job_id)
+    if error is not None:
         # Re-raise to log but don't break the worker
-        raise
+        raise error
+    logger.info(f"Successfully classified job {job_id}")
+
+
+def drain_messages(consumer, max_messages=CLASSIFICATION_BATCH_MAX_MESSAGES,
+                   max_wait_ms=CLASSIFICATION_BATCH_MAX_WAIT_MS, poll_timeout=1):
+    """
+    Poll up to max_messages messages, waiting at most max_wait_ms after the first one
+
+    Returns:
+        List of Kafka messages, empty when none arrived within poll_timeout seconds
+    """
+    messages = []
+    msg = consumer.poll(poll_timeout)
+    deadline = time.monotonic() + max_wait_ms / 1000
+    while msg is not None:
+        if msg.error() is not None:
+            logger.error(f"Kafka error: {msg.error()}")
+            raise Exception(msg.error())
+        messages.append(msg)
+        remaining = deadline - time.monotonic()
+        if len(messages) >= max_messages or remaining <= 0:
+            break
+        msg = consumer.poll(remaining)
+    return messages
 
 
 def consume_embeddings_results():
@@ -154,36 +369,33 @@ def consume_embeddings_results():
     )
 
     logger.info(f"Starting classification worker, consuming from {EMBEDDINGS_RESULTS_TOPIC}")
+    logger.info(f"Batching up to {CLASSIFICATION_BATCH_MAX_MESSAGES} messages or {CLASSIFICATION_BATCH_MAX_WAIT_MS} ms")
 
     with app.get_consumer() as consumer:
         consumer.subscribe([EMBEDDINGS_RESULTS_TOPIC])
 
         while True:
-            msg = consumer.poll(1)
-
-            if msg is None:
+            messages = drain_messages(consumer)
+            if not messages:
                 continue
-            elif msg.error() is not None:
-                logger.error(f"Kafka error: {msg.error()}")
-                raise Exception(msg.error())
-            else:
+
+            values = []
+            for msg in messages:
                 try:
-                    key = msg.key().decode("utf8")
-                    value = json.loads(msg.value())
-                    offset = msg.offset()
-
-                    logger.info(f"Received message at offset {offset} with key {key}")
-                    
-                    # Process the classification
-                    process_classification(value)
-                    
-                    # Commit offset
-                    consumer.store_offsets(msg)
-                    
+                    logger.info(f"Received message at offset {msg.offset()} with key {msg.key().decode('utf8')}")
+                    values.append(decode_embeddings_message(msg.value()))
                 except Exception as e:
-                    logger.error(f"Error processing message: {str(e)}")
-                    # Commit offset even on error to avoid infinite retries
-                    consumer.store_offsets(msg)
+                    logger.error(f"Error decoding message: {str(e)}")
+
+            try:
+                # Process the classification of the whole batch
+                process_classification_batch(values)
+            except Exception as e:
+                logger.error(f"Error processing messages: {str(e)}")
+
+            # Commit offsets, even on error to avoid infinite retries
+            for msg in messages:
+                consumer.store_offsets(msg)
 
 
 if __name__ == "__main__":
@@ -191,6 +403,9 @@ if __name__ == "__main__":
         logger.info("=" * 60)
         logger.info("CLASSIFICATION WORKER STARTING")
         logger.info("=" * 60)
+        registry.warm_up()
+        logger.info(f"Loaded models: {registry.stats()}")
+        watch_transactions_classifier()
         consume_embeddings_results()
     except KeyboardInterrupt:
         logger.info("Classification worker stopped by user")
@@ -0,0 +1,214 @@
+"""
+Cross-job pooling of embedding requests in the embeddings worker.
+
+With several jobs in flight (EMBEDDINGS_WORKER_CONCURRENCY > 1), every job
+submits its descriptions to an EmbeddingRequestPool instead of calling the
+embedding backend itself. A background thread coalesces the pending jobs
+until EMBEDDING_POOL_MAX_TEXTS descriptions are queued or the oldest job
+waited EMBEDDING_POOL_MAX_WAIT_MS and hands the batch to a thread pool of
+EMBEDDING_POOL_MAX_REQUESTS, which embeds the distinct descriptions in a
+single request and hands every job back its own vectors, in order. Up to
+EMBEDDING_POOL_MAX_REQUESTS requests are in flight at a time, so a slow or
+retrying request does not hold back the jobs pooled after it.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Callable, List, Optional
+import numpy as np
+
+
+# descriptions per pooled request (0 disables pooling) and max wait of the oldest job
+EMBEDDING_POOL_MAX_TEXTS = int(os.getenv("EMBEDDING_POOL_MAX_TEXTS", "2048"))
+EMBEDDING_POOL_MAX_WAIT_MS = float(os.getenv("EMBEDDING_POOL_MAX_WAIT_MS", "20"))
+# pooled requests in flight at the same time
+EMBEDDING_POOL_MAX_REQUESTS = int(os.getenv("EMBEDDING_POOL_MAX_REQUESTS", "4"))
+
+logger = getLogger(__name__)
+
+
+class _PendingJob:
+    """
+    One job waiting for the embeddings of its descriptions.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class EmbeddingRequestPool:
+    """
+    Coalesces the embedding requests of concurrent jobs into deduplicated batches.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], list], max_texts: int = EMBEDDING_POOL_MAX_TEXTS,
+                 max_wait_ms: float = EMBEDDING_POOL_MAX_WAIT_MS, max_requests: int = EMBEDDING_POOL_MAX_REQUESTS):
+        """
+        Args:
+            fetch: embeds a list of texts (with retries), one vector per text
+            max_texts: descriptions per pooled request; larger jobs are sent on their own
+            max_wait_ms: how long the oldest job waits for others to join its request
+            max_requests: pooled requests in flight at the same time
+        """
+        self.fetch = fetch
+        self.max_texts = max_texts
+        self.max_wait = max_wait_ms / 1000
+        self.max_requests = max(1, max_requests)
+        self._queue: "queue.Queue[_PendingJob]" = queue.Queue()
+        self._carry: Optional[_PendingJob] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.Semaphore(self.max_requests)
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "jobs": 0,
+            "texts": 0,
+            "unique_texts": 0,
+            "requests": 0,
+            "last_request_jobs": 0,
+            "last_request_texts": 0,
+            "last_request_seconds": 0.0,
+        }
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings of a job's descriptions, fetched together with concurrent jobs.
+        Returns:
+            np.ndarray: (len(texts), dimensionality) float32 matrix
+        """
+        if self.max_texts <= 0 or self.max_wait <= 0:
+            return self._fetch_unique([texts])[0]
+
+        self._ensure_started()
+        job = _PendingJob(texts)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.embeddings
+
+    def stats(self) -> dict:
+        """
+        Pooling metrics: jobs and descriptions per request, dedupe ratio.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_jobs_per_request"] = stats["jobs"] / stats["requests"] if stats["requests"] else 0.0
+        stats["dedupe_ratio"] = 1 - stats["unique_texts"] / stats["texts"] if stats["texts"] else 0.0
+        return stats
+
+    def _ensure_started(self):
+        # threads do not survive fork, start one per process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._slots = threading.Semaphore(self.max_requests)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_requests,
+                                                    thread_name_prefix="embedding-request")
+                self._thread = threading.Thread(target=self._run, name="embedding-request-pool", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> List[_PendingJob]:
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, texts = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while texts < self.max_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if texts + len(job.texts) > self.max_texts:
+                self._carry = job
+                break
+            batch.append(job)
+            texts += len(job.texts)
+        return batch
+
+    def _run(self):
+        # coalesce only: requests run on the executor, and a batch is assembled once a
+        # request slot is free, so jobs arriving meanwhile join the next request
+        while True:
+            self._slots.acquire()
+            batch = self._next_batch()
+            self._executor.submit(self._fetch_batch, batch)
+
+    def _fetch_batch(self, batch: List[_PendingJob]):
+        try:
+            for job, embeddings in zip(batch, self._fetch_unique([job.texts for job in batch])):
+                job.embeddings = embeddings
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+            else:
+                # isolate the failing job instead of failing every job of the request
+                logger.warning(f"Pooled embedding request of {len(batch)} jobs failed ({e}), retrying one by one")
+                for job in batch:
+                    try:
+                        job.embeddings = self._fetch_unique([job.texts])[0]
+                    except Exception as job_error:
+                        job.error = job_error
+        finally:
+            self._slots.release()
+            for job in batch:
+                job.done.set()
+
+    def _fetch_unique(self, jobs_texts: List[List[str]]) -> List[np.ndarray]:
+        """
+        Embed the distinct texts of several jobs in one request and split the vectors back per job.
+        """
+        start = time.perf_counter()
+        unique = {}
+        indices = [np.fromiter((unique.setdefault(text, len(unique)) for text in texts), dtype=np.intp, count=len(texts))
+                   for texts in jobs_texts]
+        if unique:
+            vectors = np.asarray(self.fetch(list(unique)), dtype=np.float32)
+        else:
+            vectors = np.empty((0, 0), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+
+        n_texts = sum(len(texts) for texts in jobs_texts)
+        with self._stats_lock:
+            self._stats["jobs"] += len(jobs_texts)
+            self._stats["texts"] += n_texts
+            self._stats["unique_texts"] += len(unique)
+            self._stats["requests"] += 1
+            self._stats["last_request_jobs"] = len(jobs_texts)
+            self._stats["last_request_texts"] = len(unique)
+            self._stats["last_request_seconds"] = elapsed
+        return [vectors[job_indices] for job_indices in indices]
+
+
+_pool: Optional[EmbeddingRequestPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_embedding_pool(fetch: Callable[[List[str]], list]) -> EmbeddingRequestPool:
+    """
+    Process-wide EmbeddingRequestPool, created with fetch on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EmbeddingRequestPool(fetch)
+        return _pool
+
+
+def set_embedding_pool(pool: Optional[EmbeddingRequestPool]) -> None:
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -0,0 +1,87 @@
+"""
+Encoding of the embeddings results messages (EMBEDDINGS_RESULTS_TOPIC).
+
+Binary format, version 1:
+    b"EMBM"                    magic
+    uint8                      format version
+    uint32 little-endian       length of the header
+    header                     UTF-8 JSON: every message field except the
+                               embeddings, plus "dtype" and "shape"
+    payload                    the (n_transactions, dimensionality) embedding
+                               matrix, C order, little-endian float32 or float16
+
+Messages that do not start with the magic are decoded as the previous JSON
+format, so the classification worker can be upgraded before the embeddings worker.
+"""
+import json
+import os
+import struct
+import numpy as np
+
+
+EMBEDDINGS_MESSAGE_FORMAT = os.getenv('EMBEDDINGS_MESSAGE_FORMAT', 'binary')
+EMBEDDINGS_MESSAGE_DTYPE = os.getenv('EMBEDDINGS_MESSAGE_DTYPE', 'float32')
+
+MAGIC = b"EMBM"
+VERSION = 1
+_PREFIX = struct.Struct("<4sBI")
+_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+
+def encode_embeddings_message(message: dict, dtype: str = EMBEDDINGS_MESSAGE_DTYPE,
+                              message_format: str = EMBEDDINGS_MESSAGE_FORMAT) -> bytes:
+    """
+    Serialize an embeddings results message.
+    Args:
+        message (dict): job_id, transactions and embeddings (list of lists or 2D array)
+        dtype (str): float32 or float16 payload
+        message_format (str): binary, or json for the previous format
+    Returns:
+        bytes: the Kafka message value
+    """
+    if message_format == "json":
+        embeddings = message.get('embeddings')
+        if isinstance(embeddings, np.ndarray):
+            message = {**message, 'embeddings': embeddings.tolist()}
+        return json.dumps(message).encode("utf-8")
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported embeddings dtype {dtype!r}, expected one of {sorted(_DTYPES)}")
+
+    embeddings = message.get('embeddings')
+    if embeddings is None or len(embeddings) == 0:
+        matrix = np.empty((0, 0), dtype=_DTYPES[dtype])
+    else:
+        matrix = np.ascontiguousarray(embeddings, dtype=_DTYPES[dtype])
+    header = {key: value for key, value in message.items() if key != 'embeddings'}
+    header.update(dtype=dtype, shape=list(matrix.shape))
+    header_bytes = json.dumps(header).encode("utf-8")
+    return b"".join([_PREFIX.pack(MAGIC, VERSION, len(header_bytes)), header_bytes, matrix.tobytes()])
+
+
+def decode_embeddings_message(value) -> dict:
+    """
+    Deserialize an embeddings results message of either format.
+    Returns:
+        dict: message fields; embeddings is a read-only (n, dimensionality)
+        ndarray for binary messages and a list of lists for JSON ones
+    """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if not value.startswith(MAGIC):
+        return json.loads(value)
+
+    magic, version, header_length = _PREFIX.unpack_from(value)
+    if version != VERSION:
+        raise ValueError(f"Unsupported embeddings message version {version}")
+    header_end = _PREFIX.size + header_length
+    header = json.loads(value[_PREFIX.size:header_end])
+    dtype = _DTYPES[header.pop('dtype')]
+    shape = tuple(header.pop('shape'))
+    expected_bytes = int(np.prod(shape)) * dtype.itemsize
+    if len(value) - header_end != expected_bytes:
+        raise ValueError(f"Embeddings payload has {len(value) - header_end} bytes, expected {expected_bytes}")
+    if expected_bytes == 0:
+        header['embeddings'] = np.empty(shape, dtype=dtype)
+    else:
+        header['embeddings'] = np.frombuffer(value, dtype=dtype, offset=header_end).reshape(shape)
+    return header
@@ -9,7 +9,13 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from model import Session, BatchJob, JobStatus
-from machine_learning.transactions_classification.lib.external_embedding_api import create_embeddings_api
+from machine_learning.transactions_classification.lib.embedding_backends import create_embeddings
+from machine_learning.transactions_classification.lib.embedding_store import dedupe_ratio
+from kafka.embeddings_codec import encode_embeddings_message
+from kafka import claim_check
+from kafka.job_shards import is_sharded, shard_fields
+from kafka.embedding_request_pool import EMBEDDING_POOL_MAX_TEXTS, get_embedding_pool
+from kafka.inflight import consume_concurrently
 from kafka.utils import retry_with_backoff
 
 dotenv.load_dotenv()
@@ -17,6 +23,8 @@ KAFKA_BROKER_ADDRESS = os.getenv('KAFKA_BROKER_ADDRESS', 'localhost:9092')
 BATCH_JOBS_TOPIC = os.getenv('BATCH_JOBS_TOPIC', 'batch-jobs')
 EMBEDDINGS_RESULTS_TOPIC = os.getenv('EMBEDDINGS_RESULTS_TOPIC', 'embeddings-results')
 CONSUMER_GROUP = os.getenv('EMBEDDINGS_CONSUMER_GROUP', 'embeddings_worker')
+# jobs processed at the same time (1 = one after the other)
+EMBEDDINGS_WORKER_CONCURRENCY = int(os.getenv('EMBEDDINGS_WORKER_CONCURRENCY', '1'))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,7 +33,7 @@ logger = logging.getLogger(__name__)
 @retry_with_backoff(max_retries=3, initial_delay=2)
 def fetch_embeddings_with_retry(descriptions):
     """
-    Call external embedding API with retry logic
+    Call the configured embedding backend with retry logic
     
     Args:
         descriptions: List of text descriptions
@@ -33,10 +41,26 @@ def fetch_embeddings_with_retry(descriptions):
     Returns:
         Embeddings from the API
     """
-    return create_embeddings_api(descriptions)
+    return create_embeddings(descriptions)
 
 
-def update_job_status(job_id, status, error_message=None, retry_count=None):
+def fetch_embeddings(descriptions):
+    """
+    Embeddings of a job's descriptions; with several jobs in flight the request
+    is pooled (and deduplicated) with the other jobs' descriptions
+    
+    Args:
+        descriptions: List of text descriptions
+        
+    Returns:
+        One embedding per description
+    """
+    if EMBEDDINGS_WORKER_CONCURRENCY > 1 and EMBEDDING_POOL_MAX_TEXTS > 0:
+        return get_embedding_pool(lambda texts: fetch_embeddings_with_retry(texts)).embed(descriptions)
+    return fetch_embeddings_with_retry(descriptions)
+
+
+def update_job_status(job_id, status, error_message=None, retry_count=None, from_statuses=None):
     """
     Update job status in database
     
@@ -45,12 +69,15 @@ def update_job_status(job_id, status, error_message=None, retry_count=None):
         status: New JobStatus
         error_message: Optional error message
         retry_count: Optional retry count
+        from_statuses: Only update jobs currently in one of these statuses
     """
     try:
         session = Session()
         batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
         
-        if batch_job:
+        if batch_job and from_statuses is not None and batch_job.status not in from_statuses:
+            logger.info(f"Job {job_id} is {batch_job.status.value}, not updated to {status.value}")
+        elif batch_job:
             batch_job.status = status
             if error_message:
                 batch_job.error_message = error_message
@@ -66,35 +93,57 @@ def update_job_status(job_id, status, error_message=None, retry_count=None):
         logger.error(f"Failed to update job {job_id} status: {str(e)}")
 
 
+def encode_embeddings_results(result_message):
+    """
+    Kafka value of an embeddings results message
+
+    Args:
+        result_message: job_id, transactions and embeddings
+
+    Returns:
+        The encoded message, or with claim-check enabled a small JSON message
+        referencing the results in the blob store
+    """
+    if claim_check.CLAIM_CHECK_ENABLED:
+        embeddings_ref = claim_check.store_embeddings_message(result_message)
+        return json.dumps({'job_id': result_message['job_id'], 'embeddings_ref': embeddings_ref,
+                           **shard_fields(result_message)})
+    return encode_embeddings_message(result_message)
+
+
 def process_batch_job(message_value):
     """
     Process a batch job: fetch embeddings and publish to next topic
     
     Args:
-        message_value: JSON message containing job_id and transactions
+        message_value: JSON message containing job_id and transactions (or their claim-check reference)
     """
     job_id = message_value.get('job_id')
-    transactions = message_value.get('transactions', [])
-    
-    logger.info(f"Processing batch job {job_id} with {len(transactions)} transactions")
     
     try:
+        transactions = claim_check.resolve_batch_job(message_value).get('transactions', [])
+        logger.info(f"Processing batch job {job_id} with {len(transactions)} transactions")
+        
         # Update status to processing
-        update_job_status(job_id, JobStatus.PROCESSING)
+        # shards of a job that already failed (or completed) must not move it back to processing
+        update_job_status(job_id, JobStatus.PROCESSING,
+                          from_statuses=(JobStatus.PENDING, JobStatus.PROCESSING) if is_sharded(message_value) else None)
         
         # Extract descriptions
         descriptions = [t.get('description', '') for t in transactions]
-        logger.info(f"Extracted {len(descriptions)} descriptions for job {job_id}")
+        logger.info(f"Extracted {len(descriptions)} descriptions for job {job_id} "
+                    f"(dedupe ratio {dedupe_ratio(descriptions):.1%}, duplicates are embedded once)")
         
-        # Call external embedding API with retry
-        embeddings = fetch_embeddings_with_retry(descriptions)
+        # Call the embedding backend with retry, pooled with the other in-flight jobs
+        embeddings = fetch_embeddings(descriptions)
         logger.info(f"Successfully fetched embeddings for job {job_id}")
         
         # Prepare message for classification worker
         result_message = {
             'job_id': job_id,
             'transactions': transactions,
-            'embeddings': embeddings
+            'embeddings': embeddings,
+            **shard_fields(message_value)
         }
         
         return result_message
@@ -103,13 +152,47 @@ def process_batch_job(message_value):
         error_msg = f"Failed to fetch embeddings: {str(e)}"
         logger.error(f"Job {job_id} failed: {error_msg}")
         
-        # Update job status to failed
+        # Update job status to failed, a failed shard fails the whole job
         update_job_status(job_id, JobStatus.FAILED, error_message=error_msg)
         
         # Re-raise to prevent Kafka offset commit
         raise
 
 
+def handle_batch_job_message(msg):
+    """
+    Process one batch-jobs message, on a worker thread
+
+    Args:
+        msg: Kafka message
+
+    Returns:
+        (key, value) of the embeddings results message to publish
+    """
+    key = msg.key().decode("utf8")
+    value = json.loads(msg.value())
+    logger.info(f"Received message at offset {msg.offset()} with key {key}")
+
+    # Process the job
+    result_message = process_batch_job(value)
+    return key, encode_embeddings_results(result_message)
+
+
+def embeddings_results_publisher(producer):
+    """
+    Callback publishing the results of handle_batch_job_message to the embeddings-results topic
+    """
+    def publish(msg, result):
+        key, value = result
+        producer.produce(
+            topic=EMBEDDINGS_RESULTS_TOPIC,
+            key=key,
+            value=value,
+        )
+        logger.info(f"Published embeddings results for job {key}")
+    return publish
+
+
 def consume_batch_jobs():
     """
     Main consumer loop: consume batch jobs and publish embeddings results
@@ -123,46 +206,14 @@ def consume_batch_jobs():
 
     logger.info(f"Starting embeddings worker, consuming from {BATCH_JOBS_TOPIC}")
     logger.info(f"Publishing results to {EMBEDDINGS_RESULTS_TOPIC}")
+    logger.info(f"Processing up to {EMBEDDINGS_WORKER_CONCURRENCY} jobs at a time")
 
     with app.get_consumer() as consumer:
-        consumer.subscribe([BATCH_JOBS_TOPIC])
-
         with app.get_producer() as producer:
-            while True:
-                msg = consumer.poll(1)
-
-                if msg is None:
-                    continue
-                elif msg.error() is not None:
-                    logger.error(f"Kafka error: {msg.error()}")
-                    raise Exception(msg.error())
-                else:
-                    try:
-                        key = msg.key().decode("utf8")
-                        value = json.loads(msg.value())
-                        offset = msg.offset()
-
-                        logger.info(f"Received message at offset {offset} with key {key}")
-                        
-                        # Process the job
-                        result_message = process_batch_job(value)
-                        
-                        # Publish to embeddings-results topic
-                        producer.produce(
-                            topic=EMBEDDINGS_RESULTS_TOPIC,
-                            key=key,
-                            value=json.dumps(result_message),
-                        )
-                        logger.info(f"Published embeddings results for job {key}")
-                        
-                        # Commit offset only on success
-                        consumer.store_offsets(msg)
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing message: {str(e)}")
-                        # Don't commit offset on error - message will be reprocessed
-                        # But to avoid infinite loop, we still commit after logging
-                        consumer.store_offsets(msg)
+            # Offsets are stored once a job is published, or failed and logged (to avoid
+            # an infinite loop), and only past messages whose predecessors are done
+            consume_concurrently(consumer, handle_batch_job_message, embeddings_results_publisher(producer),
+                                 max_in_flight=EMBEDDINGS_WORKER_CONCURRENCY, topics=[BATCH_JOBS_TOPIC])
 
 
 if __name__ == "__main__":
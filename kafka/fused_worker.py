@@ -0,0 +1,127 @@
+"""
+Fused worker (WORKER_TYPE=fused): embeds and classifies batch jobs in one process
+
+Consumes the batch-jobs topic, fetches the embeddings and classifies the
+transactions with the embeddings kept in memory, then writes the results, so
+nothing goes through the embeddings-results topic. The split topology
+(embeddings_worker + classification_worker) stays available to scale the two
+stages independently; run one topology or the other against batch-jobs, not both.
+
+Usage:
+    python kafka/fused_worker.py
+"""
+from quixstreams import Application
+import json
+import os
+import dotenv
+import logging
+import sys
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from machine_learning.model_registry import registry, watch_transactions_classifier
+from kafka.classification_worker import process_classification_batch
+from kafka.embeddings_worker import EMBEDDINGS_WORKER_CONCURRENCY, process_batch_job
+from kafka.inflight import consume_concurrently
+
+dotenv.load_dotenv()
+KAFKA_BROKER_ADDRESS = os.getenv('KAFKA_BROKER_ADDRESS', 'localhost:9092')
+BATCH_JOBS_TOPIC = os.getenv('BATCH_JOBS_TOPIC', 'batch-jobs')
+CONSUMER_GROUP = os.getenv('FUSED_CONSUMER_GROUP', 'fused_worker')
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def embed_job(message_value):
+    """
+    Fetch the embeddings of a batch job
+
+    Args:
+        message_value: JSON message containing job_id and transactions (or their claim-check reference)
+
+    Returns:
+        Embeddings results message (job_id, transactions, embeddings), kept in memory
+    """
+    result_message = process_batch_job(message_value)
+    if 'transactions_ref' in message_value:
+        # lets the classification release the job's claim-check blobs
+        result_message['transactions_ref'] = message_value['transactions_ref']
+    return result_message
+
+
+def classify_job(result_message):
+    """
+    Classify an embedded job and record its results
+
+    Raises:
+        The job's classification error, after the job was marked failed
+    """
+    job_id = result_message['job_id']
+    error = process_classification_batch([result_message])["errors"].get(job_id)
+    if error is not None:
+        raise error
+    logger.info(f"Successfully embedded and classified job {job_id}")
+
+
+def process_fused_job(message_value):
+    """
+    Embed and classify a batch job in one pass
+
+    Args:
+        message_value: JSON message containing job_id and transactions (or their claim-check reference)
+    """
+    classify_job(embed_job(message_value))
+
+
+def embed_batch_job_message(msg):
+    """
+    embed_job of a Kafka message, run on a worker thread
+    """
+    logger.info(f"Received message at offset {msg.offset()} with key {msg.key().decode('utf8')}")
+    return embed_job(json.loads(msg.value()))
+
+
+def classify_embedded_job(msg, result_message):
+    """
+    classify_job of a message embedded by embed_batch_job_message, run on the polling thread
+    """
+    classify_job(result_message)
+
+
+def consume_batch_jobs_fused():
+    """
+    Main consumer loop: consume batch jobs, embed and classify them in this process
+    """
+    app = Application(
+        broker_address=KAFKA_BROKER_ADDRESS,
+        loglevel="INFO",
+        consumer_group=CONSUMER_GROUP,
+        auto_offset_reset="latest",
+    )
+
+    logger.info(f"Starting fused worker, consuming from {BATCH_JOBS_TOPIC}")
+    logger.info(f"Embedding up to {EMBEDDINGS_WORKER_CONCURRENCY} jobs at a time")
+
+    with app.get_consumer() as consumer:
+        # Embeddings are fetched on the thread pool, classification runs on the polling thread;
+        # offsets are stored once a job's results are written (or it failed and was logged)
+        consume_concurrently(consumer, embed_batch_job_message, classify_embedded_job,
+                             max_in_flight=EMBEDDINGS_WORKER_CONCURRENCY, topics=[BATCH_JOBS_TOPIC])
+
+
+if __name__ == "__main__":
+    try:
+        logger.info("=" * 60)
+        logger.info("FUSED WORKER STARTING")
+        logger.info("=" * 60)
+        registry.warm_up()
+        logger.info(f"Loaded models: {registry.stats()}")
+        watch_transactions_classifier()
+        consume_batch_jobs_fused()
+    except KeyboardInterrupt:
+        logger.info("Fused worker stopped by user")
+    except Exception as e:
+        logger.error(f"Fused worker crashed: {str(e)}")
+        raise
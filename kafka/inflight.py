@@ -0,0 +1,148 @@
+"""
+Bounded concurrent processing of Kafka messages.
+
+consume_concurrently() keeps up to max_in_flight messages processing on a
+thread pool while it goes on polling, so one slow message (a slow embedding
+call, retry backoff sleeps) no longer stalls the messages behind it. Results
+are handed back to the polling thread, which publishes them. OffsetTracker
+only stores a partition's offset past a message once every earlier message
+of that partition has completed, so a crash never skips unfinished messages
+(they are processed again, at least once). When a rebalance revokes a
+partition, its in-flight offsets are dropped: the new owner processes them
+again and this consumer no longer stores offsets for it.
+"""
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from confluent_kafka import KafkaException
+
+
+logger = getLogger(__name__)
+
+
+class OffsetTracker:
+    """
+    In-flight offsets of each partition, in poll order.
+    """
+
+    def __init__(self):
+        # offset -> [message, done] of each partition
+        self._partitions: Dict[Tuple[str, int], "OrderedDict[int, list]"] = {}
+
+    def track(self, message) -> None:
+        """
+        Register a polled message as in flight.
+        """
+        partition = (message.topic(), message.partition())
+        self._partitions.setdefault(partition, OrderedDict())[message.offset()] = [message, False]
+
+    def complete(self, message):
+        """
+        Mark a message done.
+        Returns:
+            the last message of the partition's completed prefix, whose offset can be
+            stored, or None while an earlier message of the partition is in flight
+            (or when the message's partition was revoked meanwhile)
+        """
+        partition = (message.topic(), message.partition())
+        offsets = self._partitions.get(partition)
+        entry = offsets.get(message.offset()) if offsets is not None else None
+        if entry is None or entry[0] is not message:
+            return None
+        entry[1] = True
+        committable = None
+        while offsets:
+            offset, (_, done) = next(iter(offsets.items()))
+            if not done:
+                break
+            committable = offsets.pop(offset)[0]
+        if not offsets:
+            del self._partitions[partition]
+        return committable
+
+    def drop(self, partitions: Iterable[Tuple[str, int]]) -> int:
+        """
+        Forget the in-flight messages of (topic, partition) pairs, e.g. revoked by a rebalance.
+        Returns:
+            int: number of dropped messages
+        """
+        dropped = 0
+        for partition in partitions:
+            dropped += len(self._partitions.pop(partition, ()))
+        return dropped
+
+    def __len__(self) -> int:
+        return sum(len(offsets) for offsets in self._partitions.values())
+
+
+def consume_concurrently(consumer, handle: Callable, on_result: Callable, max_in_flight: int,
+                         poll_timeout: float = 1.0, should_stop: Callable[[], bool] = lambda: False,
+                         topics: Optional[List[str]] = None):
+    """
+    Poll messages and process up to max_in_flight of them at a time.
+
+    Args:
+        consumer: Kafka consumer, with offset storing left to the caller
+        handle: handle(message) -> result, run on the thread pool
+        on_result: on_result(message, result), run on the polling thread (e.g. to produce the result)
+        max_in_flight: maximum number of messages processing at the same time
+        poll_timeout: seconds to wait for a message when nothing is in flight
+        should_stop: checked every loop; once true no more messages are polled and
+            the function returns when the in-flight messages are done
+        topics: topics to subscribe the consumer to, with rebalance callbacks that drop the
+            in-flight offsets of revoked partitions (None if the consumer is already subscribed)
+    """
+    tracker = OffsetTracker()
+    in_flight = {}
+
+    def forget(_, partitions):
+        # runs inside poll(), on the polling thread like finish()
+        dropped = tracker.drop((p.topic, p.partition) for p in partitions)
+        if dropped:
+            logger.warning(f"Partitions reassigned, {dropped} in-flight messages will not store their offsets")
+
+    if topics is not None:
+        # a newly assigned partition starts over from its committed offset
+        consumer.subscribe(topics, on_assign=forget, on_revoke=forget, on_lost=forget)
+
+    def finish(future):
+        message = in_flight.pop(future)
+        try:
+            on_result(message, future.result())
+        except Exception as e:
+            # same policy as the sequential loop: log and move past the message
+            logger.error(f"Error processing message at offset {message.offset()}: {str(e)}")
+        committable = tracker.complete(message)
+        if committable is not None:
+            try:
+                consumer.store_offsets(message=committable)
+            except KafkaException as e:
+                # the partition was revoked while the message was in flight, its new owner processes it again
+                logger.warning(f"Could not store offset {committable.offset()} of partition "
+                               f"{committable.partition()}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="in-flight") as executor:
+        while True:
+            stopping = should_stop()
+            if stopping and not in_flight:
+                return
+
+            if stopping or len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, timeout=poll_timeout, return_when=FIRST_COMPLETED)
+            else:
+                done = [future for future in in_flight if future.done()]
+            for future in done:
+                finish(future)
+            if stopping or len(in_flight) >= max_in_flight:
+                continue
+
+            # poll without blocking while messages are in flight, to reap them promptly
+            msg = consumer.poll(poll_timeout if not in_flight else 0.01)
+            if msg is None:
+                continue
+            elif msg.error() is not None:
+                logger.error(f"Kafka error: {msg.error()}")
+                raise Exception(msg.error())
+            tracker.track(msg)
+            in_flight[executor.submit(handle, msg)] = msg
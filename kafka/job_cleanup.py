@@ -17,6 +17,8 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from model import Session, BatchJob
+from kafka.claim_check import is_reference, release_job
+from kafka.job_shards import delete_shards
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -51,6 +53,9 @@ def cleanup_old_jobs(max_age_hours=24):
             # Delete old jobs
             for job in old_jobs:
                 logger.info(f"Deleting job {job.id} (created: {job.created_at}, status: {job.status.value})")
+                if is_reference(job.transactions_input):
+                    release_job(job.id)
+                delete_shards(session, job.id)
                 session.delete(job)
             
             session.commit()
@@ -0,0 +1,117 @@
+"""
+Fan-out/fan-in of large batch jobs.
+
+Jobs with more than JOB_SHARD_SIZE transactions are split into shards of
+JOB_SHARD_SIZE transactions, each published as its own batch-jobs message
+with the key "<job_id>-<shard>", so the shards of a job spread across the
+topic partitions and are processed in parallel by every worker replica.
+The embeddings worker passes the shard fields (shard, shard_count) through,
+and the classification worker stores each classified shard in BatchJobShard.
+The worker that lands the last shard assembles the shards in order into
+BatchJob.transactions_output and marks the job completed.
+"""
+import json
+import os
+from logging import getLogger
+from typing import List, Optional
+from model import Session, BatchJob, BatchJobShard, JobStatus
+
+
+# transactions per shard, 0 disables sharding
+JOB_SHARD_SIZE = int(os.getenv('JOB_SHARD_SIZE', '5000'))
+
+logger = getLogger(__name__)
+
+
+def split_transactions(transactions: list, shard_size: Optional[int] = None) -> List[list]:
+    """
+    Consecutive shards of at most shard_size (default JOB_SHARD_SIZE) transactions;
+    a single shard when sharding is disabled.
+    """
+    if shard_size is None:
+        shard_size = JOB_SHARD_SIZE
+    if shard_size <= 0 or len(transactions) <= shard_size:
+        return [transactions]
+    return [transactions[start:start + shard_size] for start in range(0, len(transactions), shard_size)]
+
+
+def shard_key(job_id: str, shard: int) -> str:
+    """
+    Kafka key of a shard's messages, distinct per shard so shards land on different partitions.
+    """
+    return f"{job_id}-{shard}"
+
+
+def shard_fields(message: dict) -> dict:
+    """
+    The shard fields of a message, to pass on to the next stage.
+    """
+    return {key: message[key] for key in ('shard', 'shard_count') if key in message}
+
+
+def is_sharded(message: dict) -> bool:
+    return 'shard_count' in message
+
+
+def complete_shard(job_id: str, shard: int, shard_count: int, classified_transactions: list) -> Optional[int]:
+    """
+    Store a classified shard and, once every shard has landed, assemble the job's output.
+
+    Redelivered shards overwrite their previous result. When the last two shards land
+    at the same time, both workers may try to assemble the output: the output is only
+    written from a complete set of shards, by a conditional update of a job that is not
+    completed yet, so only one of them does.
+
+    Returns:
+        Number of transactions of the assembled job, or None while shards are missing
+        (or when the job failed, was already assembled or no longer exists)
+    """
+    session = Session()
+    try:
+        batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+        if batch_job is None or batch_job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+            # a redelivered shard of a finished job
+            logger.warning(f"Job {job_id} completed, failed or not found, shard {shard} is not stored")
+            return None
+
+        session.merge(BatchJobShard(job_id, shard, shard_count, json.dumps(classified_transactions)))
+        session.commit()
+
+        landed = session.query(BatchJobShard).filter(BatchJobShard.job_id == job_id).count()
+        if landed < shard_count:
+            logger.info(f"Job {job_id}: {landed} of {shard_count} shards classified")
+            return None
+
+        shards = (session.query(BatchJobShard)
+                  .filter(BatchJobShard.job_id == job_id)
+                  .order_by(BatchJobShard.shard_index)
+                  .all())
+        if len(shards) != shard_count:
+            # another worker assembled the job and deleted its shards meanwhile
+            logger.info(f"Job {job_id}: shards already assembled")
+            return None
+
+        output = [transaction for job_shard in shards for transaction in json.loads(job_shard.transactions_output)]
+        assembled = (session.query(BatchJob)
+                     .filter(BatchJob.id == job_id,
+                             BatchJob.status.notin_((JobStatus.COMPLETED, JobStatus.FAILED)))
+                     .update({BatchJob.status: JobStatus.COMPLETED,
+                              BatchJob.transactions_output: json.dumps(output)},
+                             synchronize_session=False))
+        # the shards are of no use once the job is completed or failed
+        delete_shards(session, job_id)
+        session.commit()
+        if not assembled:
+            logger.warning(f"Job {job_id} completed, failed or not found, shards are not assembled")
+            return None
+        logger.info(f"Job {job_id} completed, assembled {shard_count} shards with {len(output)} transactions")
+        return len(output)
+    finally:
+        session.close()
+
+
+def delete_shards(session, job_id: str) -> int:
+    """
+    Delete the stored shards of a job, in the caller's session.
+    """
+    return session.query(BatchJobShard).filter(BatchJobShard.job_id == job_id).delete()
@@ -1 +1,11 @@
-from . import transactions_classification
\ No newline at end of file
+# Subpackages are imported lazily so that importing one module (e.g. the
+# classifier or the embedding client) does not pull in torch/transformers.
+import importlib
+
+_SUBMODULES = {"transactions_classification", "transactions_classifier", "utils"}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,225 @@
+"""
+Dynamic micro-batching in front of MLModel predictions.
+
+Concurrent callers submit their feature frames; a single background thread
+coalesces them until MICRO_BATCH_MAX_SIZE rows are queued or the oldest request
+waited MICRO_BATCH_MAX_WAIT_MS, runs one preprocess + predict over the stacked
+rows and hands every caller back its own slice.
+
+Requests only coalesce when a process serves several of them at once, so
+batching is off (the wait is 0) unless gunicorn runs threaded workers.
+"""
+import os
+import queue
+import threading
+import time
+from logging import getLogger
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from machine_learning.transactions_classifier import MLModel
+
+
+def default_max_wait_ms() -> float:
+    """
+    MICRO_BATCH_MAX_WAIT_MS with threaded gunicorn workers, 0 with sync workers
+    (one request at a time per process, nothing to coalesce with).
+    """
+    threaded = (os.getenv("GUNICORN_WORKER_CLASS", "sync") != "sync"
+                or int(os.getenv("GUNICORN_THREADS", "1")) > 1)
+    return float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5")) if threaded else 0.0
+
+
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "512"))
+MICRO_BATCH_MAX_WAIT_MS = default_max_wait_ms()
+# how long a request waits for its batch before giving up
+MICRO_BATCH_TIMEOUT = float(os.getenv("MICRO_BATCH_TIMEOUT", "30"))
+
+logger = getLogger(__name__)
+
+
+class _PendingRequest:
+    """
+    One caller waiting for its slice of a batch.
+    """
+
+    def __init__(self, X: pd.DataFrame):
+        self.X = X
+        self.n_rows = len(X)
+        self.done = threading.Event()
+        self.predictions: Optional[np.ndarray] = None
+        self.version: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predictions of an MLModel into vectorized batches.
+    """
+
+    def __init__(self, model: MLModel, max_batch_size: int = MICRO_BATCH_MAX_SIZE, max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS,
+                 timeout: float = MICRO_BATCH_TIMEOUT):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._carry: Optional[_PendingRequest] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "rows": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "last_batch_size": 0,
+            "last_batch_requests": 0,
+            "last_batch_seconds": 0.0,
+        }
+
+    def predict(self, X: pd.DataFrame) -> Tuple[np.ndarray, str]:
+        """
+        Predict labels for X, sharing the model call with concurrent requests.
+        Args:
+            X (pd.DataFrame): raw features (transactions and embedding columns)
+        Returns:
+            tuple: (predictions, model version that produced them)
+        Raises:
+            TimeoutError: the batch was not predicted within timeout seconds
+        """
+        if self.max_wait <= 0:
+            return self._predict_inline(X)
+
+        self._ensure_started()
+        request = _PendingRequest(X)
+        self._queue.put(request)
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+
+        deadline = time.monotonic() + self.timeout
+        while not request.done.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+            if not self._thread.is_alive():
+                # the request may have been lost with the thread, do not wait for it
+                logger.error("Micro-batcher thread is not running, predicting directly")
+                self._ensure_started()
+                return self._predict_inline(X)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Micro-batched prediction not done after {self.timeout:.0f}s")
+        if request.error is not None:
+            raise request.error
+        return request.predictions, request.version
+
+    def _predict_inline(self, X: pd.DataFrame) -> Tuple[np.ndarray, str]:
+        snapshot = self.model.snapshot()
+        return snapshot.predict(snapshot.preprocess(X)), snapshot.version
+
+    def stats(self) -> dict:
+        """
+        Batch size, latency and queue depth metrics.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = stats["rows"] / stats["batches"] if stats["batches"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
+
+    def _ensure_started(self):
+        # threads do not survive fork, start one per process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> List[_PendingRequest]:
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, rows = [first], first.n_rows
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if rows + request.n_rows > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            rows += request.n_rows
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._run_batch(batch)
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def _run_batch(self, batch: List[_PendingRequest]):
+        start = time.perf_counter()
+        try:
+            self._predict_batch(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+            else:
+                # isolate the failing request instead of failing the whole batch
+                logger.warning(f"Micro-batch of {len(batch)} requests failed ({e}), retrying one by one")
+                for request in batch:
+                    try:
+                        self._predict_batch([request])
+                    except Exception as request_error:
+                        request.error = request_error
+        elapsed = time.perf_counter() - start
+
+        rows = sum(request.n_rows for request in batch)
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["rows"] += rows
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = rows
+            self._stats["last_batch_requests"] = len(batch)
+            self._stats["last_batch_seconds"] = elapsed
+
+    def _predict_batch(self, batch: List[_PendingRequest]):
+        snapshot = self.model.snapshot()
+        if len(batch) == 1:
+            X = batch[0].X
+        else:
+            X = pd.concat([request.X for request in batch], ignore_index=True)
+        predictions = np.asarray(snapshot.predict(snapshot.preprocess(X)))
+
+        offset = 0
+        for request in batch:
+            request.predictions = predictions[offset:offset + request.n_rows]
+            request.version = snapshot.version
+            offset += request.n_rows
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model: MLModel) -> MicroBatcher:
+    """
+    Process-wide MicroBatcher of a model.
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(id(model))
+        if batcher is None or batcher.model is not model:
+            batcher = MicroBatcher(model)
+            _batchers[id(model)] = batcher
+        return batcher
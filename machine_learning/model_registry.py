@@ -0,0 +1,211 @@
+"""
+Process-wide registry of loaded machine learning models.
+
+Each model is deserialized once per process and the same instance is handed
+to every caller (Flask request handlers, Kafka workers). Under gunicorn the
+models can be warmed in the master (``preload_app``) so forked workers inherit
+them, or right after fork in ``post_fork``. Watchers started with watch()
+hot-swap new artifact versions into the shared instances.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from logging import getLogger
+from typing import Callable, Dict, Optional
+from machine_learning.transactions_classifier import MLModel, LoadedModel, TransactionsClassifier
+from machine_learning.model_watcher import ModelWatcher, FixtureValidator, MODEL_RELOAD_INTERVAL
+
+
+TRANSACTIONS_CLASSIFIER = "transactions_classifier"
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ModelLoadStats:
+    """
+    Load statistics of a registered model.
+    """
+    name: str
+    is_loaded: bool
+    version: Optional[str]
+    load_time_seconds: float
+    rss_delta_bytes: Optional[int]
+    artifact_bytes: int
+    loaded_at: float
+    pid: int
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """
+    Resident set size of the current process, or None when it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _artifact_bytes(model: MLModel) -> int:
+    """
+    Size on disk of the model and preprocessor artifacts.
+    """
+    total = 0
+    for path in (model.model_path, model.preprocessor_path):
+        if path.exists():
+            total += path.stat().st_size
+    return total
+
+
+class ModelRegistry:
+    """
+    Thread-safe, lazily populated registry of shared model instances.
+    """
+
+    def __init__(self, factories: Optional[Dict[str, Callable[[], MLModel]]] = None):
+        self._factories: Dict[str, Callable[[], MLModel]] = dict(factories or {TRANSACTIONS_CLASSIFIER: TransactionsClassifier})
+        self._models: Dict[str, MLModel] = {}
+        self._stats: Dict[str, ModelLoadStats] = {}
+        self._watchers: Dict[str, ModelWatcher] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], MLModel]) -> None:
+        """
+        Register (or replace) the factory used to build a model.
+        Any instance already built for that name is dropped.
+        """
+        self.unwatch(name)
+        with self._lock:
+            self._factories[name] = factory
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def get(self, name: str = TRANSACTIONS_CLASSIFIER) -> MLModel:
+        """
+        Return the shared instance of a model, loading it on first use.
+        Args:
+            name (str): registered model name
+        Returns:
+            MLModel: the process-wide model instance
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            if name not in self._factories:
+                raise KeyError(f"No model registered under '{name}'")
+
+            rss_before = _current_rss_bytes()
+            start = time.perf_counter()
+            model = self._factories[name]()
+            load_time = time.perf_counter() - start
+            rss_after = _current_rss_bytes()
+
+            self._stats[name] = ModelLoadStats(
+                name=name,
+                is_loaded=model.is_loaded,
+                version=model.version,
+                load_time_seconds=load_time,
+                rss_delta_bytes=(rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+                artifact_bytes=_artifact_bytes(model),
+                loaded_at=time.time(),
+                pid=os.getpid(),
+            )
+            self._models[name] = model
+            model.add_swap_listener(lambda loaded, name=name: self._on_swap(name, loaded))
+            logger.info(f"Model '{name}' loaded in {load_time:.3f}s (pid {os.getpid()})")
+            return model
+
+    def _on_swap(self, name: str, loaded: LoadedModel) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is not None:
+                stats.version = loaded.version
+                stats.is_loaded = True
+                stats.loaded_at = time.time()
+
+    def watch(self, name: str = TRANSACTIONS_CLASSIFIER, interval: float = MODEL_RELOAD_INTERVAL,
+              validator: Optional[Callable[[LoadedModel], bool]] = None) -> Optional[ModelWatcher]:
+        """
+        Start hot reloading a model when its artifacts change on disk.
+        Threads do not survive fork, so call this in each worker process.
+        Args:
+            name (str): registered model name
+            interval (float): polling interval in seconds, 0 disables watching
+            validator (Callable): check a candidate must pass before being swapped in
+        Returns:
+            ModelWatcher: the running watcher, or None when disabled
+        """
+        if interval <= 0:
+            return None
+        model = self.get(name)
+        with self._lock:
+            watcher = self._watchers.get(name)
+            if watcher is None:
+                watcher = ModelWatcher(model, interval, validator)
+                self._watchers[name] = watcher
+        return watcher.start()
+
+    def unwatch(self, name: str) -> None:
+        with self._lock:
+            watcher = self._watchers.pop(name, None)
+        if watcher is not None:
+            watcher.stop()
+
+    def warm_up(self, names: Optional[list] = None) -> None:
+        """
+        Eagerly load models so the first request does not pay the load cost.
+        Args:
+            names (list): model names to load, defaults to every registered model
+        """
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Could not warm up model '{name}': {e}")
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Load time and memory footprint of every model loaded in this process.
+        """
+        with self._lock:
+            return {name: asdict(stats) for name, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        """
+        Drop every loaded instance and watcher (factories are kept).
+        """
+        for name in list(self._watchers):
+            self.unwatch(name)
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_transactions_classifier() -> MLModel:
+    """
+    Shared TransactionsClassifier instance of the current process.
+    """
+    return registry.get(TRANSACTIONS_CLASSIFIER)
+
+
+def watch_transactions_classifier() -> Optional[ModelWatcher]:
+    """
+    Hot reload the shared TransactionsClassifier, validating candidates against the test fixtures.
+    """
+    validator = FixtureValidator()
+    if not validator.fixtures_path.exists():
+        logger.warning(f"Validation fixtures not found at {validator.fixtures_path}, candidate models will not be validated")
+        validator = None
+    return registry.watch(TRANSACTIONS_CLASSIFIER, validator=validator)
@@ -0,0 +1,116 @@
+"""
+Background hot reload of model artifacts.
+
+ModelWatcher polls the model and preprocessor files of an MLModel and, when
+they change, loads the new pair in its own thread, validates it and swaps it
+in with MLModel.reload(). Predictions never wait on the reload.
+"""
+import os
+import threading
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Optional
+from sklearn.metrics import balanced_accuracy_score
+from machine_learning.transactions_classifier import MLModel, LoadedModel
+from machine_learning.utils import load_pickle
+
+
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "60"))
+MODEL_VALIDATION_FIXTURES_PATH = Path(os.getenv("MODEL_VALIDATION_FIXTURES_PATH") or
+    Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) / "tests" / "classification_fixtures")
+# a retrained model may score this much below the reference balanced accuracy
+MODEL_VALIDATION_MARGIN = float(os.getenv("MODEL_VALIDATION_MARGIN", "0.01"))
+
+logger = getLogger(__name__)
+
+
+class FixtureValidator:
+    """
+    Accepts a candidate model only if it reaches the reference balanced accuracy
+    on the stored test fixtures (tests/classification_fixtures), less margin.
+    """
+
+    def __init__(self, fixtures_path: Path = MODEL_VALIDATION_FIXTURES_PATH, test_seed: int = 1,
+                 min_balanced_accuracy: Optional[float] = None, margin: float = MODEL_VALIDATION_MARGIN):
+        self.fixtures_path = Path(fixtures_path)
+        self.test_seed = test_seed
+        self.min_balanced_accuracy = min_balanced_accuracy
+        self.margin = margin
+
+    def __call__(self, candidate: LoadedModel) -> bool:
+        X_test_raw = load_pickle(self.fixtures_path / "embeddings_X_test_raw.pkl")
+        y_test = load_pickle(self.fixtures_path / "y_test_encoded.pkl")
+        y_encoder = load_pickle(self.fixtures_path / "y_encoder.pkl")
+        threshold = self.min_balanced_accuracy
+        if threshold is None:
+            threshold = load_pickle(self.fixtures_path / f"balanced_accuracy_score_seed_{self.test_seed}.pkl") - self.margin
+
+        # runs on the watcher thread while requests are served: the process-wide
+        # numpy RNG is not reseeded, the margin absorbs small score differences
+        y_pred = candidate.predict(candidate.preprocess(X_test_raw))
+        score = balanced_accuracy_score(y_test, y_encoder.transform(y_pred))
+        logger.info(f"Candidate model {candidate.version} balanced accuracy {score:.4f} (threshold {threshold:.4f})")
+        return score >= threshold
+
+
+def _artifacts_signature(model: MLModel) -> tuple:
+    """
+    Cheap change detector: (mtime, size) of the model and preprocessor files.
+    """
+    signature = []
+    for path in (model.model_path, model.preprocessor_path):
+        try:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ModelWatcher:
+    """
+    Daemon thread reloading an MLModel when its artifacts change on disk.
+    """
+
+    def __init__(self, model: MLModel, interval: float = MODEL_RELOAD_INTERVAL,
+                 validator: Optional[Callable[[LoadedModel], bool]] = None):
+        self.model = model
+        self.interval = interval
+        self.validator = validator
+        self._signature = _artifacts_signature(model)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """
+        Reload the model if its artifacts changed since the last check.
+        Returns:
+            bool: True if a new version was swapped in
+        """
+        signature = _artifacts_signature(self.model)
+        if signature == self._signature or None in signature:
+            return False
+        self._signature = signature
+        logger.info(f"Model artifacts changed in {self.model.model_path.parent}, reloading")
+        return self.model.reload(self.validator)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Model watcher check failed: {e}")
+
+    def start(self) -> "ModelWatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+            logger.info(f"Watching {self.model.model_path} every {self.interval}s")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,154 @@
+"""
+LRU + TTL cache of transaction classifications.
+
+Bank statements repeat the same merchant strings and amounts every month, so
+predictions are cached by a hash of the normalized description (lowercased, as
+data_loader.treat_text does), the value and the model version. The date is
+deliberately left out of the key: recurring transactions differ only by date
+and its day/month features rarely change the predicted category.
+Entries of a model are dropped as soon as a new version is swapped in.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, List, Optional
+from machine_learning.transactions_classifier import MLModel
+
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", str(24 * 3600)))
+
+logger = getLogger(__name__)
+
+
+def normalize_description(description: Optional[str]) -> str:
+    """
+    Same normalization as data_loader.treat_text.
+    """
+    return "" if description is None else str(description).lower()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with per-entry time to live.
+    """
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE, ttl_seconds: float = PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(description: Optional[str], value: Any, model_version: Optional[str]) -> str:
+        """
+        Cache key of one transaction.
+        Args:
+            description (str): raw transaction description
+            value (float): transaction value
+            model_version (str): version of the model producing the prediction
+        Returns:
+            str: hex digest identifying the (description, value, version) triple
+        """
+        value_repr = repr(float(value)) if value is not None else ""
+        payload = f"{model_version}\x1f{normalize_description(description)}\x1f{value_repr}"
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Look up several keys at once; misses are returned as None.
+        """
+        if not self.enabled:
+            with self._lock:
+                self._misses += len(keys)
+            return [None] * len(keys)
+
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._misses += 1
+                    results.append(None)
+                elif entry[1] < now:
+                    del self._entries[key]
+                    self._expirations += 1
+                    self._misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    results.append(entry[0])
+        return results
+
+    def put(self, key: str, value: Any) -> None:
+        self.put_many([key], [value])
+
+    def put_many(self, keys: List[str], values: List[Any]) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Hit rate and size counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+prediction_cache = PredictionCache()
+_attached_models = set()
+_attach_lock = threading.Lock()
+
+
+def get_prediction_cache(model: MLModel) -> PredictionCache:
+    """
+    Process-wide prediction cache, cleared whenever the model swaps versions.
+    """
+    with _attach_lock:
+        if id(model) not in _attached_models:
+            model.add_swap_listener(lambda loaded: _invalidate(loaded.version))
+            _attached_models.add(id(model))
+    return prediction_cache
+
+
+def _invalidate(version: str) -> None:
+    logger.info(f"Model swapped to {version}, clearing prediction cache")
+    prediction_cache.clear()
@@ -1,2 +1,9 @@
-from . import pipelines
-from . import lib
\ No newline at end of file
+import importlib
+
+_SUBMODULES = {"pipelines", "lib"}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
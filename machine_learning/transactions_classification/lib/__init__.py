@@ -1,5 +1,23 @@
-from . import data_loader 
-from . import feature_engineering 
-from . import preprocess 
-from . import tokenization 
-from . import training 
\ No newline at end of file
+# Submodules are imported on first access: tokenization needs torch and
+# transformers, google_embedding needs google-genai, and the API
+# and Kafka workers use neither.
+import importlib
+
+_SUBMODULES = {
+    "data_loader",
+    "embedding_backends",
+    "embedding_matrix",
+    "embedding_store",
+    "external_embedding_api",
+    "feature_engineering",
+    "google_embedding",
+    "preprocess",
+    "tokenization",
+    "training",
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,159 @@
+"""
+Pluggable text embedding backends.
+
+EMBEDDING_BACKEND selects, per deployment, where the description embeddings
+come from:
+    api      the external embedding service at EMBEDDING_API_URL (default)
+    gemini   Google Gemini embeddings
+    hashing  local character/word n-gram feature hashing, no network calls
+
+The classifier must be trained on the backend it is served with: the hashing
+backend produces different features than the embedding services.
+"""
+import os
+import threading
+from logging import getLogger
+from typing import Dict, List, Optional, Type
+import numpy as np
+
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "api")
+EMBEDDING_HASHING_DIMENSIONALITY = int(os.getenv("EMBEDDING_HASHING_DIMENSIONALITY", "768"))
+
+logger = getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """
+    Embeds descriptions into fixed size vectors.
+    """
+    name: str = ""
+    model: str = ""
+    dimensionality: int = 0
+
+    def embed(self, texts: List[str]) -> List[list]:
+        """
+        Embed texts, preserving their order.
+        Args:
+            texts (list): descriptions to embed
+        Returns:
+            list: one embedding (list of floats) per text
+        """
+        raise NotImplementedError
+
+
+class ExternalApiBackend(EmbeddingBackend):
+    """
+    External embedding service, read through the embedding store.
+    """
+    name = "api"
+
+    def __init__(self):
+        from machine_learning.transactions_classification.lib import external_embedding_api
+
+        self._api = external_embedding_api
+        self.model = external_embedding_api.EMBEDDING_API_MODEL
+        self.dimensionality = external_embedding_api.EMBEDDING_API_DIMENSIONALITY
+
+    def embed(self, texts: List[str]) -> List[list]:
+        return self._api.create_embeddings_api(texts)
+
+
+class GeminiBackend(EmbeddingBackend):
+    """
+    Gemini embeddings, read through the embedding store.
+    """
+    name = "gemini"
+
+    def __init__(self):
+        from machine_learning.transactions_classification.lib import google_embedding
+
+        self._gemini = google_embedding
+        self.model = google_embedding.GEMINI_MODEL
+        self.dimensionality = google_embedding.DIMENSIONALITY
+
+    def embed(self, texts: List[str]) -> List[list]:
+        return self._gemini.create_embeddings_batch(texts, checkpoint_dir=None)
+
+
+class HashedNgramBackend(EmbeddingBackend):
+    """
+    Local embeddings: character n-grams (within word boundaries) and word
+    n-grams of the lowercased description are hashed with signed hashing into
+    `dimensionality` float32 buckets, then L2 normalized. Stateless, so the
+    same text always gets the same vector in every process, with no fitting.
+    """
+    name = "hashing"
+
+    def __init__(self, dimensionality: int = EMBEDDING_HASHING_DIMENSIONALITY,
+                 char_ngram_range: tuple = (2, 4), word_ngram_range: tuple = (1, 2),
+                 word_weight: float = 1.0):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.dimensionality = dimensionality
+        self.model = f"hashed-ngrams-c{char_ngram_range[0]}{char_ngram_range[1]}-w{word_ngram_range[0]}{word_ngram_range[1]}"
+        self.word_weight = word_weight
+        self._char = HashingVectorizer(analyzer="char_wb", ngram_range=char_ngram_range, n_features=dimensionality,
+                                       alternate_sign=True, norm="l2", dtype=np.float32)
+        self._word = HashingVectorizer(analyzer="word", ngram_range=word_ngram_range, n_features=dimensionality,
+                                       alternate_sign=True, norm="l2", dtype=np.float32)
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings as a (n_texts, dimensionality) float32 matrix.
+        """
+        texts = ["" if text is None else str(text) for text in texts]
+        features = self._char.transform(texts) + self._word.transform(texts) * self.word_weight
+        matrix = np.asarray(features.todense(), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed(self, texts: List[str]) -> List[list]:
+        return self.embed_matrix(texts).tolist()
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    ExternalApiBackend.name: ExternalApiBackend,
+    GeminiBackend.name: GeminiBackend,
+    HashedNgramBackend.name: HashedNgramBackend,
+}
+
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+
+def make_embedding_backend(name: str) -> EmbeddingBackend:
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown embedding backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return backend_class()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """
+    Process-wide embedding backend selected by EMBEDDING_BACKEND.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_embedding_backend(EMBEDDING_BACKEND)
+            logger.info(f"Using {_backend.name} embedding backend ({_backend.model}, {_backend.dimensionality} dimensions)")
+        return _backend
+
+
+def set_embedding_backend(backend: Optional[EmbeddingBackend]) -> None:
+    """
+    Replace the process-wide backend (None goes back to EMBEDDING_BACKEND).
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def create_embeddings(array_of_texts) -> List[list]:
+    """
+    Embeddings of the texts from the configured backend.
+    """
+    return get_embedding_backend().embed(list(array_of_texts))
@@ -0,0 +1,103 @@
+"""
+Embeddings as one contiguous float32 matrix.
+
+The embedding services return one list of floats per text. EmbeddingMatrix
+converts them once into a C-contiguous (n_texts, dimensionality) float32 array,
+L2 normalizes every row in a single vectorized call, and attaches the matrix
+to the tabular features as the embedding_<i> columns without copying it.
+"""
+import os
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+
+EMBEDDING_PREFIX = "embedding_"
+# float16 halves the memory of large jobs; vectors are normalized in float32 first
+EMBEDDING_STORAGE_DTYPE = np.dtype(os.getenv("EMBEDDING_STORAGE_DTYPE", "float32"))
+
+
+def embedding_columns(dimensionality: int) -> list:
+    return [f"{EMBEDDING_PREFIX}{i}" for i in range(dimensionality)]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2 normalize the rows of a matrix in place; all-zero rows are left as is.
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class EmbeddingMatrix:
+    """
+    (n_texts, dimensionality) embeddings held in one contiguous array.
+    """
+
+    def __init__(self, values: np.ndarray):
+        if values.ndim != 2:
+            raise ValueError(f"Expected a 2D embedding matrix, got shape {values.shape}")
+        self.values = values
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype=np.float32, dimensionality: Optional[int] = None) -> "EmbeddingMatrix":
+        """
+        Build the matrix from a list of vectors or an array, with a single allocation.
+        Args:
+            vectors: list of embeddings (lists of floats or arrays) or a 2D array
+            dtype: element type of the matrix
+            dimensionality (int): width of an empty matrix, when there are no vectors
+        """
+        if len(vectors) == 0:
+            return cls(np.empty((0, dimensionality or 0), dtype=dtype))
+        values = np.ascontiguousarray(vectors, dtype=dtype)
+        # arrays decoded from message buffers are read-only, normalize() works in place
+        if not values.flags.writeable:
+            values = values.copy()
+        return cls(values)
+
+    @property
+    def dimensionality(self) -> int:
+        return self.values.shape[1]
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def normalize(self) -> "EmbeddingMatrix":
+        """
+        L2 normalize every embedding, in place.
+        """
+        normalize_rows(self.values)
+        return self
+
+    def astype(self, dtype) -> "EmbeddingMatrix":
+        """
+        The matrix with dtype elements (no copy if it already has that type).
+        """
+        return EmbeddingMatrix(self.values.astype(dtype, copy=False))
+
+    def to_frame(self, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """
+        The embedding_<i> columns as a DataFrame backed by this matrix (no copy).
+        """
+        return pd.DataFrame(self.values, columns=embedding_columns(self.dimensionality), index=index, copy=False)
+
+    def attach(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Append the embedding columns to the tabular features of the same rows.
+        The embedding block of the result shares memory with this matrix.
+        """
+        if len(df) != len(self):
+            raise ValueError(f"{len(df)} rows of features for {len(self)} embeddings")
+        return pd.concat([df, self.to_frame(index=df.index)], axis=1, copy=False)
+
+
+def attach_embeddings(df: pd.DataFrame, vectors: Sequence, normalize: bool = True) -> pd.DataFrame:
+    """
+    Tabular features of df followed by the (normalized) embedding_<i> columns.
+    """
+    matrix = EmbeddingMatrix.from_vectors(vectors)
+    if normalize:
+        matrix.normalize()
+    return matrix.attach(df)
@@ -0,0 +1,280 @@
+"""
+Persistent, content-addressed store of text embeddings.
+
+Vectors are stored as float32 blobs in SQLite, keyed by a hash of the
+normalized text, the embedding model and the dimensionality, so the Flask
+app, the Kafka workers and the training notebooks share every embedding they
+ever paid for. The store is evicted least-recently-used first once it exceeds
+its size budget. To keep lookups and writes cheap as the store grows, the
+budget is checked once every 1% of it written, and last access times are only
+refreshed when older than EMBEDDING_STORE_TOUCH_INTERVAL seconds.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+import numpy as np
+
+
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "database/embeddings.sqlite3")
+EMBEDDING_STORE_MAX_BYTES = int(os.getenv("EMBEDDING_STORE_MAX_BYTES", str(1 << 30)))
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+# last access times are refreshed at most once per interval, so most lookups do not write
+EMBEDDING_STORE_TOUCH_INTERVAL = float(os.getenv("EMBEDDING_STORE_TOUCH_INTERVAL", "300"))
+
+logger = getLogger(__name__)
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Normalization applied before hashing and embedding a description:
+    unicode NFC and collapsed whitespace. Case is kept because the embedding
+    services receive the original casing.
+    """
+    if text is None:
+        return ""
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def embedding_key(text: str, model: str, dimensionality: int) -> str:
+    payload = f"{model}\x1f{dimensionality}\x1f{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def deduplicate(texts: Sequence[str]) -> tuple:
+    """
+    Collapse texts to their unique normalized forms.
+    Args:
+        texts (list): descriptions, duplicates included
+    Returns:
+        tuple: (unique texts in first-seen order, index of each text in the unique list)
+    """
+    positions = {}
+    unique_texts, inverse = [], []
+    for text in texts:
+        normalized = normalize_text(text)
+        position = positions.get(normalized)
+        if position is None:
+            position = positions[normalized] = len(unique_texts)
+            unique_texts.append(text)
+        inverse.append(position)
+    return unique_texts, inverse
+
+
+def dedupe_ratio(texts: Sequence[str]) -> float:
+    """
+    Share of texts that are duplicates of another text of the batch.
+    """
+    if len(texts) == 0:
+        return 0.0
+    return 1 - len(deduplicate(texts)[0]) / len(texts)
+
+
+class EmbeddingStore:
+    """
+    SQLite backed embedding store, safe to share between threads and processes.
+    """
+
+    def __init__(self, path=EMBEDDING_STORE_PATH, max_bytes: int = EMBEDDING_STORE_MAX_BYTES,
+                 touch_interval: float = EMBEDDING_STORE_TOUCH_INTERVAL, evict_check_bytes: Optional[int] = None):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: size budget of the stored vectors
+            touch_interval: seconds before a looked up entry's last access time is refreshed
+            evict_check_bytes: bytes written between two checks of the size budget (default 1% of it)
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.evict_check_bytes = evict_check_bytes if evict_check_bytes is not None else max(1, max_bytes // 100)
+        self._written_lock = threading.Lock()
+        self._written_since_check = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dimensionality INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, texts: Sequence[str], model: str, dimensionality: int) -> List[Optional[np.ndarray]]:
+        """
+        Look up the embeddings of several texts.
+        Returns:
+            list: float32 vectors, None for texts not in the store
+        """
+        if not texts:
+            return []
+        keys = [embedding_key(text, model, dimensionality) for text in texts]
+        found = {}
+        stale = []
+        now = time.time()
+        connection = self._connection()
+        unique_keys = list(dict.fromkeys(keys))
+        # stay under SQLite's host parameter limit
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            rows = connection.execute(
+                f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            for key, vector, last_access in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+                if now - last_access >= self.touch_interval:
+                    stale.append((now, key))
+
+        # only take SQLite's write lock when an entry's last access is stale
+        if stale:
+            with connection:
+                connection.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", stale)
+
+        results = [found.get(key) for key in keys]
+        hits = sum(result is not None for result in results)
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors, model: str, dimensionality: int) -> None:
+        """
+        Store the embeddings of several texts and, every evict_check_bytes written,
+        evict old entries if over budget.
+        """
+        if len(texts) == 0:
+            return
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((embedding_key(text, model, dimensionality), model, dimensionality, blob, len(blob), now))
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensionality, vector, size, last_access) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        with self._written_lock:
+            self._written_since_check += sum(row[4] for row in rows)
+            check = self._written_since_check >= self.evict_check_bytes
+            if check:
+                self._written_since_check = 0
+        if check:
+            self.evict()
+
+    def size_bytes(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the store fits its size budget.
+        Returns:
+            int: number of evicted entries
+        """
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        connection = self._connection()
+        evicted, freed = 0, 0
+        with connection:
+            rows = connection.execute("SELECT key, size FROM embeddings ORDER BY last_access ASC")
+            to_delete = []
+            for key, size in rows:
+                if freed >= excess:
+                    break
+                to_delete.append((key,))
+                freed += size
+            connection.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+            evicted = len(to_delete)
+        with self._stats_lock:
+            self._evictions += evicted
+        return evicted
+
+    def stats(self) -> dict:
+        connection = self._connection()
+        entries = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "size_bytes": self.size_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+def read_through(texts: Sequence[str], fetch: Callable[[List[str]], list], store: Optional[EmbeddingStore],
+                 model: str, dimensionality: int) -> List[list]:
+    """
+    Return the embeddings of texts, fetching and storing only the ones missing from the store.
+    Duplicated texts are embedded once and the vector is fanned back out to every position.
+    Args:
+        texts (list): descriptions to embed
+        fetch (Callable): embeds a list of texts, returns one vector per text
+        store (EmbeddingStore): store to read from and write to, None to always fetch
+        model (str): embedding model name, part of the key
+        dimensionality (int): embedding size, part of the key
+    Returns:
+        list: one embedding (list of floats) per text, in order
+    """
+    unique_texts, inverse = deduplicate(texts)
+    if store is None:
+        vectors = fetch(unique_texts)
+    else:
+        vectors = store.get_many(unique_texts, model, dimensionality)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # stored as float32: a vector reads the same whether just fetched or found in the store
+            fetched = [np.asarray(vector, dtype=np.float32) for vector in fetch([unique_texts[i] for i in missing])]
+            store.put_many([unique_texts[i] for i in missing], fetched, model, dimensionality)
+            for i, vector in zip(missing, fetched):
+                vectors[i] = vector
+        vectors = [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in vectors]
+    return [vectors[i] for i in inverse]
+
+
+_default_store: Optional[EmbeddingStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """
+    Process-wide embedding store, or None when disabled by EMBEDDING_STORE_ENABLED.
+    """
+    global _default_store
+    if not EMBEDDING_STORE_ENABLED:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            try:
+                _default_store = EmbeddingStore()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Embedding store unavailable at {EMBEDDING_STORE_PATH}: {e}")
+                return None
+        return _default_store
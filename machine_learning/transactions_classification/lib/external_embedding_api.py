@@ -1,12 +1,215 @@
 import requests
 import os
 import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logging import getLogger
+from typing import List, Optional
+from requests.adapters import HTTPAdapter
+from machine_learning.transactions_classification.lib.embedding_store import get_embedding_store, read_through
 
 EMBEDDING_API_URL = os.getenv('EMBEDDING_API_URL')
+EMBEDDING_API_MODEL = os.getenv('EMBEDDING_API_MODEL', 'mvp-embedding')
+EMBEDDING_API_DIMENSIONALITY = int(os.getenv('EMBEDDING_API_DIMENSIONALITY', '768'))
+EMBEDDING_API_CHUNK_SIZE = int(os.getenv('EMBEDDING_API_CHUNK_SIZE', '128'))
+EMBEDDING_API_MIN_CHUNK_SIZE = int(os.getenv('EMBEDDING_API_MIN_CHUNK_SIZE', '8'))
+EMBEDDING_API_MAX_CHUNK_SIZE = int(os.getenv('EMBEDDING_API_MAX_CHUNK_SIZE', '1024'))
+EMBEDDING_API_MAX_IN_FLIGHT = int(os.getenv('EMBEDDING_API_MAX_IN_FLIGHT', '4'))
+EMBEDDING_API_TARGET_LATENCY = float(os.getenv('EMBEDDING_API_TARGET_LATENCY', '2.0'))
+EMBEDDING_API_TIMEOUT = float(os.getenv('EMBEDDING_API_TIMEOUT', '60'))
+EMBEDDING_API_MAX_RETRIES = int(os.getenv('EMBEDDING_API_MAX_RETRIES', '3'))
+# delay before the first retry of a failed chunk, doubled (with jitter) on every further attempt
+EMBEDDING_API_RETRY_DELAY = float(os.getenv('EMBEDDING_API_RETRY_DELAY', '0.5'))
+# older embedding API versions expect the request body as a JSON encoded string
+EMBEDDING_API_DOUBLE_ENCODED_BODY = os.getenv('EMBEDDING_API_DOUBLE_ENCODED_BODY', 'false').lower() == 'true'
+
+logger = getLogger(__name__)
+
+
+class EmbeddingApiClient:
+    """
+    Client of the external embedding API.
+    Texts are sent in chunks over a keep-alive connection pool, with at most
+    max_in_flight chunks in parallel. The chunk size adapts to the service:
+    it grows while chunks come back faster than target_latency and halves on
+    slow responses or errors. Failed chunks are split and resent after a
+    jittered exponential backoff. Results are reassembled in input order.
+    """
+
+    def __init__(self, base_url: Optional[str] = EMBEDDING_API_URL,
+                 chunk_size: int = EMBEDDING_API_CHUNK_SIZE,
+                 min_chunk_size: int = EMBEDDING_API_MIN_CHUNK_SIZE,
+                 max_chunk_size: int = EMBEDDING_API_MAX_CHUNK_SIZE,
+                 max_in_flight: int = EMBEDDING_API_MAX_IN_FLIGHT,
+                 target_latency: float = EMBEDDING_API_TARGET_LATENCY,
+                 timeout: float = EMBEDDING_API_TIMEOUT,
+                 max_retries: int = EMBEDDING_API_MAX_RETRIES,
+                 retry_delay: float = EMBEDDING_API_RETRY_DELAY,
+                 double_encoded_body: bool = EMBEDDING_API_DOUBLE_ENCODED_BODY):
+        self.base_url = base_url
+        self.min_chunk_size = max(1, min_chunk_size)
+        self.max_chunk_size = max(self.min_chunk_size, max_chunk_size)
+        self.chunk_size = min(max(chunk_size, self.min_chunk_size), self.max_chunk_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.target_latency = target_latency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.double_encoded_body = double_encoded_body
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embedding-api")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "texts": 0, "total_latency": 0.0}
+
+    def _post(self, texts: List[str]) -> tuple:
+        descriptions = {'descriptions':[{'description': text} for text in texts]}
+        body = json.dumps(descriptions) if self.double_encoded_body else descriptions
+        start = time.perf_counter()
+        response = self.session.post(f"{self.base_url}/embeddings", json=body, timeout=self.timeout)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise Exception(f"Failed to create embeddings: {response.text}")
+        embeddings = response.json()['embeddings']
+        if len(embeddings) != len(texts):
+            raise Exception(f"Embedding API returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return embeddings, elapsed
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        Delay before sending a chunk for the attempt-th time: exponential, with jitter
+        so the chunks split from a failure do not all hit the service at once.
+        """
+        if attempt == 0:
+            return 0.0
+        return self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+    def _post_after(self, delay: float, texts: List[str]) -> tuple:
+        # the backoff holds an in-flight slot, which also slows down new chunks while the service struggles
+        if delay > 0:
+            time.sleep(delay)
+        return self._post(texts)
+
+    def _record(self, n_texts: int, elapsed: Optional[float]):
+        """
+        Update statistics and adapt the chunk size (additive increase, multiplicative decrease).
+        elapsed is None for a failed request.
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+            if elapsed is None:
+                self._stats["errors"] += 1
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+                return
+            self._stats["texts"] += n_texts
+            self._stats["total_latency"] += elapsed
+            if elapsed > self.target_latency:
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+            elif elapsed < self.target_latency / 2 and n_texts >= self.chunk_size:
+                self.chunk_size = min(self.max_chunk_size, self.chunk_size + max(1, self.chunk_size // 4))
+
+    def embed(self, texts: List[str]) -> List[list]:
+        """
+        Embed texts, preserving their order.
+        Args:
+            texts (list): descriptions to embed
+        Returns:
+            list: one embedding per text
+        """
+        texts = list(texts)
+        results: List[Optional[list]] = [None] * len(texts)
+        # (offset, size, attempt) ranges left to send; failed ranges are split and retried
+        retries = deque()
+        next_offset = 0
+        in_flight = {}
+
+        def next_range():
+            nonlocal next_offset
+            if retries:
+                return retries.popleft()
+            if next_offset >= len(texts):
+                return None
+            size = min(self.chunk_size, len(texts) - next_offset)
+            chunk = (next_offset, size, 0)
+            next_offset += size
+            return chunk
+
+        while True:
+            while len(in_flight) < self.max_in_flight:
+                chunk = next_range()
+                if chunk is None:
+                    break
+                offset, size, attempt = chunk
+                in_flight[self._executor.submit(self._post_after, self._backoff(attempt), texts[offset:offset + size])] = chunk
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset, size, attempt = in_flight.pop(future)
+                try:
+                    embeddings, elapsed = future.result()
+                except Exception as e:
+                    self._record(size, None)
+                    if attempt + 1 >= self.max_retries:
+                        for pending in in_flight:
+                            pending.cancel()
+                        raise
+                    logger.warning(f"Embedding chunk of {size} texts failed ({e}), retrying")
+                    half = size // 2
+                    if half:
+                        retries.append((offset, half, attempt + 1))
+                        retries.append((offset + half, size - half, attempt + 1))
+                    else:
+                        retries.append((offset, size, attempt + 1))
+                    continue
+                self._record(size, elapsed)
+                results[offset:offset + size] = embeddings
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["chunk_size"] = self.chunk_size
+        successes = stats["requests"] - stats["errors"]
+        stats["avg_latency"] = stats["total_latency"] / successes if successes else 0.0
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_client: Optional[EmbeddingApiClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_embedding_api_client() -> EmbeddingApiClient:
+    """
+    Process-wide embedding API client (connection pools do not survive fork).
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = EmbeddingApiClient()
+            _client_pid = os.getpid()
+        return _client
+
+
+def request_embeddings_api(array_of_texts):
+    return get_embedding_api_client().embed(array_of_texts)
+
 
 def create_embeddings_api(array_of_texts):
-    descriptions = {'descriptions':[{'description': text} for text in array_of_texts]}
-    response = requests.post(f"{EMBEDDING_API_URL}/embeddings", json=json.dumps(descriptions))
-    if response.status_code != 200:
-        raise Exception(f"Failed to create embeddings: {response.text}")
-    return response.json()['embeddings']
\ No newline at end of file
+    """
+    Embeddings of the texts, served from the embedding store when already known.
+    """
+    return read_through(array_of_texts, request_embeddings_api, get_embedding_store(),
+                        EMBEDDING_API_MODEL, EMBEDDING_API_DIMENSIONALITY)
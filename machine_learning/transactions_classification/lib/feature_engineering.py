@@ -1,3 +1,7 @@
+import re
+import numpy as np
+import pandas as pd
+
 
 KEYWORD_HINT_FEATURES = ['pix', 'uber', 'ifd', 'pag','pg', 'aplicação', 'salário', 'light']
 DATE_FEATURES = ['Data']
@@ -7,14 +11,53 @@ ALL_FEATURES = NUMERIC_FEATURES + KEYWORD_HINT_FEATURES + DATE_FEATURES + TEXT_F
 TARGET_VARIABLE = ['categoria']
 
 
+class KeywordMatcher:
+    """
+    Finds every keyword contained in each text with a single regex scan per
+    distinct text.
+    The pattern is a zero-width lookahead over all keywords (longest first), so
+    matches may overlap; a keyword shadowed by a longer one starting at the same
+    position is a substring of it and is recovered through the `implied` table.
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = list(keywords)
+        ordered = sorted(set(self.keywords), key=len, reverse=True)
+        self.pattern = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in ordered) + "))")
+        self.implied = {
+            keyword: [j for j, other in enumerate(self.keywords) if other in keyword]
+            for keyword in ordered
+        }
+
+    def transform(self, texts) -> np.ndarray:
+        """
+        Keyword presence matrix.
+        Args:
+            texts: sequence of descriptions
+        Returns:
+            np.ndarray: uint8 matrix of shape (len(texts), len(keywords))
+        """
+        # bank descriptions repeat a lot, match each distinct text only once
+        codes, uniques = pd.factorize(pd.Series(texts, dtype=object), use_na_sentinel=False)
+        unique_hints = np.zeros((len(uniques), len(self.keywords)), dtype=np.uint8)
+        for row, text in enumerate(uniques):
+            if not isinstance(text, str):
+                continue
+            for keyword in set(self.pattern.findall(text)):
+                unique_hints[row, self.implied[keyword]] = 1
+        return unique_hints[codes]
+
+
+KEYWORD_MATCHER = KeywordMatcher(KEYWORD_HINT_FEATURES)
+
+
 def add_keyword_hints(complete_dataset):
-    for tag in KEYWORD_HINT_FEATURES:
-        complete_dataset[tag] = complete_dataset['Descrição'].apply(lambda x: 1 if tag in x else 0)
-    return complete_dataset[KEYWORD_HINT_FEATURES]
+    hints = KEYWORD_MATCHER.transform(complete_dataset['Descrição'].to_numpy())
+    return pd.DataFrame(hints, columns=KEYWORD_HINT_FEATURES, index=complete_dataset.index, copy=False)
 
 
 def add_date_features(complete_dataset):
     complete_dataset['day'] = complete_dataset['Data'].dt.day
     complete_dataset['month'] = complete_dataset['Data'].dt.month
     complete_dataset.drop('Data', inplace=True, axis=1)
-    return complete_dataset
\ No newline at end of file
+    return complete_dataset
@@ -1,49 +1,73 @@
-import pandas as pd
-from numpy.linalg import norm
 import numpy as np
 from google import genai
 from google.genai import types
 import os
+import json
+import hashlib
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logging import getLogger
+from pathlib import Path
+from typing import Optional
+from tqdm.auto import tqdm
+from machine_learning.transactions_classification.lib.embedding_matrix import attach_embeddings, normalize_rows
+from machine_learning.transactions_classification.lib.embedding_store import get_embedding_store, read_through
 
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'models/gemini-embedding-001')
-client = genai.Client(api_key=GEMINI_API_KEY)
+GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '100'))  # at most 100 requests can be in one batch
+GEMINI_MAX_IN_FLIGHT = int(os.getenv('GEMINI_MAX_IN_FLIGHT', '4'))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '100'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '5'))
+GEMINI_CHECKPOINT_DIR = os.getenv('GEMINI_CHECKPOINT_DIR')
+MAX_GEMINI_BATCH_SIZE = 100
+
+logger = getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Gemini client, created on first use so importing this module needs no API key.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = genai.Client(api_key=GEMINI_API_KEY)
+        return _client
 
-from tqdm.auto import tqdm
-tqdm.pandas()
 
 DIMENSIONALITY = 768
 
 # normalize embeddings
 def normalize_embeddings(embeddings):
-    embedding_values_np = np.array(embeddings)
-    normed_embedding = embedding_values_np / norm(embedding_values_np)
-    return normed_embedding
+    """
+    L2 normalize one embedding or every row of a matrix of embeddings.
+    """
+    return normalize_rows(np.array(embeddings, dtype=np.float32))
 
 
 def embed_and_normalize_embeddings(complete_dataset, embeddings):
     """
-    Expands the 'Embeddings' column (containing numpy arrays) into separate columns.
+    Appends the normalized embeddings to the dataset as embedding_<i> columns.
     Args:
-        df (pd.DataFrame): DataFrame with an 'Embeddings' column containing arrays.
+        complete_dataset (pd.DataFrame): transactions, one row per embedding
+        embeddings (list): one embedding per row of complete_dataset
     Returns:
-        pd.DataFrame: DataFrame with embeddings expanded into individual columns.
+        pd.DataFrame: complete_dataset with the float32 embedding columns
     """
-    normalized_embeddings = [normalize_embeddings(arr) for arr in embeddings]
+    return attach_embeddings(complete_dataset, embeddings, normalize=True)
 
-    embedding_df = pd.DataFrame(normalized_embeddings, 
-                                columns=[f'embedding_{i}' for i in range(len(normalized_embeddings[0]))])
-
-    embedded_dataset = pd.concat([complete_dataset, embedding_df], axis=1)
-  
-    return embedded_dataset
-
-def make_embed_text_fn_batch(model):
+def make_embed_text_fn_batch(model, client=None):
 
     def embed_fn(texts: list[str]) -> list[list[float]]:
         # Set the task_type to CLASSIFICATION and embed the batch of texts
-        result = client.models.embed_content(model=model,
+        result = (client or get_client()).models.embed_content(model=model,
                                             contents=texts,
                                             config=types.EmbedContentConfig(
                                                 task_type="CLASSIFICATION",
@@ -54,16 +78,143 @@ def make_embed_text_fn_batch(model):
     return embed_fn
 
 
-def create_embeddings_batch(array_of_texts):
-    embed_fn = make_embed_text_fn_batch(GEMINI_MODEL)
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    """
 
-    batch_size = 25  # at most 100 requests can be in one batch
-    all_embeddings = []
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_time = (tokens - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class GeminiBatchEmbedder:
+    """
+    Embeds texts with Gemini keeping up to max_in_flight batches in flight,
+    rate limited by a token bucket (one token per request).
+    With a checkpoint_dir every completed batch is saved to disk, so an
+    interrupted run resumes from the batches already embedded.
+    """
 
-    # Loop over the texts in chunks of batch_size
-    for i in tqdm(range(0, len(array_of_texts), batch_size)):
-        batch = array_of_texts[i : i + batch_size]
-        embeddings = embed_fn(batch)
-        all_embeddings.extend(embeddings)
+    def __init__(self, client=None, model: str = GEMINI_MODEL, batch_size: int = GEMINI_BATCH_SIZE,
+                 max_in_flight: int = GEMINI_MAX_IN_FLIGHT, requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+                 max_retries: int = GEMINI_MAX_RETRIES, checkpoint_dir=GEMINI_CHECKPOINT_DIR, show_progress: bool = True):
+        self.model = model
+        self.batch_size = min(max(1, batch_size), MAX_GEMINI_BATCH_SIZE)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self.show_progress = show_progress
+        self.rate_limiter = TokenBucket(requests_per_minute / 60, capacity=self.max_in_flight)
+        self.embed_fn = make_embed_text_fn_batch(model, client)
+
+    def _job_dir(self, texts: list) -> Optional[Path]:
+        """
+        Checkpoint directory of this exact list of texts and settings.
+        """
+        if self.checkpoint_dir is None:
+            return None
+        digest = hashlib.sha256(json.dumps([self.model, DIMENSIONALITY, self.batch_size, texts]).encode("utf-8")).hexdigest()[:16]
+        job_dir = self.checkpoint_dir / digest
+        job_dir.mkdir(parents=True, exist_ok=True)
+        return job_dir
+
+    def _embed_batch(self, batch: list) -> list:
+        delay = 1.0
+        for attempt in range(self.max_retries):
+            self.rate_limiter.acquire()
+            try:
+                return self.embed_fn(batch)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                logger.warning(f"Gemini batch of {len(batch)} texts failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+                delay *= 2
+
+    def embed(self, texts: list) -> list:
+        """
+        Embed texts, preserving their order.
+        Args:
+            texts (list): texts to embed
+        Returns:
+            list: one embedding per text
+        """
+        texts = list(texts)
+        job_dir = self._job_dir(texts)
+        starts = list(range(0, len(texts), self.batch_size))
+        results = {}
+
+        if job_dir is not None:
+            for start in starts:
+                checkpoint = job_dir / f"{start:09d}.npy"
+                if checkpoint.exists():
+                    results[start] = np.load(checkpoint).tolist()
+            if results:
+                logger.info(f"Resuming from {len(results)}/{len(starts)} checkpointed batches in {job_dir}")
+
+        pending = [start for start in starts if start not in results]
+        progress = tqdm(total=len(starts), initial=len(results), disable=not self.show_progress)
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="gemini-embedding") as executor:
+            in_flight = {}
+            while (pending and error is None) or in_flight:
+                # after a failure, only wait for the batches in flight so they are checkpointed too
+                while pending and error is None and len(in_flight) < self.max_in_flight:
+                    start = pending.pop(0)
+                    in_flight[executor.submit(self._embed_batch, texts[start:start + self.batch_size])] = start
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start = in_flight.pop(future)
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    results[start] = embeddings
+                    if job_dir is not None:
+                        # write then rename, so a crash never leaves a partial checkpoint
+                        tmp_path = job_dir / f"{start:09d}.tmp.npy"
+                        np.save(tmp_path, np.asarray(embeddings, dtype=np.float32))
+                        os.replace(tmp_path, job_dir / f"{start:09d}.npy")
+                    progress.update(1)
+        progress.close()
+        if error is not None:
+            raise error
+
+        all_embeddings = []
+        for start in starts:
+            all_embeddings.extend(results[start])
+
+        if job_dir is not None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return all_embeddings
+
+
+def create_embeddings_batch(array_of_texts, checkpoint_dir=GEMINI_CHECKPOINT_DIR, client=None):
+    """
+    Gemini embeddings of the texts, served from the embedding store when already known.
+    Args:
+        array_of_texts (list): texts to embed
+        checkpoint_dir (str): directory for resumable checkpoints of long runs
+        client: genai.Client compatible object, defaults to the shared client
+    """
+    embedder = GeminiBatchEmbedder(client=client, checkpoint_dir=checkpoint_dir)
+    return read_through(array_of_texts, embedder.embed, get_embedding_store(),
+                        GEMINI_MODEL, DIMENSIONALITY)
 
-    return all_embeddings
\ No newline at end of file
@@ -7,13 +7,15 @@ from sklearn.preprocessing import (
 from sklearn.preprocessing import FunctionTransformer
 from sklearn.pipeline import FeatureUnion
 from machine_learning.transactions_classification.lib.feature_engineering import add_keyword_hints, add_date_features, NUMERIC_FEATURES, DATE_FEATURES, TEXT_FEATURES
-from machine_learning.transactions_classification.lib.tokenization import hidden_state_from_text_inputs, tokenized_pytorch_tensors
 
 
 VERBOSE = False
 
 
 def description_transformer():
+    # torch/transformers are only needed by the DistilBERT pipeline
+    from machine_learning.transactions_classification.lib.tokenization import hidden_state_from_text_inputs, tokenized_pytorch_tensors
+
     return make_pipeline(
         FunctionTransformer(tokenized_pytorch_tensors, kw_args={"column_list": ["input_ids", "attention_mask"]}),
         FunctionTransformer(hidden_state_from_text_inputs),
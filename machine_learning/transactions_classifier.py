@@ -1,13 +1,20 @@
 from abc import ABC
+import hashlib
 import os
 from pathlib import Path
 import pickle
 from logging import getLogger
-from typing import Protocol, Optional
+from typing import Callable, List, Protocol, Optional
+import numpy as np
 from machine_learning.utils import load_joblib, load_pickle
+from machine_learning.transactions_classification.lib.embedding_matrix import EmbeddingMatrix, embedding_columns
 
 
 MODEL_REPOSITORY_PATH = Path(os.getenv("MODEL_PATH", os.path.dirname(__file__))) / "transactions_classification" / 'models'
+# element type of the preprocessed features fed to the model
+INFERENCE_DTYPE = np.dtype(os.getenv("INFERENCE_DTYPE", "float32"))
+# rows preprocessed and predicted at a time, bounds the memory of large jobs
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "8192"))
 
 
 # Define a protocol for scikit-learn models that are both classifiers and base estimators
@@ -35,26 +42,197 @@ class SklearnTransformerProtocol(Protocol):
         return False
 
 
+def artifact_version(*paths: Path) -> str:
+    """
+    Content hash identifying a set of model artifacts.
+    Args:
+        paths (Path): artifact files (model, preprocessor)
+    Returns:
+        str: short sha256 digest of the files contents
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class LoadedModel:
+    """
+    Immutable model/preprocessor pair of one artifact version.
+    Callers that need preprocess and predict to use the same version pin a
+    LoadedModel through MLModel.snapshot() instead of calling MLModel twice.
+    """
+
+    def __init__(self, model: SklearnClassifierProtocol, preprocessor: Optional[SklearnTransformerProtocol], version: str):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.version = version
+        self._columnar_plans = {}
+
+    def needs_preprocessing(self, X) -> bool:
+        return X.shape[1] == 3 if self.preprocessor else False
+
+    def preprocess(self, X):
+        if self.preprocessor is None:
+            raise RuntimeError("Model has no preprocessor.")
+        X = X.rename(columns = {"value":'Valor', "date": 'Data', "description":'Descrição'})
+        return self.preprocessor.transform(X)
+
+    def predict(self, X):
+        if self.needs_preprocessing(X):
+            X = self.preprocess(X)
+        return self.model.predict(X)
+
+    def preprocess_columns(self, X, embeddings: np.ndarray, dtype=None) -> np.ndarray:
+        """
+        Preprocess tabular features and an embedding matrix of the same rows
+        without concatenating them into one DataFrame first.
+        The fitted ColumnTransformer is applied transformer by transformer on the
+        tabular columns, and the passthrough remainder (the embedding_<i>
+        columns) is taken straight from the matrix. Preprocessors of any other
+        shape fall back to preprocess() on the combined frame.
+        Args:
+            X (pd.DataFrame): Data, Descrição and Valor columns
+            embeddings (np.ndarray): (n_rows, dimensionality) embeddings
+            dtype: element type of the output, None keeps the transformers' (float64)
+        Returns:
+            np.ndarray: the same features as preprocess() on the combined frame
+        """
+        if self.preprocessor is None:
+            raise RuntimeError("Model has no preprocessor.")
+        X = X.rename(columns = {"value":'Valor', "date": 'Data', "description":'Descrição'})
+        plan = self._columnar_plan(embeddings.shape[1])
+        if plan is None:
+            features = self.preprocess(EmbeddingMatrix(embeddings).attach(X))
+            return features if dtype is None else np.asarray(features, dtype=dtype)
+
+        blocks = []
+        for transformer, columns in plan:
+            if transformer is None:
+                blocks.append(embeddings)
+            else:
+                blocks.append(np.asarray(transformer.transform(X.loc[:, columns])))
+        if dtype is None:
+            return np.hstack(blocks)
+        # write every block straight into one output matrix, float16 embeddings included
+        features = np.empty((len(X), sum(block.shape[1] for block in blocks)), dtype=dtype)
+        offset = 0
+        for block in blocks:
+            features[:, offset:offset + block.shape[1]] = block
+            offset += block.shape[1]
+        return features
+
+    def predict_columns(self, X, embeddings: np.ndarray, dtype=INFERENCE_DTYPE, batch_size: int = INFERENCE_BATCH_SIZE) -> np.ndarray:
+        """
+        Predict labels of tabular features and their embedding matrix,
+        batch_size rows at a time, with dtype features.
+        Peak memory grows with batch_size instead of with the job size.
+        Args:
+            X (pd.DataFrame): Data, Descrição and Valor columns
+            embeddings (np.ndarray): (n_rows, dimensionality) embeddings, float32 or float16
+            dtype: element type of the features fed to the model
+            batch_size (int): rows per preprocess + predict call
+        Returns:
+            np.ndarray: one prediction per row
+        """
+        if len(X) <= batch_size:
+            return self.model.predict(self.preprocess_columns(X, embeddings, dtype))
+        predictions = []
+        for start in range(0, len(X), batch_size):
+            features = self.preprocess_columns(X.iloc[start:start + batch_size], embeddings[start:start + batch_size], dtype)
+            predictions.append(self.model.predict(features))
+        return np.concatenate(predictions)
+
+    def _columnar_plan(self, dimensionality: int) -> Optional[list]:
+        """
+        (transformer, columns) steps reproducing the preprocessor output, with
+        transformer None for the embedding block; None if not applicable.
+        """
+        if dimensionality not in self._columnar_plans:
+            self._columnar_plans[dimensionality] = _columnar_plan(self.preprocessor, embedding_columns(dimensionality))
+        return self._columnar_plans[dimensionality]
+
+
+def _is_passthrough(transformer) -> bool:
+    if isinstance(transformer, str):
+        return transformer == "passthrough"
+    # recent scikit-learn versions wrap passthrough columns in an identity FunctionTransformer
+    return type(transformer).__name__ == "FunctionTransformer" and getattr(transformer, "func", None) is None
+
+
+def _columnar_plan(preprocessor, embedding_column_names: list) -> Optional[list]:
+    if type(preprocessor).__name__ != "ColumnTransformer" or getattr(preprocessor, "sparse_output_", False):
+        return None
+    names_in = list(getattr(preprocessor, "feature_names_in_", []))
+    plan, embeddings_seen = [], False
+    for name, transformer, columns in preprocessor.transformers_:
+        if isinstance(transformer, str) and transformer == "drop":
+            continue
+        if not isinstance(columns, str):
+            columns = [names_in[c] if not isinstance(c, str) else c for c in columns]
+            if len(columns) == 0:
+                continue
+        if _is_passthrough(transformer) and columns == embedding_column_names and not embeddings_seen:
+            plan.append((None, columns))
+            embeddings_seen = True
+        elif isinstance(transformer, str) or set(columns if not isinstance(columns, str) else [columns]) & set(embedding_column_names):
+            return None
+        else:
+            plan.append((transformer, columns))
+    return plan if embeddings_seen else None
+
+
 class MLModel(ABC):
     """
     Abstract base class for machine learning models.
+    The loaded artifacts live in a single LoadedModel reference, so reload()
+    can swap a new version in atomically while in-flight predictions keep
+    using the version they started with.
     """
 
     def __init__(self, model_path: Path, preprocessor_path: Path):
         self.model_path = model_path
         self.preprocessor_path = preprocessor_path
-        self.model: Optional[SklearnClassifierProtocol] = None
-        self.preprocessor: Optional[SklearnTransformerProtocol] = None
-        self.is_loaded = False
+        self._active: Optional[LoadedModel] = None
+        self._swap_listeners: List[Callable[[LoadedModel], None]] = []
         if (not self.is_loaded) and self.model_path.exists():
             self.load()
 
+    @property
+    def is_loaded(self) -> bool:
+        return self._active is not None
+
+    @property
+    def model(self) -> Optional[SklearnClassifierProtocol]:
+        active = self._active
+        return active.model if active else None
+
+    @property
+    def preprocessor(self) -> Optional[SklearnTransformerProtocol]:
+        active = self._active
+        return active.preprocessor if active else None
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active.version if active else None
+
     def train(self, X, y):
         """
         Train the model with the provided features and labels.
         """
         raise NotImplementedError("Train method must be implemented by subclasses.")
-    
+
+    def _load_artifacts(self) -> LoadedModel:
+        """
+        Deserialize the model and preprocessor currently on disk.
+        """
+        model = load_pickle(self.model_path)
+        preprocessor = load_joblib(self.preprocessor_path)
+        return LoadedModel(model, preprocessor, artifact_version(self.model_path, self.preprocessor_path))
+
     def load(self):
         """
         Load a pre-trained model from the specified path.
@@ -64,32 +242,77 @@ class MLModel(ABC):
             return
         
         try:
-            self.model = load_pickle(self.model_path)
-            self.preprocessor = load_joblib(self.preprocessor_path)
-            self.is_loaded = True
-            getLogger(self.__class__.__name__).info(f"Model loaded successfully from {self.model_path}")
+            self._active = self._load_artifacts()
+            getLogger(self.__class__.__name__).info(f"Model {self.version} loaded successfully from {self.model_path}")
         except pickle.UnpicklingError as e:
             getLogger(self.__class__.__name__).error(f"Error unpickling model from {self.model_path}: {e}")
-            self.model = None
-            self.is_loaded = False
+            self._active = None
         except Exception as e:
             getLogger(self.__class__.__name__).error(f"Model could not be loaded from {self.model_path}: {e}")
-            self.is_loaded = False
+            self._active = None
 
-    def predict(self, X):
+    def reload(self, validator: Optional[Callable[[LoadedModel], bool]] = None) -> bool:
         """
-        Predict labels for the provided features.
+        Load the artifacts on disk again and swap them in if they are a new version.
+        The active version keeps serving while the candidate is loaded and validated.
+        Args:
+            validator (Callable): optional check the candidate must pass before the swap
+        Returns:
+            bool: True if a new version was swapped in
         """
-        self.load()
-        if self.needs_preprocessing(X):
-            X = self.preprocess(X)
+        logger = getLogger(self.__class__.__name__)
+        try:
+            candidate = self._load_artifacts()
+        except Exception as e:
+            logger.error(f"Candidate model could not be loaded from {self.model_path}: {e}")
+            return False
 
-        if not self.is_loaded or self.model is None:
+        if candidate.version == self.version:
+            return False
+
+        if validator is not None:
+            try:
+                is_valid = validator(candidate)
+            except Exception as e:
+                logger.error(f"Candidate model {candidate.version} validation raised: {e}")
+                is_valid = False
+            if not is_valid:
+                logger.error(f"Candidate model {candidate.version} rejected, keeping {self.version}")
+                return False
+
+        previous = self.version
+        self._active = candidate
+        logger.info(f"Model swapped from {previous} to {candidate.version}")
+        for listener in list(self._swap_listeners):
+            try:
+                listener(candidate)
+            except Exception as e:
+                logger.error(f"Model swap listener failed: {e}")
+        return True
+
+    def add_swap_listener(self, listener: Callable[[LoadedModel], None]) -> None:
+        """
+        Register a callback invoked with the new LoadedModel after every swap.
+        """
+        self._swap_listeners.append(listener)
+
+    def snapshot(self) -> LoadedModel:
+        """
+        Pin the active model version.
+        """
+        self.load()
+        active = self._active
+        if active is None:
             message = "Model is not loaded. Call load() first."
             getLogger(self.__class__.__name__).error(message)
             raise RuntimeError(message)
-        
-        return self.model.predict(X)    
+        return active
+
+    def predict(self, X):
+        """
+        Predict labels for the provided features.
+        """
+        return self.snapshot().predict(X)
 
     def needs_preprocessing(self, X) -> bool:
         """
@@ -102,14 +325,7 @@ class MLModel(ABC):
         """
         Preprocess the inputs for prediction.
         """
-        if not self.is_loaded or self.preprocessor is None:
-            message = "Model is not loaded. Call load() first."
-            getLogger(self.__class__.__name__).error(message)
-            raise RuntimeError(message)
-        
-        X= X.rename(columns = {"value":'Valor', "date": 'Data', "description":'Descrição'})
-        
-        return self.preprocessor.transform(X)
+        return self.snapshot().preprocess(X)
 
 
 class TransactionsClassifier(MLModel):
@@ -9,7 +9,7 @@ from model.user import User
 from model.transaction_category import TransactionCategory
 from model.transaction_type import TransactionType
 from model.transaction import Transaction
-from model.batch_job import BatchJob, JobStatus
+from model.batch_job import BatchJob, BatchJobShard, JobStatus
 from pathlib import Path
 
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Enum
+from sqlalchemy import Column, String, Integer, DateTime, Text, Enum, ForeignKey
 from datetime import datetime
 from model import Base
 import enum
@@ -48,3 +48,33 @@ class BatchJob(Base):
     def __repr__(self):
         return f'<BatchJob {self.id} - {self.status.value}>'
 
+
+
+class BatchJobShard(Base):
+    """Classified transactions of one shard of a sharded batch job, until all shards land"""
+    __tablename__ = 'BatchJobShard'
+
+    job_id = Column(String(36), ForeignKey("BatchJob.pk_batch_job"), primary_key=True)
+    shard_index = Column(Integer, primary_key=True)
+    shard_count = Column(Integer, nullable=False)
+    transactions_output = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    def __init__(self, job_id: str, shard_index: int, shard_count: int, transactions_output: str):
+        """
+        Creates a new BatchJobShard
+        
+        Arguments:
+            job_id: Identifier of the sharded BatchJob
+            shard_index: Position of the shard in the job's transactions
+            shard_count: Number of shards of the job
+            transactions_output: JSON string of the shard's classified transactions
+        """
+        self.job_id = job_id
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.transactions_output = transactions_output
+        self.created_at = datetime.now()
+    
+    def __repr__(self):
+        return f'<BatchJobShard {self.job_id} {self.shard_index + 1}/{self.shard_count}>'
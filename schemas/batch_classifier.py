@@ -15,6 +15,7 @@ class BatchClassifierRowSchema(BaseModel):
     value:float 
     user:Optional[str]
     classification:Optional[str]
+    model_version:Optional[str] = None
 
 
 class BatchClassifierListSchema(BaseModel):
@@ -0,0 +1,101 @@
+from pathlib import Path
+import pickle
+import joblib
+import numpy as np
+import pandas as pd
+from pytest import fixture
+from sklearn.linear_model import LogisticRegression
+from machine_learning.transactions_classification.lib.preprocess import get_preprocessing_transformer
+
+
+EMBEDDING_SIZE = 8
+MODEL_FILE_NAME = "embedding_classification_model.pkl"
+PREPROCESSOR_FILE_NAME = "embedding_classification_preprocessor.pkl"
+
+DESCRIPTIONS = [
+    ("pix recebido joao", "Outros Ganhos"),
+    ("uber trip", "Transporte"),
+    ("ifd restaurante", "Alimentação especial"),
+    ("pag conta light", "Casa"),
+    ("salário empresa", "Salário"),
+    ("aplicação cdb", "Investimento"),
+    ("supermercado", "Alimentação cotidiana"),
+    ("farmacia", "Saúde"),
+]
+
+
+def make_transactions_frame(n_rows: int, seed: int = 7) -> tuple:
+    """
+    Build a synthetic, already renamed transactions frame with embedding columns.
+    Returns:
+        tuple: (features DataFrame, labels list)
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(DESCRIPTIONS), size=n_rows)
+    embeddings = rng.normal(size=(n_rows, EMBEDDING_SIZE))
+    # make the embedding informative about the label
+    embeddings[np.arange(n_rows), picks % EMBEDDING_SIZE] += 3.0
+    df = pd.DataFrame({
+        'Data': pd.to_datetime("2024-01-01", utc=True) + pd.to_timedelta(rng.integers(0, 365, size=n_rows), unit="D"),
+        'Descrição': [DESCRIPTIONS[i][0] for i in picks],
+        'Valor': rng.normal(100, 50, size=n_rows),
+    })
+    embeddings_df = pd.DataFrame(embeddings, columns=[f'embedding_{i}' for i in range(EMBEDDING_SIZE)])
+    labels = [DESCRIPTIONS[i][1] for i in picks]
+    return pd.concat([df, embeddings_df], axis=1), labels
+
+
+def write_model_repository(root: Path, seed: int = 7, n_rows: int = 400) -> Path:
+    """
+    Fit a tiny embedding classifier and store it with the same layout as
+    machine_learning/transactions_classification (models/ and pipelines/).
+    Returns:
+        Path: the models directory, usable as TransactionsClassifier repository_path
+    """
+    X, y = make_transactions_frame(n_rows, seed)
+    preprocessor = get_preprocessing_transformer(use_embedding=True)
+    X_preprocessed = preprocessor.fit_transform(X)
+    model = LogisticRegression(max_iter=500, random_state=seed).fit(X_preprocessed, y)
+
+    models_path = root / "models"
+    pipelines_path = root / "pipelines"
+    models_path.mkdir(parents=True, exist_ok=True)
+    pipelines_path.mkdir(parents=True, exist_ok=True)
+    with open(models_path / MODEL_FILE_NAME, 'wb') as f:
+        pickle.dump(model, f)
+    joblib.dump(preprocessor, pipelines_path / PREPROCESSOR_FILE_NAME)
+    return models_path
+
+
+@fixture
+def model_repository(tmp_path):
+    return write_model_repository(tmp_path)
+
+
+def make_tiny_encoder(root: Path, seed: int = 0, texts=None, **encoder_kwargs):
+    """
+    DistilBertEncoder backed by a tiny randomly initialised DistilBERT and a
+    word level vocabulary built from texts (DESCRIPTIONS by default), so no
+    download is needed. The same seed gives the same weights.
+    """
+    import torch
+    from transformers import DistilBertConfig, DistilBertModel, DistilBertTokenizerFast
+    from machine_learning.transactions_classification.lib.tokenization import DistilBertEncoder
+
+    if texts is None:
+        texts = [description for description, _ in DESCRIPTIONS]
+    words = sorted({word for text in texts for word in text.lower().split()})
+    vocab_file = root / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words), encoding="utf-8")
+    tokenizer = DistilBertTokenizerFast(str(vocab_file))
+
+    torch.manual_seed(seed)
+    config = DistilBertConfig(vocab_size=tokenizer.vocab_size, dim=32, n_layers=2, n_heads=2,
+                              hidden_dim=64, max_position_embeddings=128)
+    return DistilBertEncoder(model_name="tiny-distilbert", model=DistilBertModel(config), tokenizer=tokenizer,
+                             device=torch.device("cpu"), **encoder_kwargs)
+
+
+@fixture
+def tiny_encoder(tmp_path):
+    return make_tiny_encoder(tmp_path)
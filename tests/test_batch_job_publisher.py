@@ -0,0 +1,151 @@
+import json
+import threading
+from pytest import fixture
+from kafka import batch_job_publisher
+from kafka.batch_job_publisher import BatchJobPublisher, mark_job_publish_failed, publish_batch_job
+from model import Session, BatchJob, JobStatus
+
+
+class FakeMessage:
+    def __init__(self, topic, key, value):
+        self._topic, self._key, self._value = topic, key, value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def offset(self):
+        return 0
+
+
+class FakeProducer:
+    """
+    Queues messages like the Kafka producer; delivery callbacks run on poll/flush.
+    """
+
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.pending = []
+        self.delivered = []
+        self.lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, on_delivery=None, **kwargs):
+        with self.lock:
+            self.pending.append((FakeMessage(topic, key, value), on_delivery))
+
+    def poll(self, timeout=0):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for message, on_delivery in pending:
+            if self.fail_with is None:
+                self.delivered.append(message)
+            on_delivery(self.fail_with, message)
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+
+@fixture
+def producers():
+    return []
+
+
+@fixture
+def publisher(producers):
+    def factory():
+        producers.append(FakeProducer())
+        return producers[-1]
+    publisher = BatchJobPublisher(producer_factory=factory, poll_interval=0.01)
+    batch_job_publisher.set_publisher(publisher)
+    yield publisher
+    publisher.close()
+    batch_job_publisher.set_publisher(None)
+
+
+@fixture
+def batch_job():
+    session = Session()
+    batch_job = BatchJob(transactions_input="[]")
+    session.add(batch_job)
+    session.commit()
+    job_id = batch_job.id
+    session.close()
+    yield job_id
+    session = Session()
+    session.query(BatchJob).filter(BatchJob.id == job_id).delete()
+    session.commit()
+    session.close()
+
+
+def job_row(job_id):
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    session.close()
+    return batch_job
+
+
+def test_one_producer_per_process(publisher, producers):
+    for i in range(5):
+        publish_batch_job(f"job-{i}", [{"description": "x"}])
+    publisher.flush()
+    assert len(producers) == 1
+    delivered = producers[0].delivered
+    assert [m._key for m in delivered] == [f"job-{i}" for i in range(5)]
+    assert json.loads(delivered[0]._value) == {"job_id": "job-0", "transactions": [{"description": "x"}]}
+
+
+def test_claim_check_reference_message(publisher, producers):
+    publish_batch_job("job-1", transactions_ref="claim-check:job-1/transactions")
+    publisher.flush()
+    assert json.loads(producers[0].delivered[0]._value) == {"job_id": "job-1", "transactions_ref": "claim-check:job-1/transactions"}
+
+
+def test_new_producer_after_fork(publisher, producers, monkeypatch):
+    publish_batch_job("job-1", [])
+    monkeypatch.setattr(batch_job_publisher.os, "getpid", lambda: -1)
+    publish_batch_job("job-2", [])
+    assert len(producers) == 2
+    assert publisher.flush() == 0
+    assert [m._key for m in producers[1].delivered] == ["job-2"]
+
+
+def test_callbacks_are_served_in_the_background(publisher, producers):
+    publish_batch_job("job-1", [])
+    for _ in range(500):
+        if producers[0].delivered:
+            break
+        threading.Event().wait(0.01)
+    assert [m._key for m in producers[0].delivered] == ["job-1"]
+
+
+def test_failed_delivery_marks_the_job_failed(batch_job):
+    publisher = BatchJobPublisher(producer_factory=lambda: FakeProducer(fail_with="Broker: Message size too large"),
+                                  poll_interval=0.01)
+    publisher.publish(batch_job, {"job_id": batch_job, "transactions": []})
+    publisher.close()
+    row = job_row(batch_job)
+    assert row.status == JobStatus.FAILED
+    assert row.error_message == "Failed to publish to Kafka: Broker: Message size too large"
+
+
+def test_successful_delivery_leaves_the_job_pending(batch_job):
+    publisher = BatchJobPublisher(producer_factory=FakeProducer, poll_interval=0.01)
+    publisher.publish(batch_job, {"job_id": batch_job, "transactions": []})
+    publisher.close()
+    assert job_row(batch_job).status == JobStatus.PENDING
+
+
+def test_close_flushes_and_allows_reuse(publisher, producers):
+    publish_batch_job("job-1", [])
+    publisher.close()
+    assert [m._key for m in producers[0].delivered] == ["job-1"]
+    publish_batch_job("job-2", [])
+    assert len(producers) == 2
+
+
+def test_mark_unknown_job_does_not_raise():
+    mark_job_publish_failed("missing-job", "error")
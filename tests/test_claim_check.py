@@ -0,0 +1,110 @@
+import json
+import numpy as np
+from pytest import fixture, mark, raises
+from kafka import claim_check
+from kafka.claim_check import FilesystemBlobStore, SqliteBlobStore, REFERENCE_PREFIX
+from kafka.embeddings_worker import encode_embeddings_results
+from kafka.embeddings_codec import decode_embeddings_message
+
+
+def make_transactions(n):
+    return [{'date': '2024-01-15T00:00:00', 'description': f'Compra {i}', 'value': float(i), 'user': 'ana',
+             'classification': None} for i in range(n)]
+
+
+@fixture(params=["filesystem", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "filesystem":
+        store = FilesystemBlobStore(tmp_path / "blobs")
+    else:
+        store = SqliteBlobStore(tmp_path / "blobs.sqlite3")
+    claim_check.set_blob_store(store)
+    yield store
+    claim_check.set_blob_store(None)
+
+
+def test_put_get_delete(store):
+    data = b"x" * 100_000
+    reference = store.put("job-1/transactions", data)
+    store.put("job-1/embeddings", b"y")
+    store.put("job-2/transactions", b"z")
+    assert store.get(reference) == data
+    assert store.delete_job("job-1") == 2
+    assert store.delete_job("job-1") == 0
+    with raises((KeyError, FileNotFoundError)):
+        store.get(reference)
+    assert store.get("job-2/transactions") == b"z"
+
+
+def test_blobs_are_compressed(store, tmp_path):
+    store.put("job-1/transactions", json.dumps(make_transactions(1000)).encode("utf-8"))
+    assert len(store._read("job-1/transactions")) < len(json.dumps(make_transactions(1000))) / 5
+
+
+def test_filesystem_rejects_keys_outside_the_root(tmp_path):
+    store = FilesystemBlobStore(tmp_path)
+    for key in ["../job/transactions", "job", "/job/transactions"]:
+        with raises(ValueError):
+            store.put(key, b"")
+
+
+def test_transactions_round_trip(store):
+    transactions = make_transactions(10)
+    reference = claim_check.store_transactions("job-1", transactions)
+    assert claim_check.is_reference(reference) and not claim_check.is_reference(json.dumps(transactions))
+    resolved = claim_check.resolve_batch_job({'job_id': 'job-1', 'transactions_ref': reference})
+    assert resolved == {'job_id': 'job-1', 'transactions': transactions}
+    # messages with inline transactions are left as they are
+    inline = {'job_id': 'job-1', 'transactions': transactions}
+    assert claim_check.resolve_batch_job(inline) is inline
+
+
+@mark.parametrize("n", [10, 10_000])
+def test_message_size_does_not_depend_on_batch_size(store, monkeypatch, n):
+    monkeypatch.setattr(claim_check, "CLAIM_CHECK_ENABLED", True)
+    embeddings = np.random.default_rng(0).normal(size=(n, 16)).astype(np.float32)
+    result_message = {'job_id': f'job-{n}', 'transactions': make_transactions(n), 'embeddings': embeddings}
+    value = encode_embeddings_results(result_message)
+    assert len(value) < 200
+
+    resolved = claim_check.resolve_embeddings_results(decode_embeddings_message(value))
+    assert resolved['transactions'] == result_message['transactions']
+    np.testing.assert_array_equal(resolved['embeddings'], embeddings)
+    claim_check.release_job(f'job-{n}')
+    assert store.delete_job(f'job-{n}') == 0
+
+
+def test_disabled_keeps_payload_inline(monkeypatch):
+    monkeypatch.setattr(claim_check, "CLAIM_CHECK_ENABLED", False)
+    result_message = {'job_id': 'job-1', 'transactions': make_transactions(3), 'embeddings': [[1.0, 0.0]] * 3}
+    decoded = decode_embeddings_message(encode_embeddings_results(result_message))
+    assert 'embeddings_ref' not in decoded and decoded['transactions'] == result_message['transactions']
+
+
+def test_unknown_store(monkeypatch):
+    monkeypatch.setattr(claim_check, "CLAIM_CHECK_STORE", "s3")
+    claim_check.set_blob_store(None)
+    with raises(ValueError):
+        claim_check.get_blob_store()
+
+
+def test_async_endpoint_stores_a_reference(store, monkeypatch):
+    from unittest.mock import patch
+    from config import app
+    from model import Session, BatchJob
+    monkeypatch.setattr(claim_check, "CLAIM_CHECK_ENABLED", True)
+    transactions = make_transactions(3)
+    with patch("apis.batch_classifier.publish_batch_job") as publish, app.test_client() as client:
+        response = client.post('/batch-classify-async', json={"transactions": transactions})
+    assert response.status_code == 202
+    job_id = response.get_json()['jobId']
+
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    assert batch_job.transactions_input == f"{REFERENCE_PREFIX}{job_id}/transactions"
+    publish.assert_called_once_with(job_id, transactions_ref=batch_job.transactions_input)
+    assert [t['description'] for t in claim_check.load_transactions(batch_job.transactions_input)] == \
+        [t['description'] for t in transactions]
+    session.delete(batch_job)
+    session.commit()
+    session.close()
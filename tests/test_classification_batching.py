@@ -0,0 +1,123 @@
+import time
+from unittest.mock import patch
+import numpy as np
+from pytest import fixture
+from sqlalchemy import event
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import LoadedModel, TransactionsClassifier
+from model import Session, BatchJob, JobStatus
+from kafka import classification_worker
+from kafka.classification_worker import classify_transactions, drain_messages, process_classification_batch
+from conftest import make_transactions_frame
+
+
+class FakeMessage:
+    def __init__(self, offset, delay=0.0):
+        self._offset, self.delay = offset, delay
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def poll(self, timeout=None):
+        if not self.messages:
+            return None
+        if self.messages[0].delay > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(self.messages[0].delay)
+        return self.messages.pop(0)
+
+
+@fixture
+def classifier(model_repository, monkeypatch):
+    classifier = TransactionsClassifier(model_repository)
+    monkeypatch.setattr(classification_worker, "get_transactions_classifier", lambda: classifier)
+    monkeypatch.setattr(classification_worker, "get_prediction_cache", lambda model: PredictionCache(max_entries=0))
+    return classifier
+
+
+@fixture
+def jobs():
+    """
+    Three jobs of different sizes, with rows in the database.
+    """
+    messages = []
+    session = Session()
+    for n_rows, seed in [(5, 1), (12, 2), (1, 3)]:
+        X, _ = make_transactions_frame(n_rows, seed=seed)
+        transactions = [{'date': date.isoformat(), 'description': description, 'value': value, 'user': 'ana'}
+                        for date, description, value in zip(X['Data'], X['Descrição'], X['Valor'])]
+        batch_job = BatchJob(transactions_input="[]")
+        session.add(batch_job)
+        messages.append({'job_id': batch_job.id, 'transactions': transactions,
+                         'embeddings': X.filter(like='embedding_').to_numpy(dtype=np.float32)})
+    session.commit()
+    session.close()
+    yield messages
+    session = Session()
+    session.query(BatchJob).filter(BatchJob.id.in_([m['job_id'] for m in messages])).delete()
+    session.commit()
+    session.close()
+
+
+def job_row(job_id):
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    session.expunge_all()
+    session.close()
+    return batch_job
+
+
+def test_drain_stops_at_max_messages():
+    consumer = FakeConsumer([FakeMessage(i) for i in range(10)])
+    assert [m.offset() for m in drain_messages(consumer, max_messages=4, max_wait_ms=1000)] == [0, 1, 2, 3]
+
+
+def test_drain_stops_at_max_wait():
+    consumer = FakeConsumer([FakeMessage(0), FakeMessage(1, delay=0.01), FakeMessage(2, delay=0.5)])
+    start = time.perf_counter()
+    assert [m.offset() for m in drain_messages(consumer, max_messages=10, max_wait_ms=100)] == [0, 1]
+    assert time.perf_counter() - start < 0.4
+
+
+def test_drain_returns_nothing_without_messages():
+    assert drain_messages(FakeConsumer([]), poll_timeout=0.01) == []
+
+
+def test_one_predict_and_one_transaction_for_the_batch(classifier, jobs):
+    expected = [classify_transactions(m['transactions'], m['embeddings'], classifier, PredictionCache(max_entries=0))
+                for m in jobs]
+    commits = []
+    listener = lambda session: commits.append(session)
+    event.listen(Session, "after_commit", listener)
+    try:
+        with patch.object(LoadedModel, "predict_columns", autospec=True, side_effect=LoadedModel.predict_columns) as predict:
+            metrics = process_classification_batch(jobs)
+    finally:
+        event.remove(Session, "after_commit", listener)
+
+    assert predict.call_count == 1
+    assert len(commits) == 1
+    assert metrics["messages"] == 3 and metrics["transactions"] == 18 and metrics["failed"] == 0
+    assert all(metrics[key] >= 0 for key in ("resolve_seconds", "classify_seconds", "db_seconds", "total_seconds"))
+    for message, job_expected in zip(jobs, expected):
+        batch_job = job_row(message['job_id'])
+        assert batch_job.status == JobStatus.COMPLETED
+        assert classification_worker.json.loads(batch_job.transactions_output) == job_expected
+
+
+def test_failing_job_does_not_fail_the_batch(classifier, jobs):
+    jobs[1]['embeddings'] = jobs[1]['embeddings'][:, :3]
+    metrics = process_classification_batch(jobs)
+    assert metrics["failed"] == 1
+    assert isinstance(metrics["errors"][jobs[1]['job_id']], Exception)
+    assert [job_row(m['job_id']).status for m in jobs] == [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.COMPLETED]
+    assert job_row(jobs[1]['job_id']).error_message.startswith("Classification failed")
@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pytest import fixture
+from sklearn.pipeline import make_pipeline
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import LoadedModel, TransactionsClassifier
+from machine_learning.transactions_classification.lib.embedding_matrix import attach_embeddings
+from machine_learning.utils import load_joblib, load_pickle
+from kafka.classification_worker import classify_transactions, transactions_features
+from conftest import EMBEDDING_SIZE, make_transactions_frame
+
+
+@fixture
+def fixtures_path():
+    return Path(os.path.dirname(__file__)) / "classification_fixtures"
+
+
+@fixture
+def preprocessor_path():
+    return Path(os.path.dirname(os.path.dirname(__file__))) / "machine_learning" / "transactions_classification" / "pipelines" / "embedding_classification_preprocessor.pkl"
+
+
+@fixture
+def classifier(model_repository):
+    return TransactionsClassifier(model_repository)
+
+
+@fixture
+def transactions():
+    X, _ = make_transactions_frame(60, seed=11)
+    embeddings = X.filter(like="embedding_").to_numpy()
+    records = [
+        {'date': date.isoformat(), 'description': description, 'value': value, 'user': 'ana'}
+        for date, description, value in zip(X['Data'], X['Descrição'], X['Valor'])
+    ]
+    return records, embeddings
+
+
+def test_preprocess_columns_matches_fixture_features(fixtures_path, preprocessor_path):
+    preprocessor = load_joblib(preprocessor_path)
+    X_test_raw = load_pickle(fixtures_path / "embeddings_X_test_raw.pkl")
+    X_test = load_pickle(fixtures_path / "embeddings_X_test_preprocessed.pkl")
+    model = LoadedModel(None, preprocessor, "fixture")
+
+    features = model.preprocess_columns(X_test_raw[["Data", "Descrição", "Valor"]],
+                                        X_test_raw.filter(like="embedding_").to_numpy())
+    np.testing.assert_allclose(features, X_test)
+    np.testing.assert_allclose(features, model.preprocess(X_test_raw))
+
+
+def test_preprocess_columns_falls_back_for_other_preprocessors(classifier):
+    snapshot = classifier.snapshot()
+    wrapped = LoadedModel(snapshot.model, make_pipeline(snapshot.preprocessor), snapshot.version)
+    X, _ = make_transactions_frame(20, seed=3)
+    embeddings = X.filter(like="embedding_").to_numpy()
+    tabular = X[["Data", "Descrição", "Valor"]]
+
+    assert wrapped._columnar_plan(EMBEDDING_SIZE) is None
+    assert snapshot._columnar_plan(EMBEDDING_SIZE) is not None
+    np.testing.assert_allclose(wrapped.preprocess_columns(tabular, embeddings), snapshot.preprocess_columns(tabular, embeddings))
+
+
+def test_transactions_features_parse_columns(transactions):
+    records, _ = transactions
+    df = transactions_features(records)
+    assert list(df.columns) == ["Data", "Descrição", "Valor"]
+    assert str(df["Data"].dtype) == "datetime64[ns, UTC]"
+    assert df["Valor"].dtype == np.float64
+    assert df["Data"].tolist() == [pd.to_datetime(t['date'], utc=True) for t in records]
+
+
+def test_classify_transactions_matches_row_by_row_path(classifier, transactions):
+    records, embeddings = transactions
+    classified = classify_transactions(records, embeddings.tolist(), classifier, PredictionCache(max_entries=0))
+
+    # previous implementation: one dict and one pd.to_datetime per transaction, then concat
+    df = pd.DataFrame([{'Data': pd.to_datetime(t['date'], utc=True), 'Descrição': t['description'], 'Valor': t['value']}
+                       for t in records])
+    expected = classifier.predict(classifier.preprocess(attach_embeddings(df, embeddings.tolist())))
+
+    assert [t['classification'] for t in classified] == list(expected)
+    assert all(t['model_version'] == classifier.version for t in classified)
+    assert [(t['date'], t['description'], t['value'], t['user']) for t in classified] == \
+        [(t['date'], t['description'], t['value'], t['user']) for t in records]
+
+
+def test_classify_transactions_predicts_only_cache_misses(classifier, transactions):
+    records, embeddings = transactions
+    cache = PredictionCache(max_entries=100)
+    first = classify_transactions(records[:30], embeddings[:30].tolist(), classifier, cache)
+    second = classify_transactions(records, embeddings.tolist(), classifier, cache)
+    assert [t['classification'] for t in second[:30]] == [t['classification'] for t in first]
+    assert cache.stats()["hits"] >= 30
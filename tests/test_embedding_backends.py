@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+from pytest import fixture, raises
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+from machine_learning.transactions_classification.lib import embedding_backends
+from machine_learning.transactions_classification.lib.embedding_backends import (
+    ExternalApiBackend,
+    HashedNgramBackend,
+    create_embeddings,
+    get_embedding_backend,
+    make_embedding_backend,
+    set_embedding_backend,
+)
+from machine_learning.utils import load_pickle
+
+
+@fixture
+def fixtures_path():
+    return Path(os.path.dirname(__file__)) / "classification_fixtures"
+
+
+@fixture
+def hashing_backend():
+    backend = HashedNgramBackend(dimensionality=256)
+    set_embedding_backend(backend)
+    yield backend
+    set_embedding_backend(None)
+
+
+def test_hashed_embeddings_are_normalized_float32(hashing_backend):
+    matrix = hashing_backend.embed_matrix(["uber trip", "UBER  trip", "farmacia pacheco", "", None])
+    assert matrix.dtype == np.float32 and matrix.shape == (5, 256)
+    np.testing.assert_allclose(np.linalg.norm(matrix[:3], axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(matrix[3], matrix[4])
+    # case and repeated spaces do not change the n-grams
+    np.testing.assert_allclose(matrix[0], matrix[1])
+
+
+def test_hashed_embeddings_are_stateless(hashing_backend):
+    texts = ["ifd*restaurante sabor", "pix recebido joao silva"]
+    assert HashedNgramBackend(dimensionality=256).embed(texts) == hashing_backend.embed(texts)
+
+
+def test_similar_descriptions_are_closer(hashing_backend):
+    uber, uber_variant, pharmacy = hashing_backend.embed_matrix(["uber trip sao paulo", "uber trip rio", "farmacia pacheco"])
+    assert uber @ uber_variant > uber @ pharmacy
+
+
+def test_create_embeddings_uses_the_configured_backend(hashing_backend):
+    embeddings = create_embeddings(["uber", "pix"])
+    assert len(embeddings) == 2 and len(embeddings[0]) == 256
+
+
+def test_backend_selection():
+    assert isinstance(make_embedding_backend("hashing"), HashedNgramBackend)
+    assert isinstance(make_embedding_backend("api"), ExternalApiBackend)
+    with raises(ValueError):
+        make_embedding_backend("word2vec")
+
+    set_embedding_backend(None)
+    try:
+        with patch.object(embedding_backends, "EMBEDDING_BACKEND", "hashing"):
+            assert isinstance(get_embedding_backend(), HashedNgramBackend)
+            assert get_embedding_backend() is get_embedding_backend()
+    finally:
+        set_embedding_backend(None)
+
+
+def test_classifier_trained_on_hashed_embeddings(fixtures_path):
+    X_test_raw = load_pickle(fixtures_path / "embeddings_X_test_raw.pkl")
+    y = load_pickle(fixtures_path / "y_test_encoded.pkl")
+    features = HashedNgramBackend().embed_matrix(X_test_raw["Descrição"].tolist())
+
+    predictions = cross_val_predict(LogisticRegression(max_iter=2000, C=10), features, y,
+                                    cv=StratifiedKFold(n_splits=3, shuffle=True, random_state=1))
+    # 21 classes, chance level is below 0.05
+    assert balanced_accuracy_score(y, predictions) > 0.3
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from numpy.linalg import norm
+from pytest import fixture, raises
+from machine_learning.transactions_classification.lib.embedding_matrix import EmbeddingMatrix, attach_embeddings, embedding_columns
+from machine_learning.transactions_classification.lib.google_embedding import embed_and_normalize_embeddings, normalize_embeddings
+
+
+@fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).tolist()
+    vectors[3] = [0.0] * 16
+    return vectors
+
+
+@fixture
+def transactions():
+    return pd.DataFrame({
+        "Data": pd.to_datetime(["2024-01-01"] * 50, utc=True),
+        "Descrição": [f"uber {i}" for i in range(50)],
+        "Valor": np.arange(50, dtype=float),
+    }, index=np.arange(100, 150))
+
+
+def legacy_embed_and_normalize_embeddings(complete_dataset, embeddings):
+    normalized_embeddings = [np.array(arr) / norm(np.array(arr)) for arr in embeddings]
+    embedding_df = pd.DataFrame(normalized_embeddings, columns=[f'embedding_{i}' for i in range(len(normalized_embeddings[0]))])
+    return pd.concat([complete_dataset.reset_index(drop=True), embedding_df], axis=1)
+
+
+def test_matrix_is_contiguous_float32(vectors):
+    matrix = EmbeddingMatrix.from_vectors(vectors)
+    assert matrix.values.dtype == np.float32
+    assert matrix.values.flags["C_CONTIGUOUS"]
+    assert matrix.values.shape == (50, 16) and len(matrix) == 50 and matrix.dimensionality == 16
+
+
+def test_empty_matrix_keeps_its_width():
+    assert EmbeddingMatrix.from_vectors([], dimensionality=8).values.shape == (0, 8)
+
+
+def test_rows_are_normalized_in_place(vectors):
+    matrix = EmbeddingMatrix.from_vectors(vectors)
+    values = matrix.values
+    matrix.normalize()
+    assert matrix.values is values
+    norms = np.linalg.norm(values, axis=1)
+    np.testing.assert_allclose(np.delete(norms, 3), 1.0, rtol=1e-6)
+    assert not values[3].any()
+
+
+def test_attach_does_not_copy_the_embeddings(vectors, transactions):
+    matrix = EmbeddingMatrix.from_vectors(vectors)
+    combined = matrix.attach(transactions)
+    assert list(combined.columns) == ["Data", "Descrição", "Valor"] + embedding_columns(16)
+    assert combined.index.equals(transactions.index)
+    assert any(np.shares_memory(block.values, matrix.values) for block in combined._mgr.blocks)
+
+
+def test_attach_checks_row_count(vectors, transactions):
+    with raises(ValueError):
+        EmbeddingMatrix.from_vectors(vectors[:10]).attach(transactions)
+
+
+def test_matches_legacy_normalization(vectors, transactions):
+    vectors = [vector for i, vector in enumerate(vectors) if i != 3]
+    transactions = transactions.iloc[:49]
+    expected = legacy_embed_and_normalize_embeddings(transactions, vectors)
+    actual = embed_and_normalize_embeddings(transactions, vectors)
+    assert list(actual.columns) == list(expected.columns)
+    np.testing.assert_allclose(actual[embedding_columns(16)].to_numpy(), expected[embedding_columns(16)].to_numpy(), rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(normalize_embeddings(vectors[0]), expected[embedding_columns(16)].iloc[0].to_numpy(), rtol=1e-6)
+    pd.testing.assert_frame_equal(actual[["Descrição", "Valor"]].reset_index(drop=True), expected[["Descrição", "Valor"]])
+
+
+def test_attach_embeddings_can_skip_normalization(vectors, transactions):
+    combined = attach_embeddings(transactions, vectors, normalize=False)
+    np.testing.assert_allclose(combined[embedding_columns(16)].to_numpy(), np.array(vectors, dtype=np.float32))
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy as np
+from pytest import raises
+from kafka import embeddings_worker
+from kafka.embedding_request_pool import EmbeddingRequestPool, set_embedding_pool
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+class RecordingBackend:
+    def __init__(self, fail_on=None):
+        self.requests = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.requests.append(list(texts))
+        if self.fail_on in texts:
+            raise RuntimeError(f"cannot embed {self.fail_on!r}")
+        return [vector(text) for text in texts]
+
+
+JOBS = [["uber", "ifood", "uber"], ["padaria"], ["ifood", "farmacia"], [], ["uber", "cinema", "mercado", "posto"]]
+
+
+def embed_concurrently(embed, jobs):
+    barrier = threading.Barrier(len(jobs))
+
+    def submit(texts):
+        barrier.wait()
+        return embed(texts)
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        return list(executor.map(submit, jobs))
+
+
+def test_jobs_share_one_deduplicated_request():
+    backend = RecordingBackend()
+    pool = EmbeddingRequestPool(backend, max_texts=100, max_wait_ms=200)
+    results = embed_concurrently(pool.embed, JOBS)
+
+    for texts, embeddings in zip(JOBS, results):
+        assert embeddings.dtype == np.float32 and len(embeddings) == len(texts)
+        assert embeddings.tolist() == [vector(text) for text in texts]
+    assert len(backend.requests) < len(JOBS)
+    assert sum(len(request) for request in backend.requests) < sum(len(texts) for texts in JOBS)
+    assert all(len(request) == len(set(request)) for request in backend.requests)
+    stats = pool.stats()
+    assert stats["jobs"] == len(JOBS) and stats["texts"] == 10 and stats["dedupe_ratio"] > 0
+
+
+def test_requests_respect_max_texts():
+    backend = RecordingBackend()
+    pool = EmbeddingRequestPool(backend, max_texts=4, max_wait_ms=100)
+    embed_concurrently(pool.embed, JOBS)
+    # a job larger than max_texts is still sent, on its own
+    assert all(len(request) <= 4 for request in backend.requests)
+
+
+def test_failing_job_is_isolated():
+    backend = RecordingBackend(fail_on="padaria")
+    pool = EmbeddingRequestPool(backend, max_texts=100, max_wait_ms=200)
+    barrier = threading.Barrier(len(JOBS))
+
+    def submit(texts):
+        barrier.wait()
+        try:
+            return pool.embed(texts)
+        except RuntimeError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(JOBS)) as executor:
+        results = list(executor.map(submit, JOBS))
+    assert isinstance(results[1], RuntimeError)
+    assert results[0].tolist() == [vector(text) for text in JOBS[0]]
+
+
+def test_disabled_pool_calls_the_backend_directly():
+    backend = RecordingBackend()
+    pool = EmbeddingRequestPool(backend, max_texts=0)
+    assert pool.embed(["uber", "uber"]).tolist() == [vector("uber")] * 2
+    assert backend.requests == [["uber"]]
+    with raises(RuntimeError):
+        EmbeddingRequestPool(RecordingBackend(fail_on="x"), max_texts=0).embed(["x"])
+
+
+def test_embeddings_worker_pools_concurrent_jobs(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(embeddings_worker, "EMBEDDINGS_WORKER_CONCURRENCY", 4)
+    monkeypatch.setattr(embeddings_worker, "fetch_embeddings_with_retry", backend)
+    set_embedding_pool(EmbeddingRequestPool(lambda texts: embeddings_worker.fetch_embeddings_with_retry(texts),
+                                            max_texts=100, max_wait_ms=200))
+    try:
+        results = embed_concurrently(embeddings_worker.fetch_embeddings, JOBS)
+    finally:
+        set_embedding_pool(None)
+    assert [r.tolist() for r in results] == [[vector(text) for text in texts] for texts in JOBS]
+    assert len(backend.requests) < len(JOBS)
+
+
+def test_slow_request_does_not_block_the_next_batch():
+    started, release = threading.Event(), threading.Event()
+
+    def fetch(texts):
+        if "slow" in texts:
+            started.set()
+            release.wait(timeout=10)
+        return [vector(text) for text in texts]
+
+    pool = EmbeddingRequestPool(fetch, max_texts=100, max_wait_ms=10, max_requests=2)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        slow = executor.submit(pool.embed, ["slow"])
+        assert started.wait(timeout=5)
+        # pooled and answered while the first request is still in flight
+        assert pool.embed(["fast"]).tolist() == [vector("fast")]
+        assert not slow.done()
+        release.set()
+        assert slow.result(timeout=5).tolist() == [vector("slow")]
+    assert pool.stats()["requests"] == 2
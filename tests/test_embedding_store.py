@@ -0,0 +1,123 @@
+from unittest.mock import patch
+import numpy as np
+from pytest import fixture
+from machine_learning.transactions_classification.lib.embedding_store import EmbeddingStore, embedding_key, read_through, deduplicate, dedupe_ratio
+from machine_learning.transactions_classification.lib import external_embedding_api
+
+
+DIMENSIONALITY = 4
+
+
+@fixture
+def store(tmp_path):
+    return EmbeddingStore(tmp_path / "embeddings.sqlite3", max_bytes=1 << 20)
+
+
+def fake_fetch(calls):
+    def fetch(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0, 2.0, 3.0] for text in texts]
+    return fetch
+
+
+def test_key_depends_on_text_model_and_dimensionality():
+    key = embedding_key("uber trip", "model-a", 768)
+    assert key == embedding_key("  uber   trip ", "model-a", 768)
+    assert key != embedding_key("UBER trip", "model-a", 768)
+    assert key != embedding_key("uber trip", "model-b", 768)
+    assert key != embedding_key("uber trip", "model-a", 256)
+
+
+def test_store_round_trip(store):
+    store.put_many(["a", "b"], [[1, 2, 3, 4], [5, 6, 7, 8]], "m", DIMENSIONALITY)
+    a, missing, b = store.get_many(["a", "c", "b"], "m", DIMENSIONALITY)
+    assert a.dtype == np.float32 and a.tolist() == [1, 2, 3, 4]
+    assert b.tolist() == [5, 6, 7, 8]
+    assert missing is None
+    assert (store.stats()["hits"], store.stats()["misses"]) == (2, 1)
+
+
+def test_store_is_shared_between_instances(store):
+    store.put_many(["a"], [[1, 2, 3, 4]], "m", DIMENSIONALITY)
+    other = EmbeddingStore(store.path)
+    assert other.get_many(["a"], "m", DIMENSIONALITY)[0].tolist() == [1, 2, 3, 4]
+
+
+def test_lru_eviction_by_size_budget(tmp_path):
+    store = EmbeddingStore(tmp_path / "embeddings.sqlite3", max_bytes=2 * DIMENSIONALITY * 4, touch_interval=0)
+    with patch("machine_learning.transactions_classification.lib.embedding_store.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+        store.put_many(["a"], [[1, 1, 1, 1]], "m", DIMENSIONALITY)
+        store.put_many(["b"], [[2, 2, 2, 2]], "m", DIMENSIONALITY)
+        store.get_many(["a"], "m", DIMENSIONALITY)
+        store.put_many(["c"], [[3, 3, 3, 3]], "m", DIMENSIONALITY)
+    a, b, c = store.get_many(["a", "b", "c"], "m", DIMENSIONALITY)
+    assert a is not None and b is None and c is not None
+    assert store.stats()["evictions"] == 1
+    assert store.size_bytes() <= store.max_bytes
+
+
+def last_access(store, text):
+    key = embedding_key(text, "m", DIMENSIONALITY)
+    return store._connection().execute("SELECT last_access FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_lookups_refresh_last_access_once_per_interval(tmp_path):
+    store = EmbeddingStore(tmp_path / "embeddings.sqlite3", touch_interval=60)
+    with patch("machine_learning.transactions_classification.lib.embedding_store.time.time", side_effect=[100.0, 130.0, 170.0]):
+        store.put_many(["a"], [[1, 1, 1, 1]], "m", DIMENSIONALITY)
+        store.get_many(["a"], "m", DIMENSIONALITY)
+        assert last_access(store, "a") == 100.0
+        store.get_many(["a"], "m", DIMENSIONALITY)
+        assert last_access(store, "a") == 170.0
+
+
+def test_size_budget_is_checked_every_evict_check_bytes(tmp_path):
+    vector_bytes = DIMENSIONALITY * 4
+    store = EmbeddingStore(tmp_path / "embeddings.sqlite3", max_bytes=vector_bytes, evict_check_bytes=3 * vector_bytes)
+    store.put_many(["a"], [[1, 1, 1, 1]], "m", DIMENSIONALITY)
+    store.put_many(["b"], [[2, 2, 2, 2]], "m", DIMENSIONALITY)
+    assert store.stats()["evictions"] == 0
+    store.put_many(["c"], [[3, 3, 3, 3]], "m", DIMENSIONALITY)
+    assert store.stats()["evictions"] == 2
+    assert store.size_bytes() <= store.max_bytes
+
+
+def test_read_through_fetches_only_missing(store):
+    calls = []
+    first = read_through(["a", "bb"], fake_fetch(calls), store, "m", DIMENSIONALITY)
+    second = read_through(["bb", "ccc", "a"], fake_fetch(calls), store, "m", DIMENSIONALITY)
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert second == [first[1], [3.0, 1.0, 2.0, 3.0], first[0]]
+
+
+def test_create_embeddings_api_reads_through_store(store):
+    calls = []
+    with patch.object(external_embedding_api, "get_embedding_store", return_value=store), \
+         patch.object(external_embedding_api, "request_embeddings_api", side_effect=fake_fetch(calls)):
+        external_embedding_api.create_embeddings_api(["uber", "pix"])
+        external_embedding_api.create_embeddings_api(["pix", "uber"])
+    assert calls == [["uber", "pix"]]
+
+
+def test_deduplicate_normalized_descriptions():
+    unique_texts, inverse = deduplicate(["uber", "pix", " uber ", "pix", "ifd"])
+    assert unique_texts == ["uber", "pix", "ifd"]
+    assert inverse == [0, 1, 0, 1, 2]
+    assert dedupe_ratio(["uber", "pix", " uber ", "pix", "ifd"]) == 0.4
+    assert dedupe_ratio([]) == 0.0
+
+
+def test_read_through_embeds_duplicates_once(store):
+    for backing_store in (store, None):
+        calls = []
+        embeddings = read_through(["a", "bb", "a", "bb", "a"], fake_fetch(calls), backing_store, "m", DIMENSIONALITY)
+        assert calls == [["a", "bb"]]
+        assert embeddings[0] == embeddings[2] == embeddings[4]
+        assert embeddings[1] == embeddings[3]
+
+
+def test_read_through_returns_the_same_values_for_hits_and_misses(store):
+    fetch = lambda texts: [[0.1, 0.2, 0.3, 0.4] for _ in texts]
+    miss = read_through(["a"], fetch, store, "m", DIMENSIONALITY)
+    hit = read_through(["a"], fetch, store, "m", DIMENSIONALITY)
+    assert miss == hit
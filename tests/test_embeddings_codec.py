@@ -0,0 +1,86 @@
+import json
+import struct
+import numpy as np
+from pytest import fixture, raises
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import TransactionsClassifier
+from kafka.classification_worker import classify_transactions
+from kafka.embeddings_codec import MAGIC, decode_embeddings_message, encode_embeddings_message
+from conftest import make_transactions_frame
+
+
+@fixture
+def message():
+    X, _ = make_transactions_frame(40, seed=5)
+    transactions = [
+        {'date': date.isoformat(), 'description': description, 'value': value, 'user': 'ana', 'classification': None}
+        for date, description, value in zip(X['Data'], X['Descrição'], X['Valor'])
+    ]
+    return {'job_id': 'job-1', 'transactions': transactions, 'embeddings': X.filter(like='embedding_').to_numpy().tolist()}
+
+
+def test_float32_round_trip(message):
+    encoded = encode_embeddings_message(message, dtype="float32", message_format="binary")
+    assert encoded.startswith(MAGIC)
+    decoded = decode_embeddings_message(encoded)
+    assert decoded['job_id'] == 'job-1' and decoded['transactions'] == message['transactions']
+    assert decoded['embeddings'].dtype == np.float32 and decoded['embeddings'].shape == (40, 8)
+    np.testing.assert_array_equal(decoded['embeddings'], np.array(message['embeddings'], dtype=np.float32))
+
+
+def test_float16_payload_is_half_the_size(message):
+    float32 = encode_embeddings_message(message, dtype="float32", message_format="binary")
+    float16 = encode_embeddings_message(message, dtype="float16", message_format="binary")
+    assert len(float32) - len(float16) == 40 * 8 * 2
+    decoded = decode_embeddings_message(float16)
+    assert decoded['embeddings'].dtype == np.float16
+    np.testing.assert_allclose(decoded['embeddings'], np.array(message['embeddings']), rtol=1e-3, atol=1e-3)
+
+
+def test_binary_is_smaller_than_json(message):
+    message['embeddings'] = np.random.default_rng(0).normal(size=(40, 768)).tolist()
+    assert len(encode_embeddings_message(message, message_format="binary")) < len(json.dumps(message)) / 3
+
+
+def test_previous_json_format_still_decodes(message):
+    assert decode_embeddings_message(json.dumps(message)) == message
+    assert decode_embeddings_message(json.dumps(message).encode("utf-8")) == message
+    assert decode_embeddings_message(encode_embeddings_message(message, message_format="json")) == message
+
+
+def test_json_format_accepts_arrays(message):
+    array_message = {**message, 'embeddings': np.array(message['embeddings'])}
+    assert json.loads(encode_embeddings_message(array_message, message_format="json")) == message
+
+
+def test_empty_job():
+    decoded = decode_embeddings_message(encode_embeddings_message({'job_id': 'empty', 'transactions': [], 'embeddings': []},
+                                                                  message_format="binary"))
+    assert decoded['transactions'] == [] and decoded['embeddings'].size == 0
+
+
+def test_rejects_unknown_version_and_truncated_payload(message):
+    encoded = encode_embeddings_message(message, message_format="binary")
+    with raises(ValueError):
+        decode_embeddings_message(encoded[:-4])
+    with raises(ValueError):
+        decode_embeddings_message(MAGIC + struct.pack("<B", 99) + encoded[5:])
+    with raises(ValueError):
+        encode_embeddings_message(message, dtype="int8", message_format="binary")
+
+
+def test_classification_of_binary_and_json_messages_match(model_repository, message):
+    classifier = TransactionsClassifier(model_repository)
+    from_json = decode_embeddings_message(json.dumps(message))
+    from_binary = decode_embeddings_message(encode_embeddings_message(message, dtype="float16", message_format="binary"))
+    expected = classify_transactions(from_json['transactions'], from_json['embeddings'], classifier, PredictionCache(max_entries=0))
+    actual = classify_transactions(from_binary['transactions'], from_binary['embeddings'], classifier, PredictionCache(max_entries=0))
+    assert actual == expected
+
+
+def test_classification_of_float32_binary_message(model_repository, message):
+    classifier = TransactionsClassifier(model_repository)
+    decoded = decode_embeddings_message(encode_embeddings_message(message, dtype="float32", message_format="binary"))
+    assert not decoded['embeddings'].flags.writeable
+    expected = classify_transactions(message['transactions'], message['embeddings'], classifier, PredictionCache(max_entries=0))
+    assert classify_transactions(decoded['transactions'], decoded['embeddings'], classifier, PredictionCache(max_entries=0)) == expected
@@ -0,0 +1,124 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from pytest import fixture, raises
+from machine_learning.transactions_classification.lib.external_embedding_api import EmbeddingApiClient
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if isinstance(body, str):
+            server.double_encoded += 1
+            body = json.loads(body)
+        texts = [d['description'] for d in body['descriptions']]
+        with server.lock:
+            server.chunk_sizes.append(len(texts))
+            server.client_ports.add(self.client_address[1])
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        time.sleep(server.delay)
+        if fail:
+            payload, status = b'{"error": "boom"}', 500
+        else:
+            payload = json.dumps({'embeddings': [[float(text.split('-')[1]), float(len(text))] for text in texts]}).encode()
+            status = 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingHandler)
+    server.lock = threading.Lock()
+    server.chunk_sizes, server.client_ports = [], set()
+    server.failures, server.delay, server.double_encoded = 0, 0.0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@fixture
+def texts():
+    return [f"text-{i}" for i in range(1000)]
+
+
+def test_client_preserves_order_across_chunks(stub_server, texts):
+    client = EmbeddingApiClient(stub_server.url, chunk_size=64, max_in_flight=4)
+    embeddings = client.embed(texts)
+    assert [e[0] for e in embeddings] == list(range(len(texts)))
+    assert max(stub_server.chunk_sizes) <= client.max_chunk_size
+    assert sum(stub_server.chunk_sizes) == len(texts)
+    assert stub_server.double_encoded == 0
+
+
+def test_client_reuses_connections(stub_server, texts):
+    client = EmbeddingApiClient(stub_server.url, chunk_size=16, max_chunk_size=16, max_in_flight=2)
+    client.embed(texts)
+    assert len(stub_server.chunk_sizes) == len(texts) // 16 + 1
+    assert len(stub_server.client_ports) <= 2
+
+
+def test_client_grows_chunks_when_fast(stub_server, texts):
+    client = EmbeddingApiClient(stub_server.url, chunk_size=16, max_chunk_size=256, max_in_flight=1, target_latency=5)
+    client.embed(texts)
+    assert client.chunk_size > 16
+    assert stub_server.chunk_sizes[-2] > stub_server.chunk_sizes[0]
+
+
+def test_client_shrinks_chunks_when_slow(stub_server, texts):
+    stub_server.delay = 0.05
+    client = EmbeddingApiClient(stub_server.url, chunk_size=256, min_chunk_size=8, max_in_flight=2, target_latency=0.01)
+    client.embed(texts[:300])
+    assert client.chunk_size < 256
+
+
+def test_client_retries_failed_chunks(stub_server, texts):
+    stub_server.failures = 2
+    client = EmbeddingApiClient(stub_server.url, chunk_size=100, max_in_flight=1, max_retries=3)
+    embeddings = client.embed(texts[:300])
+    assert [e[0] for e in embeddings] == list(range(300))
+    assert client.stats()["errors"] == 2
+
+
+def test_client_backs_off_before_retrying(stub_server, texts):
+    stub_server.failures = 2
+    client = EmbeddingApiClient(stub_server.url, chunk_size=100, max_in_flight=1, max_retries=3, retry_delay=0.1)
+    assert client._backoff(0) == 0
+    assert 0.05 <= client._backoff(1) <= 0.15 and 0.1 <= client._backoff(2) <= 0.3
+    start = time.perf_counter()
+    client.embed(texts[:100])
+    # two halves after the first failure, two quarters after the second
+    assert time.perf_counter() - start >= 2 * 0.05 + 2 * 0.1
+
+
+def test_client_raises_after_max_retries(stub_server, texts):
+    stub_server.failures = 100
+    client = EmbeddingApiClient(stub_server.url, chunk_size=100, max_in_flight=1, max_retries=2)
+    with raises(Exception):
+        client.embed(texts[:10])
+
+
+def test_client_legacy_double_encoded_body(stub_server, texts):
+    client = EmbeddingApiClient(stub_server.url, double_encoded_body=True)
+    assert len(client.embed(texts[:5])) == 5
+    assert stub_server.double_encoded == 1
+
+
+def test_client_empty_input(stub_server):
+    assert EmbeddingApiClient(stub_server.url).embed([]) == []
+    assert stub_server.chunk_sizes == []
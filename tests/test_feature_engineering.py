@@ -0,0 +1,58 @@
+import os
+from pathlib import Path
+import pickle
+import numpy as np
+import pandas as pd
+from pytest import fixture
+from machine_learning.transactions_classification.lib.feature_engineering import add_keyword_hints, KeywordMatcher, KEYWORD_HINT_FEATURES
+from machine_learning.utils import load_joblib, load_pickle
+
+
+@fixture
+def fixtures_path():
+    return Path(os.path.dirname(__file__)) / "classification_fixtures"
+
+
+@fixture
+def preprocessor_path():
+    return Path(os.path.dirname(os.path.dirname(__file__))) / "machine_learning" / "transactions_classification" / "pipelines" / "embedding_classification_preprocessor.pkl"
+
+
+def legacy_add_keyword_hints(complete_dataset):
+    for tag in KEYWORD_HINT_FEATURES:
+        complete_dataset[tag] = complete_dataset['Descrição'].apply(lambda x: 1 if tag in x else 0)
+    return complete_dataset[KEYWORD_HINT_FEATURES]
+
+
+@fixture
+def descriptions():
+    return pd.DataFrame({'Descrição': [
+        "pix recebido", "uber trip", "ifd*restaurante", "pag*conta light", "pg mercado pago",
+        "aplicação cdb", "salário", "supermercado", "", "pagpg", "pixpix uber", "pix recebido",
+        "PIX maiusculo", "aplicacao sem acento",
+    ]})
+
+
+def test_keyword_hints_match_legacy_columns(descriptions):
+    expected = legacy_add_keyword_hints(descriptions.copy())
+    hints = add_keyword_hints(descriptions.copy())
+    assert list(hints.columns) == KEYWORD_HINT_FEATURES
+    assert hints.dtypes.eq(np.uint8).all()
+    assert np.array_equal(hints.to_numpy(), expected.to_numpy())
+
+
+def test_keyword_matcher_overlapping_keywords():
+    matcher = KeywordMatcher(["pagamento", "pag", "game", "amen"])
+    assert matcher.transform(["pagamento", "pag", "xgamex"]).tolist() == [[1, 1, 1, 1], [0, 1, 0, 0], [0, 0, 1, 0]]
+
+
+def test_keyword_hints_keep_index(descriptions):
+    descriptions.index = descriptions.index + 100
+    assert add_keyword_hints(descriptions).index.equals(descriptions.index)
+
+
+def test_pickled_preprocessor_uses_new_keyword_hints(fixtures_path, preprocessor_path):
+    preprocessor = load_joblib(preprocessor_path)
+    X_test_raw = load_pickle(fixtures_path / "embeddings_X_test_raw.pkl")
+    X_test = load_pickle(fixtures_path / "embeddings_X_test_preprocessed.pkl")
+    assert np.allclose(preprocessor.transform(X_test_raw), X_test)
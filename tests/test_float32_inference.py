@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+import numpy as np
+from pytest import fixture
+from sklearn.linear_model import LogisticRegression
+from machine_learning.transactions_classifier import LoadedModel
+from machine_learning.transactions_classification.lib.embedding_matrix import EmbeddingMatrix
+from machine_learning.utils import load_joblib, load_pickle
+
+
+@fixture
+def fixtures_path():
+    return Path(os.path.dirname(__file__)) / "classification_fixtures"
+
+
+@fixture
+def preprocessor_path():
+    return Path(os.path.dirname(os.path.dirname(__file__))) / "machine_learning" / "transactions_classification" / "pipelines" / "embedding_classification_preprocessor.pkl"
+
+
+@fixture
+def fixture_model(fixtures_path, preprocessor_path):
+    X_test = load_pickle(fixtures_path / "embeddings_X_test_preprocessed.pkl")
+    y_pred = load_pickle(fixtures_path / "y_predictions_seed_1.pkl")
+    model = LogisticRegression(max_iter=1000).fit(X_test, y_pred)
+    return LoadedModel(model, load_joblib(preprocessor_path), "fixture")
+
+
+@fixture
+def fixture_inputs(fixtures_path):
+    X_test_raw = load_pickle(fixtures_path / "embeddings_X_test_raw.pkl")
+    embeddings = EmbeddingMatrix.from_vectors(X_test_raw.filter(like="embedding_").to_numpy()).normalize()
+    return X_test_raw[["Data", "Descrição", "Valor"]], embeddings
+
+
+def test_float32_features(fixture_model, fixture_inputs):
+    X, embeddings = fixture_inputs
+    features64 = fixture_model.preprocess_columns(X, embeddings.values)
+    features32 = fixture_model.preprocess_columns(X, embeddings.values, dtype=np.float32)
+    assert features64.dtype == np.float64 and features32.dtype == np.float32
+    assert features32.nbytes * 2 == features64.nbytes
+    np.testing.assert_allclose(features32, features64, rtol=1e-6, atol=1e-6)
+
+
+def test_float32_predictions_identical_on_fixtures(fixture_model, fixture_inputs):
+    X, embeddings = fixture_inputs
+    expected = fixture_model.predict(fixture_model.preprocess(embeddings.attach(X)))
+    actual = fixture_model.predict_columns(X, embeddings.values, dtype=np.float32)
+    assert list(actual) == list(expected)
+
+
+def test_float16_storage_predictions_identical_on_fixtures(fixture_model, fixture_inputs):
+    X, embeddings = fixture_inputs
+    expected = fixture_model.predict_columns(X, embeddings.values, dtype=np.float64)
+    stored = embeddings.astype(np.float16)
+    assert stored.values.nbytes * 2 == embeddings.values.nbytes
+    actual = fixture_model.predict_columns(X, stored.values, dtype=np.float32)
+    assert list(actual) == list(expected)
+
+
+def test_batched_predictions_match_one_batch(fixture_model, fixture_inputs):
+    X, embeddings = fixture_inputs
+    np.testing.assert_array_equal(
+        fixture_model.predict_columns(X, embeddings.values, batch_size=50),
+        fixture_model.predict_columns(X, embeddings.values, batch_size=len(X)))
@@ -0,0 +1,131 @@
+import json
+from pytest import fixture, raises
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import TransactionsClassifier
+from model import Session, BatchJob, JobStatus
+from kafka import claim_check, classification_worker, embeddings_worker, fused_worker
+from kafka.claim_check import FilesystemBlobStore
+from kafka.embeddings_codec import decode_embeddings_message
+from kafka.inflight import consume_concurrently
+from conftest import make_transactions_frame
+
+
+@fixture
+def job():
+    X, _ = make_transactions_frame(30, seed=4)
+    transactions = [
+        {'date': date.isoformat(), 'description': f'{description} {i}', 'value': value, 'user': 'ana', 'classification': None}
+        for i, (date, description, value) in enumerate(zip(X['Data'], X['Descrição'], X['Valor']))
+    ]
+    embeddings = dict(zip([t['description'] for t in transactions], X.filter(like='embedding_').to_numpy().tolist()))
+    session = Session()
+    batch_job = BatchJob(transactions_input=json.dumps(transactions))
+    session.add(batch_job)
+    session.commit()
+    job_id = batch_job.id
+    session.close()
+    yield job_id, transactions, embeddings
+    session = Session()
+    session.query(BatchJob).filter(BatchJob.id == job_id).delete()
+    session.commit()
+    session.close()
+
+
+@fixture(autouse=True)
+def workers(monkeypatch, model_repository, job):
+    _, _, embeddings = job
+    classifier = TransactionsClassifier(model_repository)
+    monkeypatch.setattr(embeddings_worker, "fetch_embeddings_with_retry", lambda descriptions: [embeddings[d] for d in descriptions])
+    monkeypatch.setattr(classification_worker, "get_transactions_classifier", lambda: classifier)
+    monkeypatch.setattr(classification_worker, "get_prediction_cache", lambda model: PredictionCache(max_entries=0))
+
+
+def job_row(job_id):
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    session.expunge_all()
+    session.close()
+    return batch_job
+
+
+def split_topology(message_value):
+    result = embeddings_worker.process_batch_job(message_value)
+    classification_worker.process_classification(decode_embeddings_message(embeddings_worker.encode_embeddings_results(result)))
+
+
+def test_fused_matches_split_topology(job):
+    job_id, transactions, _ = job
+    split_topology({'job_id': job_id, 'transactions': transactions})
+    expected = json.loads(job_row(job_id).transactions_output)
+
+    fused_worker.process_fused_job({'job_id': job_id, 'transactions': transactions})
+    batch_job = job_row(job_id)
+    assert batch_job.status == JobStatus.COMPLETED
+    assert json.loads(batch_job.transactions_output) == expected
+
+
+def test_fused_keeps_embeddings_in_memory(job, monkeypatch):
+    job_id, transactions, _ = job
+    monkeypatch.setattr(embeddings_worker, "encode_embeddings_results", lambda result: 1 / 0)
+    fused_worker.process_fused_job({'job_id': job_id, 'transactions': transactions})
+    assert job_row(job_id).status == JobStatus.COMPLETED
+
+
+def test_fused_embedding_failure_fails_the_job(job, monkeypatch):
+    job_id, transactions, _ = job
+    monkeypatch.setattr(embeddings_worker, "fetch_embeddings_with_retry", lambda descriptions: 1 / 0)
+    with raises(ZeroDivisionError):
+        fused_worker.process_fused_job({'job_id': job_id, 'transactions': transactions})
+    assert job_row(job_id).status == JobStatus.FAILED
+
+
+def test_fused_releases_claim_checked_input(job, monkeypatch, tmp_path):
+    job_id, transactions, _ = job
+    store = FilesystemBlobStore(tmp_path / "blobs")
+    claim_check.set_blob_store(store)
+    try:
+        reference = claim_check.store_transactions(job_id, transactions)
+        fused_worker.process_fused_job({'job_id': job_id, 'transactions_ref': reference})
+        assert len(json.loads(job_row(job_id).transactions_output)) == len(transactions)
+        assert store.delete_job(job_id) == 0
+    finally:
+        claim_check.set_blob_store(None)
+
+
+def test_fused_consumer_loop(job):
+    job_id, transactions, _ = job
+
+    class Message:
+        def topic(self):
+            return "batch-jobs"
+
+        def partition(self):
+            return 0
+
+        def offset(self):
+            return 7
+
+        def key(self):
+            return job_id.encode("utf8")
+
+        def value(self):
+            return json.dumps({'job_id': job_id, 'transactions': transactions}).encode("utf8")
+
+        def error(self):
+            return None
+
+    class Consumer:
+        messages = [Message()]
+        stored = []
+
+        def poll(self, timeout=None):
+            return self.messages.pop() if self.messages else None
+
+        def store_offsets(self, message=None):
+            self.stored.append(message.offset())
+
+    consumer = Consumer()
+    consume_concurrently(consumer, fused_worker.embed_batch_job_message, fused_worker.classify_embedded_job,
+                         max_in_flight=2, poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    assert consumer.stored == [7]
+    assert job_row(job_id).status == JobStatus.COMPLETED
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+import threading
+import time
+from pytest import fixture, raises
+from machine_learning.transactions_classification.lib import google_embedding
+from machine_learning.transactions_classification.lib.google_embedding import GeminiBatchEmbedder, TokenBucket
+
+
+class FakeModels:
+    def __init__(self, delay=0.0, fail_on=None, delay_of=None):
+        self.delay = delay
+        self.delay_of = delay_of or {}
+        self.fail_on = set(fail_on or [])
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def embed_content(self, model, contents, config):
+        with self.lock:
+            self.calls.append(list(contents))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay_of.get(contents[0], self.delay))
+            if contents[0] in self.fail_on:
+                raise RuntimeError("quota exceeded")
+            return SimpleNamespace(embeddings=[SimpleNamespace(values=[float(text.split('-')[1]), 0.5]) for text in contents])
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+
+
+@fixture
+def texts():
+    return [f"text-{i}" for i in range(450)]
+
+
+def test_embedder_preserves_order_with_concurrent_batches(texts):
+    client = FakeClient(delay=0.02)
+    embedder = GeminiBatchEmbedder(client=client, batch_size=50, max_in_flight=4, requests_per_minute=60000, show_progress=False)
+    embeddings = embedder.embed(texts)
+    assert [e[0] for e in embeddings] == list(range(len(texts)))
+    assert len(client.models.calls) == 9
+    assert client.models.max_in_flight > 1
+
+
+def test_embedder_caps_batch_size_at_api_limit(texts):
+    client = FakeClient()
+    GeminiBatchEmbedder(client=client, batch_size=500, requests_per_minute=60000, show_progress=False).embed(texts)
+    assert max(len(call) for call in client.models.calls) == 100
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_embedder_resumes_from_checkpoints(texts, tmp_path):
+    failing = FakeClient(fail_on={"text-300"})
+    embedder = GeminiBatchEmbedder(client=failing, batch_size=50, max_in_flight=1, max_retries=1,
+                                   requests_per_minute=60000, checkpoint_dir=tmp_path, show_progress=False)
+    with raises(RuntimeError):
+        embedder.embed(texts)
+    completed = {call[0] for call in failing.models.calls} - {"text-300"}
+
+    client = FakeClient()
+    embedder = GeminiBatchEmbedder(client=client, batch_size=50, max_in_flight=2,
+                                   requests_per_minute=60000, checkpoint_dir=tmp_path, show_progress=False)
+    embeddings = embedder.embed(texts)
+    assert [e[0] for e in embeddings] == list(range(len(texts)))
+    assert not completed & {call[0] for call in client.models.calls}
+    assert len(client.models.calls) == 9 - len(completed)
+    # checkpoints are removed once the run completes
+    assert not any(tmp_path.iterdir())
+
+
+def test_embedder_checkpoints_batches_in_flight_when_one_fails(texts, tmp_path):
+    # text-0 fails first, the batches already in flight complete after it
+    failing = FakeClient(delay=0.05, fail_on={"text-0"}, delay_of={"text-0": 0.0})
+    embedder = GeminiBatchEmbedder(client=failing, batch_size=50, max_in_flight=4, max_retries=1,
+                                   requests_per_minute=60000, checkpoint_dir=tmp_path, show_progress=False)
+    with raises(RuntimeError):
+        embedder.embed(texts)
+    assert len(failing.models.calls) == 4
+
+    client = FakeClient()
+    GeminiBatchEmbedder(client=client, batch_size=50, max_in_flight=4, requests_per_minute=60000,
+                        checkpoint_dir=tmp_path, show_progress=False).embed(texts)
+    assert "text-0" in {call[0] for call in client.models.calls}
+    assert not {"text-50", "text-100", "text-150"} & {call[0] for call in client.models.calls}
+
+
+def test_create_embeddings_batch_with_injected_client(texts):
+    client = FakeClient()
+    with patch.object(google_embedding, "get_embedding_store", return_value=None):
+        embeddings = google_embedding.create_embeddings_batch(texts[:120] + texts[:10], client=client)
+    assert len(embeddings) == 130
+    assert sum(len(call) for call in client.models.calls) == 120
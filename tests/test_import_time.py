@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import pytest
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ["torch", "transformers", "datasets", "google.genai"]
+
+
+def loaded_heavy_modules(module: str) -> list:
+    code = f"import sys; import {module}; print('HEAVY=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    heavy = [line for line in completed.stdout.splitlines() if line.startswith("HEAVY=")][-1]
+    return [m for m in heavy[len("HEAVY="):].split(",") if m]
+
+
+@pytest.mark.parametrize("module", ["app", "kafka.embeddings_worker", "kafka.classification_worker"])
+def test_entry_points_do_not_import_deep_learning_stack(module):
+    assert loaded_heavy_modules(module) == []
+
+
+def test_lib_submodules_are_loaded_on_access():
+    code = ("import sys; import machine_learning.transactions_classification.lib as lib; "
+            "before = 'torch' in sys.modules; lib.feature_engineering; print(before, 'torch' in sys.modules)")
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.split() == ["False", "False"]
+
+
+def test_google_embedding_import_does_not_create_client():
+    code = ("import os; os.environ.pop('GEMINI_API_KEY', None); "
+            "import machine_learning.transactions_classification.lib.google_embedding as g; print(g._client is None)")
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip().splitlines()[-1] == "True"
@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+from confluent_kafka import KafkaError, KafkaException
+from kafka import embeddings_worker
+from kafka.embeddings_codec import decode_embeddings_message
+from kafka.inflight import OffsetTracker, consume_concurrently
+
+
+class FakeMessage:
+    def __init__(self, partition, offset, value, topic="batch-jobs"):
+        self._topic, self._partition, self._offset, self._value = topic, partition, offset, value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return f"job-{self._partition}-{self._offset}".encode("utf8")
+
+    def value(self):
+        return self._value
+
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    """
+    Hands out queued messages and records stored offsets.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.stored = []
+
+    def poll(self, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    def store_offsets(self, message=None, offsets=None):
+        self.stored.append((message.partition(), message.offset()))
+
+
+def make_messages(n_partitions, per_partition, value=b"{}"):
+    return [FakeMessage(p, o, value) for o in range(per_partition) for p in range(n_partitions)]
+
+
+def test_offset_tracker_only_advances_past_completed_prefix():
+    tracker = OffsetTracker()
+    messages = [FakeMessage(0, offset, b"") for offset in range(4)] + [FakeMessage(1, 0, b"")]
+    for message in messages:
+        tracker.track(message)
+    assert tracker.complete(messages[2]) is None
+    assert tracker.complete(messages[1]) is None
+    assert tracker.complete(messages[4]) is messages[4]
+    assert tracker.complete(messages[0]) is messages[2]
+    assert tracker.complete(messages[3]) is messages[3]
+    assert len(tracker) == 0
+
+
+def test_slow_messages_do_not_block_and_offsets_stay_ordered():
+    messages = make_messages(2, 6)
+    consumer = FakeConsumer(messages)
+    completed = set()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handle(msg):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        # the first message of each partition is the slowest
+        time.sleep(0.2 if msg.offset() == 0 else 0.01)
+        with lock:
+            active[0] -= 1
+        return msg.offset()
+
+    def on_result(msg, result):
+        completed.add((msg.partition(), msg.offset()))
+
+    original_store = consumer.store_offsets
+
+    def store_offsets(message=None, offsets=None):
+        # never past a message that is not done yet
+        assert all((message.partition(), offset) in completed for offset in range(message.offset() + 1))
+        original_store(message=message)
+    consumer.store_offsets = store_offsets
+
+    order = []
+    consume_concurrently(consumer, handle, lambda msg, result: (on_result(msg, result), order.append(result)),
+                         max_in_flight=4, poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    assert len(completed) == len(messages)
+    assert peak[0] == 4
+    assert order.index(0) > 0  # fast messages finished before the slow ones
+    for partition in range(2):
+        stored = [offset for p, offset in consumer.stored if p == partition]
+        assert stored == sorted(stored) and stored[-1] == 5
+
+
+def test_failed_messages_are_committed():
+    consumer = FakeConsumer(make_messages(1, 3))
+    results = []
+
+    def handle(msg):
+        if msg.offset() == 1:
+            raise RuntimeError("embedding API down")
+        return msg.offset()
+
+    consume_concurrently(consumer, handle, lambda msg, result: results.append(result), max_in_flight=2,
+                         poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    assert sorted(results) == [0, 2]
+    assert consumer.stored[-1] == (0, 2)
+
+
+def test_embeddings_worker_handles_messages_concurrently(monkeypatch):
+    monkeypatch.setattr(embeddings_worker, "update_job_status", lambda *args, **kwargs: None)
+    monkeypatch.setattr(embeddings_worker, "fetch_embeddings_with_retry",
+                        lambda descriptions: (time.sleep(0.05), [[float(len(d)), 1.0] for d in descriptions])[1])
+    value = json.dumps({'job_id': 'job', 'transactions': [{'description': 'uber'}, {'description': 'ifood'}]}).encode()
+    consumer = FakeConsumer(make_messages(2, 4, value))
+    produced = []
+
+    class Producer:
+        def produce(self, topic, key, value):
+            produced.append((key, decode_embeddings_message(value)))
+
+    start = time.perf_counter()
+    consume_concurrently(consumer, embeddings_worker.handle_batch_job_message,
+                         embeddings_worker.embeddings_results_publisher(Producer()), max_in_flight=8,
+                         poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    assert time.perf_counter() - start < 8 * 0.05
+    assert sorted(key for key, _ in produced) == sorted(f"job-{p}-{o}" for p in range(2) for o in range(4))
+    assert produced[0][1]['embeddings'].tolist() == [[4.0, 1.0], [5.0, 1.0]]
+
+
+class TopicPartition:
+    def __init__(self, topic, partition):
+        self.topic, self.partition = topic, partition
+
+
+def test_revoked_partitions_are_dropped_and_store_errors_skipped():
+    # partition 0 is revoked while its messages are in flight
+    consumer = FakeConsumer(make_messages(2, 2))
+    revoked = threading.Event()
+
+    def subscribe(topics, on_assign=None, on_revoke=None, on_lost=None):
+        original_poll = consumer.poll
+
+        def poll(timeout=None):
+            if revoked.is_set() and not consumer.revoked:
+                consumer.revoked = True
+                on_revoke(consumer, [TopicPartition("batch-jobs", 0)])
+            return original_poll(timeout)
+        consumer.poll = poll
+    consumer.revoked = False
+    consumer.subscribe = subscribe
+
+    def store_offsets(message=None, offsets=None):
+        if message.partition() == 0:
+            raise KafkaException(KafkaError(KafkaError._STATE))
+        consumer.stored.append((message.partition(), message.offset()))
+    consumer.store_offsets = store_offsets
+
+    def handle(msg):
+        if msg.partition() == 0:
+            revoked.wait(5)
+            time.sleep(0.05)
+        return msg.offset()
+
+    results = []
+    consume_concurrently(consumer, handle, lambda msg, result: (results.append(result), revoked.set()),
+                         max_in_flight=4, poll_timeout=0.01,
+                         should_stop=lambda: not consumer.messages and consumer.revoked, topics=["batch-jobs"])
+    assert consumer.revoked and len(results) == 4
+    assert consumer.stored == [(1, 0), (1, 1)]
+
+
+def test_store_offsets_errors_do_not_stop_the_loop():
+    consumer = FakeConsumer(make_messages(1, 3))
+
+    def store_offsets(message=None, offsets=None):
+        raise KafkaException(KafkaError(KafkaError._UNKNOWN_PARTITION))
+    consumer.store_offsets = store_offsets
+    results = []
+    consume_concurrently(consumer, lambda msg: msg.offset(), lambda msg, result: results.append(result),
+                         max_in_flight=2, poll_timeout=0.01, should_stop=lambda: not consumer.messages)
+    assert sorted(results) == [0, 1, 2]
+
+
+def test_offset_tracker_ignores_dropped_partitions():
+    tracker = OffsetTracker()
+    old, other = FakeMessage(0, 0, b""), FakeMessage(1, 0, b"")
+    tracker.track(old)
+    tracker.track(other)
+    assert tracker.drop([("batch-jobs", 0)]) == 1
+    assert tracker.complete(old) is None
+    # the partition assigned again: the old in-flight message does not complete the new one
+    new = FakeMessage(0, 0, b"")
+    tracker.track(new)
+    assert tracker.complete(old) is None
+    assert tracker.complete(new) is new
+    assert tracker.complete(other) is other
@@ -0,0 +1,187 @@
+import json
+import random
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+from pytest import fixture, raises
+from config import app
+from machine_learning.prediction_cache import PredictionCache
+from machine_learning.transactions_classifier import TransactionsClassifier
+from model import Session, BatchJob, BatchJobShard, JobStatus
+from kafka import claim_check, job_shards, classification_worker, embeddings_worker
+from kafka.claim_check import FilesystemBlobStore
+from kafka.embeddings_codec import decode_embeddings_message
+from kafka.job_shards import split_transactions, complete_shard
+from conftest import make_transactions_frame
+
+
+@fixture
+def job():
+    X, _ = make_transactions_frame(50, seed=11)
+    transactions = [
+        {'date': date.isoformat(), 'description': f'{description} {i}', 'value': value, 'user': 'ana', 'classification': None}
+        for i, (date, description, value) in enumerate(zip(X['Data'], X['Descrição'], X['Valor']))
+    ]
+    embeddings = dict(zip([t['description'] for t in transactions], X.filter(like='embedding_').to_numpy().tolist()))
+    return transactions, embeddings
+
+
+@fixture
+def workers(monkeypatch, model_repository, job):
+    _, embeddings = job
+    classifier = TransactionsClassifier(model_repository)
+    monkeypatch.setattr(embeddings_worker, "fetch_embeddings_with_retry", lambda descriptions: [embeddings[d] for d in descriptions])
+    monkeypatch.setattr(classification_worker, "get_transactions_classifier", lambda: classifier)
+    monkeypatch.setattr(classification_worker, "get_prediction_cache", lambda model: PredictionCache(max_entries=0))
+    monkeypatch.setattr(job_shards, "JOB_SHARD_SIZE", 15)
+    return classifier
+
+
+def submit(transactions):
+    """
+    POST the job and return its id and the published batch-jobs messages.
+    """
+    with patch("apis.batch_classifier.publish_batch_job") as publish, app.test_client() as client:
+        response = client.post('/batch-classify-async', json={"transactions": transactions})
+    assert response.status_code == 202
+    job_id = response.get_json()['jobId']
+    return job_id, [{'job_id': args[0], **kwargs} for args, kwargs in publish.call_args_list]
+
+
+def run_shard(message):
+    result = embeddings_worker.process_batch_job(message)
+    classification_worker.process_classification(decode_embeddings_message(embeddings_worker.encode_embeddings_results(result)))
+
+
+def job_row(job_id):
+    session = Session()
+    batch_job = session.query(BatchJob).filter(BatchJob.id == job_id).first()
+    session.expunge_all()
+    session.close()
+    return batch_job
+
+
+def shard_rows(job_id):
+    session = Session()
+    count = session.query(BatchJobShard).filter(BatchJobShard.job_id == job_id).count()
+    session.close()
+    return count
+
+
+def test_split_transactions():
+    assert split_transactions(list(range(10)), 4) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert split_transactions(list(range(10)), 10) == [list(range(10))]
+    assert split_transactions(list(range(10)), 0) == [list(range(10))]
+    assert split_transactions([], 4) == [[]]
+
+
+def test_small_jobs_are_not_sharded(workers, job):
+    transactions, _ = job
+    job_id, messages = submit(transactions[:10])
+    assert len(messages) == 1 and 'shard' not in messages[0]
+    run_shard(messages[0])
+    assert job_row(job_id).status == JobStatus.COMPLETED
+
+
+def test_shards_assemble_in_order(workers, job):
+    transactions, embeddings = job
+    job_id, messages = submit(transactions)
+    assert [(m['shard'], m['shard_count'], len(m['transactions'])) for m in messages] == [(0, 4, 15), (1, 4, 15), (2, 4, 15), (3, 4, 5)]
+
+    # shards complete in any order, on any worker
+    random.Random(0).shuffle(messages)
+    for i, message in enumerate(messages):
+        run_shard(message)
+        status = job_row(job_id).status
+        assert status == (JobStatus.COMPLETED if i == len(messages) - 1 else JobStatus.PROCESSING)
+
+    batch_job = job_row(job_id)
+    output = classification_worker.json.loads(batch_job.transactions_output)
+    expected = classification_worker.classify_transactions(
+        transactions, [embeddings[t['description']] for t in transactions], workers, PredictionCache(max_entries=0))
+    assert [(t['description'], t['classification']) for t in output] == \
+        [(t['description'], t['classification']) for t in expected]
+    assert shard_rows(job_id) == 0
+
+
+def test_redelivered_shard_is_counted_once(workers, job):
+    transactions, _ = job
+    job_id, messages = submit(transactions)
+    for message in [messages[0], messages[0], messages[1], messages[2]]:
+        run_shard(message)
+    assert job_row(job_id).status == JobStatus.PROCESSING
+    run_shard(messages[3])
+    assert len(classification_worker.json.loads(job_row(job_id).transactions_output)) == len(transactions)
+
+
+def test_failed_shard_fails_the_job(workers, job, monkeypatch):
+    transactions, _ = job
+    job_id, messages = submit(transactions)
+    run_shard(messages[0])
+    with monkeypatch.context() as m:
+        m.setattr(embeddings_worker, "fetch_embeddings_with_retry", lambda descriptions: 1 / 0)
+        with raises(ZeroDivisionError):
+            run_shard(messages[1])
+    for message in messages[2:]:
+        run_shard(message)
+    batch_job = job_row(job_id)
+    assert batch_job.status == JobStatus.FAILED and batch_job.transactions_output is None
+    assert complete_shard(job_id, 1, 4, []) is None
+
+
+def test_claim_checked_shards(workers, job, monkeypatch, tmp_path):
+    transactions, _ = job
+    store = FilesystemBlobStore(tmp_path / "blobs")
+    claim_check.set_blob_store(store)
+    monkeypatch.setattr(claim_check, "CLAIM_CHECK_ENABLED", True)
+    try:
+        job_id, messages = submit(transactions)
+        assert [m['transactions_ref'] for m in messages] == [f"claim-check:{job_id}/transactions-{i}" for i in range(4)]
+        assert claim_check.is_reference(job_row(job_id).transactions_input)
+        for message in messages:
+            run_shard(message)
+        assert len(classification_worker.json.loads(job_row(job_id).transactions_output)) == len(transactions)
+        # the blobs are released once the last shard lands
+        assert store.delete_job(job_id) == 0
+    finally:
+        claim_check.set_blob_store(None)
+
+
+def test_final_shard_landing_twice_keeps_the_output(workers, job):
+    transactions, _ = job
+    job_id, messages = submit(transactions)
+    for message in messages:
+        run_shard(message)
+    output = job_row(job_id).transactions_output
+    assert len(classification_worker.json.loads(output)) == len(transactions)
+
+    # the last shard redelivered, or landing on a second worker at the same time
+    last = messages[-1]
+    assert complete_shard(job_id, last['shard'], last['shard_count'], last['transactions']) is None
+    batch_job = job_row(job_id)
+    assert batch_job.status == JobStatus.COMPLETED and batch_job.transactions_output == output
+    assert shard_rows(job_id) == 0
+
+
+def test_concurrent_assembly_writes_the_output_once(workers, job, monkeypatch):
+    transactions, _ = job
+    job_id, messages = submit(transactions)
+    for message in messages[:3]:
+        run_shard(message)
+    last = messages[3]
+
+    def loads(value, assembled=[]):
+        if not assembled:
+            assembled.append(True)
+            # the other worker lands the last shard between this worker's read of the shards and its update
+            with monkeypatch.context() as m:
+                m.setattr(job_shards, "json", json)
+                run_shard(last)
+        return json.loads(value)
+
+    monkeypatch.setattr(job_shards, "json", SimpleNamespace(dumps=json.dumps, loads=loads))
+    assert complete_shard(job_id, last['shard'], last['shard_count'], []) is None
+    batch_job = job_row(job_id)
+    assert batch_job.status == JobStatus.COMPLETED
+    assert len(json.loads(batch_job.transactions_output)) == len(transactions)
+    assert shard_rows(job_id) == 0
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy as np
+from pytest import fixture, raises
+from machine_learning.micro_batcher import MicroBatcher, default_max_wait_ms
+from machine_learning.transactions_classifier import TransactionsClassifier
+from conftest import make_transactions_frame
+
+
+@fixture
+def classifier(model_repository):
+    return TransactionsClassifier(model_repository)
+
+
+@fixture
+def requests_frames():
+    return [make_transactions_frame(n, seed=n)[0] for n in (1, 3, 5, 2, 7, 4, 6, 8)]
+
+
+def test_micro_batcher_matches_direct_predictions(classifier, requests_frames):
+    batcher = MicroBatcher(classifier, max_batch_size=64, max_wait_ms=20)
+    with ThreadPoolExecutor(max_workers=len(requests_frames)) as executor:
+        results = list(executor.map(batcher.predict, requests_frames))
+
+    for X, (predictions, version) in zip(requests_frames, results):
+        assert np.array_equal(predictions, classifier.predict(classifier.preprocess(X)))
+        assert version == classifier.version
+
+
+def test_micro_batcher_coalesces_concurrent_requests(classifier, requests_frames):
+    batcher = MicroBatcher(classifier, max_batch_size=1000, max_wait_ms=200)
+    barrier = threading.Barrier(len(requests_frames))
+
+    def submit(X):
+        barrier.wait()
+        return batcher.predict(X)
+
+    with ThreadPoolExecutor(max_workers=len(requests_frames)) as executor:
+        list(executor.map(submit, requests_frames))
+
+    stats = batcher.stats()
+    assert stats["requests"] == len(requests_frames)
+    assert stats["rows"] == sum(len(X) for X in requests_frames)
+    assert stats["batches"] < len(requests_frames)
+    assert stats["max_queue_depth"] >= 1
+
+
+def test_micro_batcher_respects_max_batch_size(classifier, requests_frames):
+    batcher = MicroBatcher(classifier, max_batch_size=8, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=len(requests_frames)) as executor:
+        list(executor.map(batcher.predict, requests_frames))
+    # every batch holds at most 8 rows, so 36 rows need at least 5 batches
+    assert batcher.stats()["batches"] >= 5
+
+
+def test_micro_batcher_isolates_failing_request(classifier):
+    batcher = MicroBatcher(classifier, max_batch_size=1000, max_wait_ms=100)
+    good = make_transactions_frame(4, seed=1)[0]
+    bad = good.drop(columns=["embedding_0"])
+    barrier = threading.Barrier(2)
+
+    def submit(X):
+        barrier.wait()
+        return batcher.predict(X)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        good_future = executor.submit(submit, good)
+        bad_future = executor.submit(submit, bad)
+        predictions, _ = good_future.result()
+        with raises(Exception):
+            bad_future.result()
+    assert len(predictions) == 4
+
+
+def test_micro_batcher_disabled_runs_inline(classifier):
+    batcher = MicroBatcher(classifier, max_wait_ms=0)
+    X = make_transactions_frame(5)[0]
+    predictions, version = batcher.predict(X)
+    assert len(predictions) == 5 and version == classifier.version
+    assert batcher.stats()["batches"] == 0
+
+
+def test_micro_batching_is_off_with_sync_workers(monkeypatch):
+    monkeypatch.setenv("MICRO_BATCH_MAX_WAIT_MS", "5")
+    monkeypatch.delenv("GUNICORN_WORKER_CLASS", raising=False)
+    monkeypatch.delenv("GUNICORN_THREADS", raising=False)
+    assert default_max_wait_ms() == 0
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "gthread")
+    assert default_max_wait_ms() == 5
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "sync")
+    monkeypatch.setenv("GUNICORN_THREADS", "4")
+    assert default_max_wait_ms() == 5
+
+
+def test_micro_batcher_predicts_directly_when_its_thread_died(classifier):
+    batcher = MicroBatcher(classifier, max_wait_ms=20, timeout=5)
+    batcher._run = lambda: None
+    X = make_transactions_frame(5)[0]
+    predictions, version = batcher.predict(X)
+    assert np.array_equal(predictions, classifier.predict(classifier.preprocess(X)))
+    assert version == classifier.version
+
+
+def test_micro_batcher_times_out(classifier):
+    stuck = threading.Event()
+    batcher = MicroBatcher(classifier, max_wait_ms=20, timeout=0.2)
+    batcher._run = lambda: stuck.wait(10)
+    try:
+        with raises(TimeoutError):
+            batcher.predict(make_transactions_frame(5)[0])
+    finally:
+        stuck.set()
@@ -0,0 +1,129 @@
+import pickle
+import threading
+import numpy as np
+from pytest import fixture
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.preprocessing import LabelEncoder
+from machine_learning.transactions_classifier import TransactionsClassifier
+from machine_learning.model_watcher import ModelWatcher, FixtureValidator
+from conftest import make_transactions_frame, write_model_repository
+
+
+@fixture
+def classifier(model_repository):
+    return TransactionsClassifier(model_repository)
+
+
+@fixture
+def X():
+    return make_transactions_frame(30, seed=11)[0]
+
+
+def test_model_is_versioned(classifier):
+    assert classifier.is_loaded
+    assert classifier.version is not None and len(classifier.version) == 12
+
+
+def test_reload_without_changes_keeps_version(classifier):
+    version = classifier.version
+    assert classifier.reload() is False
+    assert classifier.version == version
+
+
+def test_reload_swaps_new_artifacts(classifier, model_repository):
+    version = classifier.version
+    write_model_repository(model_repository.parent, seed=21)
+    assert classifier.reload() is True
+    assert classifier.version != version
+
+
+def test_reload_rejected_by_validator_keeps_active_model(classifier, model_repository):
+    version = classifier.version
+    write_model_repository(model_repository.parent, seed=21)
+    assert classifier.reload(validator=lambda candidate: False) is False
+    assert classifier.version == version
+
+
+def test_swap_listeners_are_notified(classifier, model_repository):
+    swapped = []
+    classifier.add_swap_listener(lambda loaded: swapped.append(loaded.version))
+    write_model_repository(model_repository.parent, seed=21)
+    classifier.reload()
+    assert swapped == [classifier.version]
+
+
+def test_swap_during_predict_does_not_affect_in_flight_call(classifier, model_repository, X):
+    pinned = classifier.snapshot()
+    expected = pinned.predict(pinned.preprocess(X))
+
+    started, release = threading.Event(), threading.Event()
+    original_predict = pinned.model.predict
+
+    def blocking_predict(X_preprocessed):
+        started.set()
+        release.wait(5)
+        return original_predict(X_preprocessed)
+
+    pinned.model.predict = blocking_predict
+    result = {}
+
+    def in_flight():
+        snapshot = classifier.snapshot()
+        result["version"] = snapshot.version
+        result["prediction"] = snapshot.predict(snapshot.preprocess(X))
+
+    thread = threading.Thread(target=in_flight)
+    thread.start()
+    assert started.wait(5)
+
+    # swap while the prediction is blocked inside model.predict
+    write_model_repository(model_repository.parent, seed=21)
+    assert classifier.reload() is True
+    assert classifier.version != pinned.version
+    release.set()
+    thread.join(5)
+
+    assert result["version"] == pinned.version
+    assert np.array_equal(result["prediction"], expected)
+
+
+def test_watcher_detects_changed_artifacts(classifier, model_repository):
+    watcher = ModelWatcher(classifier, interval=60)
+    assert watcher.check() is False
+    version = classifier.version
+    write_model_repository(model_repository.parent, seed=21)
+    assert watcher.check() is True
+    assert classifier.version != version
+
+
+def test_fixture_validator(classifier, tmp_path):
+    X_test, labels = make_transactions_frame(80, seed=5)
+    y_encoder = LabelEncoder().fit(labels)
+    for name, obj in [("embeddings_X_test_raw.pkl", X_test),
+                      ("y_test_encoded.pkl", y_encoder.transform(labels)),
+                      ("y_encoder.pkl", y_encoder),
+                      ("balanced_accuracy_score_seed_1.pkl", 0.5)]:
+        with open(tmp_path / name, 'wb') as f:
+            pickle.dump(obj, f)
+
+    assert FixtureValidator(tmp_path)(classifier.snapshot()) is True
+    assert FixtureValidator(tmp_path, min_balanced_accuracy=1.01)(classifier.snapshot()) is False
+
+
+def test_fixture_validator_margin_and_global_rng(classifier, tmp_path):
+    X_test, labels = make_transactions_frame(80, seed=5)
+    y_encoder = LabelEncoder().fit(labels)
+    snapshot = classifier.snapshot()
+    score = balanced_accuracy_score(y_encoder.transform(labels), y_encoder.transform(snapshot.predict(snapshot.preprocess(X_test))))
+    for name, obj in [("embeddings_X_test_raw.pkl", X_test),
+                      ("y_test_encoded.pkl", y_encoder.transform(labels)),
+                      ("y_encoder.pkl", y_encoder),
+                      ("balanced_accuracy_score_seed_1.pkl", score + 0.005)]:
+        with open(tmp_path / name, 'wb') as f:
+            pickle.dump(obj, f)
+
+    state = np.random.get_state()
+    assert FixtureValidator(tmp_path, margin=0.01)(snapshot) is True
+    assert FixtureValidator(tmp_path, margin=0)(snapshot) is False
+    # the watcher thread leaves the process-wide RNG alone
+    assert all(np.array_equal(a, b) for a, b in zip(state, np.random.get_state()))
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import json
+import numpy as np
+from pytest import fixture
+from machine_learning import transactions_classifier
+from machine_learning.model_registry import ModelRegistry, TRANSACTIONS_CLASSIFIER
+from machine_learning.transactions_classifier import TransactionsClassifier
+from conftest import make_transactions_frame, EMBEDDING_SIZE
+
+
+@fixture
+def registry(model_repository):
+    return ModelRegistry({TRANSACTIONS_CLASSIFIER: lambda: TransactionsClassifier(model_repository)})
+
+
+def test_registry_returns_shared_instance(registry):
+    assert registry.get() is registry.get()
+
+
+def test_registry_deserializes_artifacts_once(registry):
+    with patch.object(transactions_classifier, "load_pickle", wraps=transactions_classifier.load_pickle) as load_pickle:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(executor.map(lambda _: registry.get(), range(32)))
+    assert load_pickle.call_count == 1
+    assert all(model is models[0] for model in models)
+
+
+def test_registry_exposes_load_stats(registry):
+    registry.warm_up()
+    stats = registry.stats()[TRANSACTIONS_CLASSIFIER]
+    assert stats["is_loaded"] is True
+    assert stats["load_time_seconds"] > 0
+    assert stats["artifact_bytes"] > 0
+
+
+def test_registry_unknown_model(registry):
+    try:
+        registry.get("unknown")
+        assert False, "Unknown model should raise"
+    except KeyError:
+        pass
+
+
+def test_shared_model_predicts_concurrently(registry):
+    model = registry.get()
+    X, _ = make_transactions_frame(50, seed=3)
+    expected = model.predict(model.preprocess(X))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: model.predict(model.preprocess(X)), range(8)))
+    assert all(np.array_equal(result, expected) for result in results)
+
+
+def test_batch_classifier_endpoint_uses_registry(registry):
+    from app import app
+    transactions = [
+        {"date": "2024-01-15T10:30:00", "description": "uber trip", "value": 25.0, "user": "test_user", "classification": None},
+        {"date": "2024-01-16T10:30:00", "description": "salário empresa", "value": 5000.0, "user": "test_user", "classification": None},
+    ]
+    embeddings = np.random.default_rng(0).normal(size=(2, EMBEDDING_SIZE)).tolist()
+    app.config['TESTING'] = True
+    with patch("apis.batch_classifier.create_embeddings", return_value=embeddings), \
+         patch("apis.batch_classifier.get_transactions_classifier", registry.get):
+        with app.test_client() as client:
+            response = client.post('/batchclassifier', data=json.dumps({"transactions": transactions}), content_type='application/json')
+    assert response.status_code == 200
+    assert all(t["classification"] for t in json.loads(response.data)["transactions"])
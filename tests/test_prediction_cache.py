@@ -0,0 +1,88 @@
+from unittest.mock import patch
+from pytest import fixture
+from machine_learning.prediction_cache import PredictionCache, get_prediction_cache, prediction_cache
+from machine_learning.transactions_classifier import TransactionsClassifier
+from conftest import make_transactions_frame, write_model_repository
+
+
+@fixture
+def classifier(model_repository):
+    return TransactionsClassifier(model_repository)
+
+
+def test_key_uses_normalized_description():
+    assert PredictionCache.key("UBER Trip", 10, "v1") == PredictionCache.key("uber trip", 10.0, "v1")
+    assert PredictionCache.key(None, 10, "v1") == PredictionCache.key("", 10, "v1")
+
+
+def test_key_depends_on_value_and_model_version():
+    key = PredictionCache.key("uber trip", 10, "v1")
+    assert key != PredictionCache.key("uber trip", 11, "v1")
+    assert key != PredictionCache.key("uber trip", 10, "v2")
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get_many(["a", "b", "c"]) == [1, None, 3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    cache = PredictionCache(max_entries=10, ttl_seconds=5)
+    with patch("machine_learning.prediction_cache.time.monotonic", return_value=100.0):
+        cache.put("a", 1)
+    with patch("machine_learning.prediction_cache.time.monotonic", return_value=104.0):
+        assert cache.get("a") == 1
+    with patch("machine_learning.prediction_cache.time.monotonic", return_value=106.0):
+        assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_hit_rate_stats():
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.get_many(["a", "a", "b", "a"])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_disabled_cache():
+    cache = PredictionCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_cache_cleared_on_model_swap(classifier, model_repository):
+    cache = get_prediction_cache(classifier)
+    cache.put("a", 1)
+    write_model_repository(model_repository.parent, seed=21)
+    assert classifier.reload() is True
+    assert cache.get("a") is None
+    assert cache is prediction_cache
+
+
+def test_classification_worker_serves_repeated_transactions_from_cache(classifier):
+    from kafka import classification_worker
+    X, _ = make_transactions_frame(6, seed=2)
+    transactions = [{'date': str(row['Data']), 'description': row['Descrição'], 'value': row['Valor'], 'user': 'u'}
+                    for _, row in X.iterrows()]
+    embeddings = X.filter(like='embedding_').values.tolist()
+    message = {'job_id': 'job', 'transactions': transactions, 'embeddings': embeddings}
+    cache = PredictionCache(max_entries=100, ttl_seconds=60)
+    completed = []
+
+    with patch.object(classification_worker, "get_transactions_classifier", return_value=classifier), \
+         patch.object(classification_worker, "get_prediction_cache", return_value=cache), \
+         patch.object(classification_worker, "update_jobs", side_effect=lambda results, failed: completed.extend(results.values())):
+        classification_worker.process_classification(message)
+        with patch.object(type(classifier.snapshot()), "predict", side_effect=AssertionError("model should not run")):
+            classification_worker.process_classification(message)
+
+    assert completed[0] == completed[1]
+    assert all(t['model_version'] == classifier.version for t in completed[1])
+    assert cache.stats()["hits"] == len(transactions)
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+import numpy as np
+import torch
+from pytest import fixture
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import balanced_accuracy_score
+from machine_learning.utils import load_pickle
+from conftest import make_tiny_encoder
+
+
+@fixture
+def fixtures_path():
+    return Path(os.path.dirname(__file__)) / "classification_fixtures"
+
+
+@fixture
+def fixture_texts(fixtures_path):
+    X_test_raw = load_pickle(fixtures_path / "X_test_raw.pkl")
+    return X_test_raw["Descrição"].tolist()
+
+
+@fixture
+def encoders(tmp_path, fixture_texts):
+    full_precision = make_tiny_encoder(tmp_path, seed=3, texts=fixture_texts)
+    quantized = make_tiny_encoder(tmp_path, seed=3, texts=fixture_texts, quantize=True)
+    return full_precision, quantized
+
+
+def test_quantized_encoder_uses_int8_linear_layers(encoders):
+    full_precision, quantized = encoders
+    assert quantized.quantized and not full_precision.quantized
+    assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in quantized.model.modules())
+    assert not any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in full_precision.model.modules())
+
+
+def test_quantized_features_stay_close(encoders, fixture_texts):
+    full_precision, quantized = encoders
+    expected = full_precision.encode(fixture_texts)
+    actual = quantized.encode(fixture_texts)
+    assert actual.shape == expected.shape and actual.dtype == np.float32
+
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    assert cosine.min() > 0.98
+
+
+def test_quantized_accuracy_on_classification_fixtures(encoders, fixture_texts, fixtures_path):
+    """
+    A classifier fitted on full precision features of the fixture transactions
+    keeps its balanced accuracy when fed the int8 encoder features.
+    """
+    full_precision, quantized = encoders
+    y_test = load_pickle(fixtures_path / "y_test_encoded.pkl")
+    expected = full_precision.encode(fixture_texts)
+    classifier = LogisticRegression(max_iter=2000).fit(expected, y_test)
+
+    full_precision_score = balanced_accuracy_score(y_test, classifier.predict(expected))
+    quantized_predictions = classifier.predict(quantized.encode(fixture_texts))
+    quantized_score = balanced_accuracy_score(y_test, quantized_predictions)
+
+    assert np.mean(quantized_predictions == classifier.predict(expected)) >= 0.95
+    assert quantized_score >= full_precision_score - 0.05
+
+
+def test_num_threads_is_applied(tmp_path):
+    threads = torch.get_num_threads()
+    try:
+        make_tiny_encoder(tmp_path, num_threads=1)
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(threads)
@@ -0,0 +1,103 @@
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import torch
+from pytest import fixture
+from machine_learning.transactions_classification.lib import tokenization
+from machine_learning.transactions_classification.lib.preprocess import description_transformer
+from machine_learning.transactions_classification.lib.tokenization import (
+    get_encoder,
+    hidden_state_from_text_inputs,
+    set_encoder,
+    tokenized_pytorch_tensors,
+)
+from conftest import DESCRIPTIONS
+
+
+@fixture
+def descriptions():
+    return [description for description, _ in DESCRIPTIONS] * 5 + ["uber trip pix recebido joao farmacia supermercado"]
+
+
+@fixture
+def active_encoder(tiny_encoder):
+    set_encoder(tiny_encoder)
+    yield tiny_encoder
+    set_encoder(None)
+
+
+def reference_cls(encoder, texts):
+    # what the datasets based path computed: one padded forward pass per batch
+    inputs = encoder.tokenizer(texts, padding=True, max_length=120, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        return encoder.model(**inputs).last_hidden_state[:, 0].numpy()
+
+
+def test_encoder_matches_padded_forward_pass(tiny_encoder, descriptions):
+    hidden_states = tiny_encoder.encode(descriptions, batch_size=len(descriptions))
+    assert hidden_states.dtype == np.float32
+    assert hidden_states.shape == (len(descriptions), 32)
+    np.testing.assert_allclose(hidden_states, reference_cls(tiny_encoder, descriptions), atol=1e-5)
+
+
+def test_batching_does_not_change_results(tiny_encoder, descriptions):
+    np.testing.assert_allclose(
+        tiny_encoder.encode(descriptions, batch_size=3),
+        tiny_encoder.encode(descriptions, batch_size=len(descriptions)),
+        atol=1e-5)
+
+
+def test_description_pipeline_loads_encoder_once(tiny_encoder, descriptions):
+    set_encoder(None)
+    df = pd.DataFrame({"Descrição": descriptions})
+    try:
+        with patch.object(tokenization, "DistilBertEncoder", return_value=tiny_encoder) as encoder_class:
+            pipeline = description_transformer()
+            first = pipeline.fit_transform(df)
+            second = pipeline.transform(df)
+        assert encoder_class.call_count == 1
+    finally:
+        set_encoder(None)
+
+    assert list(first.columns) == [f"feature_{n}" for n in range(1, 33)]
+    assert len(first) == len(descriptions)
+    np.testing.assert_allclose(first.to_numpy(), second.to_numpy())
+
+
+def test_tokenized_inputs_are_unpadded(active_encoder, descriptions):
+    tokenized = tokenized_pytorch_tensors(pd.DataFrame({"Descrição": descriptions}), ["input_ids", "attention_mask"])
+    assert list(tokenized.columns) == ["input_ids", "attention_mask"]
+    lengths = {len(ids) for ids in tokenized["input_ids"]}
+    assert len(lengths) > 1
+
+    features = hidden_state_from_text_inputs(tokenized)
+    np.testing.assert_allclose(features.to_numpy(), reference_cls(active_encoder, descriptions), atol=1e-5)
+
+
+def test_get_encoder_is_cached(active_encoder):
+    assert get_encoder() is active_encoder
+    assert get_encoder() is get_encoder()
+
+
+def test_length_buckets_restore_input_order(tiny_encoder, descriptions):
+    rng = np.random.default_rng(0)
+    shuffled = [descriptions[i] for i in rng.permutation(len(descriptions))]
+    bucketed = tiny_encoder.encode(shuffled, batch_size=4, bucket_by_length=True)
+    unbucketed = tiny_encoder.encode(shuffled, batch_size=4, bucket_by_length=False)
+    np.testing.assert_allclose(bucketed, unbucketed, atol=1e-5)
+    np.testing.assert_allclose(bucketed, reference_cls(tiny_encoder, shuffled), atol=1e-5)
+
+
+def test_length_buckets_reduce_padding(tiny_encoder):
+    texts = ["uber", "uber trip pix recebido joao farmacia supermercado salário empresa"] * 8
+    pad = tiny_encoder._pad
+    padded_tokens = {False: 0, True: 0}
+    for bucket_by_length in padded_tokens:
+        def counting_pad(batch):
+            padded = pad(batch)
+            padded_tokens[bucket_by_length] += padded["input_ids"].numel()
+            return padded
+
+        with patch.object(tiny_encoder, "_pad", side_effect=counting_pad):
+            tiny_encoder.encode(texts, batch_size=4, bucket_by_length=bucket_by_length)
+    assert padded_tokens[True] < padded_tokens[False]